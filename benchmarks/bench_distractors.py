@@ -0,0 +1,102 @@
+"""Quiz option generation: list rebuild per question vs. the distractor index
+
+Run from the repository root:
+
+    python -m benchmarks.bench_distractors
+    python -m benchmarks.bench_distractors --hard --sizes 10000
+
+With `--hard` it also times similarity-ranked wrong options (needs numpy):
+"📋 All" with the neighbours of every phrase found in batches, and a single
+question on a cold index, which is what every question would cost unbatched.
+"""
+
+import argparse
+import random
+import time
+
+from distractors import DistractorIndex, truncate_translation
+
+
+def rebuild_options(pairs, translation):
+    """The original per-question code path"""
+    other_translations = [t for p, t in pairs if t != translation]
+    if len(other_translations) < 3:
+        return None
+    wrong_options = random.sample(other_translations, 3)
+    truncated_translation = truncate_translation(translation)
+    all_options = [truncated_translation] + [
+        truncate_translation(opt) for opt in wrong_options
+    ]
+    random.shuffle(all_options)
+    return all_options, all_options.index(truncated_translation)
+
+
+def per_question(fn, pairs, questions):
+    start = time.perf_counter()
+    for _, translation in questions:
+        fn(pairs, translation)
+    return (time.perf_counter() - start) / len(questions)
+
+
+def hard_all(pairs):
+    """Seconds for the hard options of every phrase, as build_quizzes asks for them"""
+    index = DistractorIndex(pairs, hard=True)
+    start = time.perf_counter()
+    index.prepare("translation", pairs)
+    for _, translation in pairs:
+        index.translation_options(translation)
+    return time.perf_counter() - start
+
+
+def hard_cold(pairs, questions):
+    """Seconds per question when every question finds its neighbours on its own"""
+    index = DistractorIndex(pairs, hard=True)
+    index.translation_options(questions[0][1])
+    start = time.perf_counter()
+    for _, translation in questions:
+        # Forget the cached neighbours
+        index.translations.similar._known[:] = False
+        index.translation_options(translation)
+    return (time.perf_counter() - start) / len(questions)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--hard", action="store_true", help="also time hard distractors")
+    args = parser.parse_args()
+
+    print(f"{'phrases':>8} {'rebuild/q':>12} {'index/q':>12} {'build':>10} {'All (old)':>12} {'All (new)':>12}")
+    for size in args.sizes:
+        pairs = [(f"phrase {i}", f"translation number {i}") for i in range(size)]
+        questions = random.sample(pairs, min(size, args.questions))
+
+        old = per_question(rebuild_options, pairs, questions)
+
+        start = time.perf_counter()
+        index = DistractorIndex(pairs)
+        build = time.perf_counter() - start
+        new = per_question(lambda _, t: index.translation_options(t), pairs, questions)
+
+        print(
+            f"{size:>8} {old * 1e6:>10.1f}us {new * 1e6:>10.2f}us {build * 1e3:>8.1f}ms "
+            f"{old * size:>11.2f}s {build + new * size:>11.3f}s"
+        )
+
+    if not args.hard:
+        return
+    print(f"\n{'phrases':>8} {'hard All':>12} {'hard/q':>12} {'cold/q':>12}")
+    for size in args.sizes:
+        pairs = [(f"phrase {i}", f"translation number {i}") for i in range(size)]
+        questions = random.sample(pairs, min(size, 100))
+        all_time = hard_all(pairs)
+        cold = hard_cold(pairs, questions)
+        print(
+            f"{size:>8} {all_time:>11.2f}s {all_time / size * 1e6:>10.1f}us "
+            f"{cold * 1e6:>10.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
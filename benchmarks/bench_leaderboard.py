@@ -0,0 +1,59 @@
+"""Leaderboard updates and top-10 reads: score buckets vs. a heap over all scores
+
+Run from the repository root:
+
+    python -m benchmarks.bench_leaderboard --users 1000 100000 1000000
+
+Correct answers are spread over the users with a Zipf-like distribution,
+so a few of them score a lot and most score little, as in a busy group.
+The baseline keeps a plain score dict and runs heapq.nlargest over it per read.
+"""
+
+import argparse
+import heapq
+import random
+import time
+
+from leaderboard import Ranking
+
+READS = 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--answers", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    print(f"{'users':>9} {'levels':>7} {'updates/s':>11} {'top-10 µs':>10} {'nlargest µs':>12}")
+    for users in args.users:
+        random.seed(1)
+        weights = [1 / (rank + 1) for rank in range(users)]
+        answers = random.choices(range(users), weights, k=args.answers)
+
+        ranking = Ranking()
+        start = time.perf_counter()
+        for user_id in answers:
+            ranking.add(user_id, 1)
+        updates = len(answers) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(READS):
+            ranking.top(10)
+        top = (time.perf_counter() - start) / READS
+
+        scores = ranking.scores
+        reads = max(1, READS * 1000 // users)
+        start = time.perf_counter()
+        for _ in range(reads):
+            heapq.nlargest(10, scores.items(), key=lambda item: item[1])
+        baseline = (time.perf_counter() - start) / reads
+
+        print(
+            f"{users:>9} {len(ranking.levels):>7} {updates:>11,.0f} "
+            f"{top * 1e6:>10.1f} {baseline * 1e6:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Cost of poll deadlines: timer wheel vs. scanning every open poll per tick
+
+Run from the repository root:
+
+    python -m benchmarks.bench_poll_lifecycle --polls 1000 10000 100000
+
+Polls are opened with deadlines spread over one day, a tenth of them is
+closed early by answers, and the clock is then advanced a second at a time
+for a simulated hour. The scan keeps a dict of deadlines and checks all of
+them every tick, which is what one check per poll amounts to.
+"""
+
+import argparse
+import random
+import time
+
+from poll_lifecycle import PollLifecycle
+
+DAY = 24 * 60 * 60
+TICKS = 60 * 60
+
+
+def run_wheel(polls: int, start: float):
+    lifecycle = PollLifecycle(max_voters=0, open_period=DAY)
+    began = time.perf_counter()
+    for i in range(polls):
+        # Sent during the last day, so deadlines fall over the next one
+        lifecycle.open(str(i), start - random.uniform(0, DAY))
+    for i in random.sample(range(polls), polls // 10):
+        lifecycle.close(str(i))
+    opened = time.perf_counter() - began
+
+    closed = 0
+    began = time.perf_counter()
+    for tick in range(1, TICKS + 1):
+        for poll_id in lifecycle.expired(start + tick):
+            lifecycle.close(poll_id)
+            closed += 1
+    return opened, (time.perf_counter() - began) / TICKS, closed
+
+
+def run_scan(polls: int, start: float):
+    deadlines = {}
+    began = time.perf_counter()
+    for i in range(polls):
+        deadlines[str(i)] = start - random.uniform(0, DAY) + DAY
+    for i in random.sample(range(polls), polls // 10):
+        del deadlines[str(i)]
+    opened = time.perf_counter() - began
+
+    closed = 0
+    began = time.perf_counter()
+    for tick in range(1, TICKS + 1):
+        now = start + tick
+        for poll_id in [poll_id for poll_id, deadline in deadlines.items() if deadline <= now]:
+            del deadlines[poll_id]
+            closed += 1
+    return opened, (time.perf_counter() - began) / TICKS, closed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--polls", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'polls':>8} {'':>6} {'open s':>8} {'µs/tick':>10} {'closed':>8}")
+    for polls in args.polls:
+        for name, run in (("wheel", run_wheel), ("scan", run_scan)):
+            random.seed(1)
+            opened, per_tick, closed = run(polls, time.time())
+            print(f"{polls:>8} {name:>6} {opened:>8.3f} {per_tick * 1e6:>10.1f} {closed:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""/find latency: scanning the vocabulary vs. the n-gram search index
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search --phrases 100000
+
+Phrases are made of random syllables, so common n-grams have long posting
+lists. Queries are substrings of random phrases plus queries that match
+nothing, each asking for one page of results like the command does.
+"""
+
+import argparse
+import random
+import time
+
+from main import FIND_RESULT_LIMIT
+from search import SearchIndex, normalize
+
+SYLLABLES = ["ka", "to", "ri", "mu", "se", "ne", "lo", "pa", "di", "gu", "ве", "ра", "но", "ст", "ли", "ко"]
+
+
+def word() -> str:
+    return "".join(random.choices(SYLLABLES, k=random.randint(2, 4)))
+
+
+def scan(pairs, query, limit):
+    """What /find would cost without an index"""
+    query = normalize(query)
+    matches = []
+    for position, (phrase, translation) in enumerate(pairs):
+        if query in normalize(phrase) or query in normalize(translation):
+            matches.append(position)
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def per_query(fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phrases", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'phrases':>8} {'build':>9} {'scan/q':>11} {'index/q':>11} {'worst':>11}")
+    for size in args.phrases:
+        random.seed(size)
+        pairs = [
+            (" ".join(word() for _ in range(random.randint(1, 3))), f"{word()} {word()}")
+            for _ in range(size)
+        ]
+        queries = []
+        for _ in range(args.queries):
+            phrase = random.choice(pairs)[random.randrange(2)]
+            start = random.randrange(len(phrase))
+            queries.append(phrase[start:start + random.randint(1, 8)])
+        queries += ["zzz", "qx"]
+
+        start = time.perf_counter()
+        index = SearchIndex(pairs)
+        build = time.perf_counter() - start
+
+        limit = FIND_RESULT_LIMIT + 1
+        old = per_query(lambda q: scan(pairs, q, limit), queries)
+        new = per_query(lambda q: index.find(q, limit), queries)
+        worst = max(per_query(lambda q: index.find(q, limit), [query]) for query in queries)
+        print(
+            f"{size:>8} {build * 1e3:>7.0f}ms {old * 1e6:>9.1f}us "
+            f"{new * 1e6:>9.1f}us {worst * 1e6:>9.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Handler throughput of the sharded deployment by number of worker processes
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sharding --workers 1 2 4 8
+
+Every run starts the real front process router with N workers talking to the
+in-process fake Bot API, waits until all of them are up, then feeds the same
+synthetic updates: each user opens /create_quiz_mix_answers and pastes 100
+phrases. Throughput is measured until the last worker has handled its last
+update. Scaling is bounded by the number of CPU cores of the machine.
+
+With --breakdown it also measures the two costs that don't shrink with more
+workers: the SQLite writes of a paste, which all workers make to the same
+database file one writer at a time, and the loopback round trip every sent
+quiz makes to the front process for its send token.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Tuple
+
+from telegram import Bot
+
+from benchmarks.fake_bot_api import FakeBotRequest, UpdateFactory
+from config import Settings
+from dispatch import SendBudget
+from scheduler import ReviewScheduler
+from sharding import ShardClient, ShardCoordinator, ShardRouter, run_worker
+from storage import Database, OutboxStore, ReviewStore, VocabularyStore
+
+PHRASES_PER_PASTE = 100
+
+
+def fake_worker(settings, updates, port, ready) -> None:
+    run_worker(settings, updates, port, ready, request=FakeBotRequest())
+
+
+async def run(workers: int, users: int) -> float:
+    """Updates per second with `workers` shards"""
+    with tempfile.TemporaryDirectory() as directory:
+        settings = Settings(
+            telegram_bot_token="123:fake",
+            target_chat_id=-100,
+            database_path=os.path.join(directory, "bench.db"),
+            shards=workers,
+        )
+        router = ShardRouter(settings, worker=fake_worker)
+        await router.start()
+
+        factory = UpdateFactory(Bot(settings.telegram_bot_token))
+        updates = []
+        for user_id in range(1, users + 1):
+            text = "\n".join(f"word {user_id}-{i} - слово {i}" for i in range(PHRASES_PER_PASTE))
+            updates.append(factory.message(user_id, "/create_quiz_mix_answers"))
+            updates.append(factory.message(user_id, text))
+
+        start = time.perf_counter()
+        for update in updates:
+            router.route(update)
+        await router.stop()
+        return len(updates) / (time.perf_counter() - start)
+
+
+class UnlimitedBudget(SendBudget):
+    """Grants every token right away, so only the IPC itself is timed"""
+
+    async def acquire(self, chat_id: int) -> None:
+        pass
+
+
+async def database_cost(users: int) -> Tuple[float, float]:
+    """Seconds of SQLite writes per update for the pastes of `users` users
+
+    First the writes a paste makes before it replies: its phrases, their
+    review schedule and their outbox entries. Then the writes made while
+    its quizzes are delivered, which mark them as sent in the outbox.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        database = Database(os.path.join(directory, "bench.db"))
+        vocabulary = VocabularyStore(database)
+        scheduler = ReviewScheduler(ReviewStore(database))
+        outbox = OutboxStore(database)
+        await vocabulary.count(0)
+        await scheduler.pop_due(0, 1)
+        await outbox.last_id()
+
+        paste = delivery = 0.0
+        for user_id in range(1, users + 1):
+            pairs = [(f"word {user_id}-{i}", f"слово {i}") for i in range(PHRASES_PER_PASTE)]
+            start = time.perf_counter()
+            await vocabulary.add_phrases(user_id, pairs)
+            await scheduler.track(user_id, (phrase for phrase, _ in pairs), time.time())
+            ids = await outbox.add(
+                [(-100, f"{phrase}?", [translation, "a", "b", "c"], 0, user_id, phrase) for phrase, translation in pairs]
+            )
+            paste += time.perf_counter() - start
+            start = time.perf_counter()
+            for outbox_id in ids:
+                await outbox.finish(outbox_id)
+            delivery += time.perf_counter() - start
+        await database.close()
+        return paste / (2 * users), delivery / (2 * users)
+
+
+async def ipc_cost(requests: int) -> float:
+    """Seconds per send token round trip between a worker and the front process"""
+    coordinator = ShardCoordinator(1024, 60)
+    coordinator.budget = UnlimitedBudget()
+    await coordinator.start()
+    client = ShardClient(0, coordinator.port)
+    await client.connect()
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.acquire(-100)
+    elapsed = time.perf_counter() - start
+    await client.close()
+    await coordinator.stop()
+    return elapsed / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--breakdown", action="store_true", help="also time the database writes and the IPC on their own")
+    args = parser.parse_args()
+
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'updates/s':>12} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        throughput = asyncio.run(run(workers, args.users))
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>12.1f} {throughput / baseline:>7.2f}x")
+
+    if args.breakdown:
+        paste, delivery = asyncio.run(database_cost(args.users))
+        ipc = asyncio.run(ipc_cost(PHRASES_PER_PASTE * args.users))
+        # Every paste sends one quiz per phrase, the other update sends none
+        ipc_per_update = ipc * PHRASES_PER_PASTE / 2
+        # One SQLite file takes one writer at a time, however many workers there are
+        print(f"database writes before the reply: {paste * 1000:.2f} ms/update, at most {1 / paste:.0f} updates/s")
+        print(f"database writes while delivering: {delivery * 1000:.2f} ms/update, at most {1 / (paste + delivery):.0f} updates/s with both")
+        print(f"send token IPC: {ipc * 1e6:.0f} µs/quiz, {ipc_per_update * 1000:.2f} ms/update")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Insert and lookup throughput of the SQLite vocabulary store
+
+Run from the repository root:
+
+    python -m benchmarks.bench_storage --phrases 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from storage import Database, VocabularyStore
+
+
+async def run(total: int, users: int, batch: int, lookups: int) -> None:
+    per_user = total // users
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        # A small cache so that most users are cold, like a real deployment
+        store = VocabularyStore(db, cache_size=max(1, users // 10))
+
+        start = time.perf_counter()
+        for user_id in range(users):
+            for offset in range(0, per_user, batch):
+                pairs = [
+                    (f"phrase {user_id}-{i}", f"translation {i}")
+                    for i in range(offset, min(offset + batch, per_user))
+                ]
+                await store.add_phrases(user_id, pairs)
+        elapsed = time.perf_counter() - start
+        inserted = per_user * users
+        print(
+            f"insert: {inserted} phrases in {elapsed:.2f}s "
+            f"({inserted / elapsed:,.0f} phrases/s, batches of {batch})"
+        )
+
+        store = VocabularyStore(db, cache_size=max(1, users // 10))
+        keys = [
+            (user_id, f"phrase {user_id}-{random.randrange(per_user)}")
+            for user_id in (random.randrange(users) for _ in range(lookups))
+        ]
+        start = time.perf_counter()
+        for user_id, phrase in keys:
+            await store.get_translation(user_id, phrase)
+        elapsed = time.perf_counter() - start
+        print(f"point lookup (cold): {lookups / elapsed:,.0f} lookups/s")
+
+        hot_user = 0
+        await store.get_phrases(hot_user)
+        start = time.perf_counter()
+        for i in range(lookups):
+            await store.get_translation(hot_user, f"phrase 0-{i % per_user}")
+        elapsed = time.perf_counter() - start
+        print(f"point lookup (cached): {lookups / elapsed:,.0f} lookups/s")
+
+        start = time.perf_counter()
+        for user_id in range(min(users, 200)):
+            await store.get_phrases(user_id)
+        elapsed = time.perf_counter() - start
+        loaded = min(users, 200) * per_user
+        print(
+            f"vocabulary load: {loaded / elapsed:,.0f} phrases/s "
+            f"({per_user} phrases per user)"
+        )
+        await db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phrases", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=50, help="phrases per pasted message")
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.phrases, args.users, args.batch, args.lookups))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Memory of cached vocabularies: dict of dicts vs. interned phrase tables
+
+Run from the repository root:
+
+    python -m benchmarks.bench_vocabulary_memory --users 10000 --phrases 100
+
+Every user gets phrases drawn from a shared pool of common words with a
+Zipf-like distribution, so popular words show up in many vocabularies, as
+they do in practice. Strings are created fresh per user, like rows read from
+SQLite. Memory is the deep size of everything the cache keeps alive, with
+shared objects counted once.
+"""
+
+import argparse
+import random
+import sys
+import time
+from array import array
+
+from phrase_table import PhraseTable, StringTable
+
+
+def make_vocabularies(users: int, phrases: int, pool: int):
+    random.seed(1)
+    words = [f"word number {i}" for i in range(pool)]
+    translations = [f"переклад слова {i}" for i in range(pool)]
+    weights = [1 / (rank + 1) for rank in range(pool)]
+    for _ in range(users):
+        picked = random.choices(range(pool), weights, k=phrases)
+        # Copies, so no string object is shared between users
+        yield [(words[i].encode().decode(), translations[i].encode().decode()) for i in picked]
+
+
+def deep_size(root) -> int:
+    """Bytes of `root` and everything reachable from it, each object counted once"""
+    seen = set()
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, int, float, array, type(None))):
+            continue
+        else:
+            stack.extend(getattr(obj, name) for name in getattr(type(obj), "__slots__", ()))
+            stack.extend(getattr(obj, "__dict__", {}).values())
+    return size
+
+
+def measure(build, args):
+    """Build the cache from freshly read rows and return it with its size"""
+    start = time.perf_counter()
+    cache = [build(pairs) for pairs in make_vocabularies(args.users, args.phrases, args.pool)]
+    elapsed = time.perf_counter() - start
+    # The list holding the cache isn't part of it
+    return cache, deep_size(cache) - sys.getsizeof(cache), elapsed
+
+
+def lookups_per_second(cache, samples):
+    start = time.perf_counter()
+    for table, phrase in samples:
+        table.get(phrase)
+    return len(samples) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--phrases", type=int, default=100, help="phrases per user")
+    parser.add_argument("--pool", type=int, default=20_000, help="distinct common words")
+    args = parser.parse_args()
+
+    dicts, dict_size, dict_build = measure(dict, args)
+    strings = StringTable()
+    tables, table_size, table_build = measure(
+        lambda pairs: PhraseTable(pairs, table=strings), args
+    )
+    total = sum(map(len, dicts))
+
+    users = [random.randrange(args.users) for _ in range(100_000)]
+    samples = [(user, random.choice(list(dicts[user]))) for user in users]
+    dict_lookups = lookups_per_second(dicts, [(dicts[user], phrase) for user, phrase in samples])
+    table_lookups = lookups_per_second(tables, [(tables[user], phrase) for user, phrase in samples])
+
+    print(f"{args.users} users, {total} phrases, {len(strings)} distinct strings")
+    print(f"{'':>14} {'MB':>8} {'bytes/phrase':>13} {'build s':>8} {'lookups/s':>12}")
+    print(
+        f"{'dict of dicts':>14} {dict_size / 2**20:>8.1f} {dict_size / total:>13.0f} "
+        f"{dict_build:>8.2f} {dict_lookups:>12,.0f}"
+    )
+    print(
+        f"{'PhraseTable':>14} {table_size / 2**20:>8.1f} {table_size / total:>13.0f} "
+        f"{table_build:>8.2f} {table_lookups:>12,.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
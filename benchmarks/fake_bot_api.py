@@ -0,0 +1,136 @@
+"""In-process stand-in for the Telegram Bot API
+
+`FakeBotRequest` plugs into `ApplicationBuilder.request()` and answers every
+API call locally, so handlers can be driven without network access. Calls
+are counted per method and can be delayed to simulate round-trip latency.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Study Bot", "username": "study_bot"}
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "type": "private" if chat_id > 0 else "group", "title": "chat"}
+
+
+class FakeBotRequest(BaseRequest):
+    """Answers Bot API requests in memory and records which methods were called"""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Any = None,
+        write_timeout: Any = None,
+        connect_timeout: Any = None,
+        pool_timeout: Any = None,
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self._result(api_method, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def _message(self, params: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": _chat(int(params.get("chat_id", 1))),
+            "from": BOT_USER,
+            **extra,
+        }
+
+    def _result(self, api_method: str, params: Dict[str, Any]) -> Any:
+        if api_method == "getMe":
+            return BOT_USER
+        if api_method == "sendPoll":
+            options = params["options"]
+            poll = {
+                "id": str(next(self._ids)),
+                "question": params["question"],
+                "options": [{"text": option, "voter_count": 0} for option in options],
+                "total_voter_count": 0,
+                "is_closed": False,
+                "is_anonymous": params.get("is_anonymous", True),
+                "type": params.get("type", "regular"),
+                "allows_multiple_answers": False,
+                "correct_option_id": params.get("correct_option_id"),
+            }
+            return self._message(params, poll=poll)
+        if api_method == "stopPoll":
+            return {
+                "id": "0",
+                "question": "stopped",
+                "options": [],
+                "total_voter_count": 0,
+                "is_closed": True,
+                "is_anonymous": True,
+                "type": "quiz",
+                "allows_multiple_answers": False,
+            }
+        if api_method in ("sendMessage", "editMessageText"):
+            return self._message(params, text=params.get("text", ""))
+        if api_method == "sendDocument":
+            return self._message(params)
+        # answerCallbackQuery, setMyCommands, deleteWebhook, ...
+        return True
+
+
+class UpdateFactory:
+    """Builds synthetic updates the way Telegram would deliver them"""
+
+    def __init__(self, bot: Any) -> None:
+        self.bot = bot
+        self._ids = itertools.count(1)
+
+    def message(self, user_id: int, text: str) -> Update:
+        update_id = next(self._ids)
+        message: Dict[str, Any] = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": _chat(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(command)}
+            ]
+        return Update.de_json({"update_id": update_id, "message": message}, self.bot)
+
+    def poll_answer(self, user_id: int, poll_id: str, option_id: int) -> Update:
+        update_id = next(self._ids)
+        poll_answer = {
+            "poll_id": poll_id,
+            "user": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "option_ids": [option_id],
+        }
+        return Update.de_json({"update_id": update_id, "poll_answer": poll_answer}, self.bot)
@@ -0,0 +1,162 @@
+"""Load test of the bot's handlers against the in-process fake Bot API
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --output results.json
+
+Every scenario feeds synthetic updates through `Application.process_update`
+and reports updates per second, p50/p99 handler latency and peak RSS as JSON,
+so runs can be compared with each other. Quizzes are still paced by the
+dispatcher in the background, so `sendPoll` counts only show what went out
+while the scenario was running.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import main
+from benchmarks.fake_bot_api import FakeBotRequest, UpdateFactory
+from config import Settings
+
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class LoadTest:
+    def __init__(self, latency: float) -> None:
+        self.request = FakeBotRequest(latency=latency)
+        settings = Settings(
+            telegram_bot_token="123:fake",
+            target_chat_id=-100,
+            database_path=os.path.join(tempfile.mkdtemp(), "load_test.db"),
+        )
+        self.application = main.build_application(settings, request=self.request)
+        self.updates = UpdateFactory(self.application.bot)
+        self.latencies: List[float] = []
+        self.started = 0.0
+
+    def start_clock(self) -> None:
+        """Called by scenarios once their setup is done"""
+        self.latencies = []
+        self.request.calls.clear()
+        self.started = time.perf_counter()
+
+    async def send(self, user_id: int, text: str) -> None:
+        update = self.updates.message(user_id, text)
+        start = time.perf_counter()
+        await self.application.process_update(update)
+        self.latencies.append(time.perf_counter() - start)
+
+    async def run(
+        self, name: str, scenario: Callable[["LoadTest"], Awaitable[None]]
+    ) -> Dict[str, Any]:
+        self.start_clock()
+        await scenario(self)
+        elapsed = time.perf_counter() - self.started
+        return {
+            "scenario": name,
+            "updates": len(self.latencies),
+            "seconds": round(elapsed, 3),
+            "updates_per_second": round(len(self.latencies) / elapsed, 1),
+            "p50_ms": round(percentile(self.latencies, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 3),
+            "mean_ms": round(statistics.mean(self.latencies) * 1000, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "api_calls": dict(self.request.calls),
+        }
+
+
+async def paste_100_phrases(test: LoadTest, users: int = 50) -> None:
+    """Each user opens /create_quiz_mix_answers and pastes 100 phrases"""
+    for user_id in range(1, users + 1):
+        text = "\n".join(f"word {user_id}-{i} - слово {i}" for i in range(100))
+        await test.send(user_id, "/create_quiz_mix_answers")
+        await test.send(user_id, text)
+
+
+async def list_10k_phrases(test: LoadTest, requests: int = 200) -> None:
+    """A user with 10k phrases runs /list over and over"""
+    user_id = 10_000
+    await main.add_user_phrases(
+        user_id, [(f"phrase {i}", f"переклад {i}") for i in range(10_000)]
+    )
+    test.start_clock()
+    for _ in range(requests):
+        await test.send(user_id, "/list")
+
+
+async def concurrent_random_quiz(test: LoadTest, users: int = 1000) -> None:
+    """1k users walk through /create_random_quiz at the same time"""
+    base = 20_000
+    for user_id in range(base, base + users):
+        await main.add_user_phrases(
+            user_id, [(f"phrase {i}", f"переклад {i}") for i in range(20)]
+        )
+
+    test.start_clock()
+
+    async def one_user(user_id: int) -> None:
+        await test.send(user_id, "/create_random_quiz")
+        await test.send(user_id, random.choice(["🔀 Translation Quiz", "🔄 Phrase Quiz"]))
+        await test.send(user_id, random.choice(["🎲 Random", "📋 All"]))
+
+    await asyncio.gather(*(one_user(user_id) for user_id in range(base, base + users)))
+
+
+SCENARIOS = {
+    "paste-100-phrases": paste_100_phrases,
+    "list-10k-phrases": list_10k_phrases,
+    "concurrent-random-quiz": concurrent_random_quiz,
+}
+
+
+async def run(names: List[str], latency: float) -> List[Dict[str, Any]]:
+    test = LoadTest(latency)
+    results = []
+    async with test.application:
+        await main.post_init(test.application)
+        for name in names:
+            results.append(await test.run(name, SCENARIOS[name]))
+        await main.post_shutdown(test.application)
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="simulated Bot API round-trip in seconds"
+    )
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.scenario or list(SCENARIOS), args.latency))
+    report = json.dumps({"results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,142 @@
+# flake8: noqa: E501
+
+import importlib.util
+import os
+from dataclasses import dataclass
+from typing import FrozenSet, Mapping, Optional
+
+
+class ConfigurationError(Exception):
+    """Raised when a required setting is missing or invalid"""
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Everything the bot reads from the environment"""
+
+    telegram_bot_token: str
+    target_chat_id: int
+    database_path: str = "vocabulary.db"
+    poll_registry_size: int = 10000
+    poll_registry_ttl: float = 24 * 60 * 60
+    # Polls are closed after this many answers or seconds, 0 turns a rule off
+    poll_close_voters: int = 3
+    poll_open_period: float = 24 * 60 * 60
+    # Anonymous quizzes in groups, answers there then don't count anywhere
+    anonymous_group_quizzes: bool = False
+    review_interval: float = 60 * 60
+    review_budget: int = 10
+    answer_flush_interval: float = 10
+    # Seconds between writing changed conversations, user_data and bot_data
+    persistence_interval: float = 5
+    metrics_port: int = 0
+    # Handlers running longer than this many seconds are logged, 0 turns it off
+    slow_handler_threshold: float = 1.0
+    admin_ids: FrozenSet[int] = frozenset()
+    update_workers: int = 16
+    webhook_url: Optional[str] = None
+    webhook_listen: str = "127.0.0.1"
+    webhook_port: int = 8443
+    webhook_path: str = "telegram"
+    webhook_secret: Optional[str] = None
+    # Worker processes users are spread over, and the one this process serves
+    shards: int = 1
+    shard_index: int = 0
+    # Wrong quiz options similar to the correct one instead of random ones
+    hard_distractors: bool = False
+    # Model filling in lines pasted without a translation, off when None
+    translation_backend: Optional[str] = None
+    translation_model: str = "gemini-1.5-flash"
+    translation_language: str = "Ukrainian"
+    translation_timeout: float = 30
+    translation_concurrency: int = 4
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        """Read settings from the environment, loading a `.env` file first"""
+        if environ is None:
+            # python-dotenv is only needed when the process actually starts the bot
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            environ = os.environ
+
+        missing = [
+            name for name in ("TELEGRAM_BOT_TOKEN", "TARGET_CHAT_ID") if not environ.get(name)
+        ]
+        if missing:
+            raise ConfigurationError(f"Missing required setting(s): {', '.join(missing)}")
+
+        try:
+            settings = cls(
+                telegram_bot_token=environ["TELEGRAM_BOT_TOKEN"],
+                target_chat_id=int(environ["TARGET_CHAT_ID"]),
+                database_path=environ.get("DATABASE_PATH", cls.database_path),
+                poll_registry_size=int(environ.get("POLL_REGISTRY_SIZE", cls.poll_registry_size)),
+                poll_registry_ttl=float(environ.get("POLL_REGISTRY_TTL", cls.poll_registry_ttl)),
+                poll_close_voters=int(environ.get("POLL_CLOSE_VOTERS", cls.poll_close_voters)),
+                poll_open_period=float(environ.get("POLL_OPEN_PERIOD", cls.poll_open_period)),
+                anonymous_group_quizzes=environ.get("ANONYMOUS_GROUP_QUIZZES", "").strip().lower()
+                in ("1", "true", "yes", "on"),
+                review_interval=float(environ.get("REVIEW_INTERVAL", cls.review_interval)),
+                review_budget=int(environ.get("REVIEW_BUDGET", cls.review_budget)),
+                answer_flush_interval=float(
+                    environ.get("ANSWER_FLUSH_INTERVAL", cls.answer_flush_interval)
+                ),
+                persistence_interval=float(
+                    environ.get("PERSISTENCE_INTERVAL", cls.persistence_interval)
+                ),
+                metrics_port=int(environ.get("METRICS_PORT", cls.metrics_port)),
+                slow_handler_threshold=float(
+                    environ.get("SLOW_HANDLER_THRESHOLD", cls.slow_handler_threshold)
+                ),
+                admin_ids=frozenset(
+                    int(user_id)
+                    for user_id in environ.get("ADMIN_IDS", "").split(",")
+                    if user_id.strip()
+                ),
+                update_workers=int(environ.get("UPDATE_WORKERS", cls.update_workers)),
+                webhook_url=environ.get("WEBHOOK_URL") or None,
+                webhook_listen=environ.get("WEBHOOK_LISTEN", cls.webhook_listen),
+                webhook_port=int(environ.get("WEBHOOK_PORT", cls.webhook_port)),
+                webhook_path=environ.get("WEBHOOK_PATH", cls.webhook_path),
+                webhook_secret=environ.get("WEBHOOK_SECRET") or None,
+                shards=int(environ.get("SHARDS", cls.shards)),
+                hard_distractors=environ.get("HARD_DISTRACTORS", "").strip().lower()
+                in ("1", "true", "yes", "on"),
+                translation_backend=environ.get("TRANSLATION_BACKEND") or None,
+                translation_model=environ.get("TRANSLATION_MODEL", cls.translation_model),
+                translation_language=environ.get("TRANSLATION_LANGUAGE", cls.translation_language),
+                translation_timeout=float(
+                    environ.get("TRANSLATION_TIMEOUT", cls.translation_timeout)
+                ),
+                translation_concurrency=int(
+                    environ.get("TRANSLATION_CONCURRENCY", cls.translation_concurrency)
+                ),
+            )
+        except ValueError as exc:
+            raise ConfigurationError(f"Invalid setting: {exc}") from exc
+        if settings.shards < 1:
+            raise ConfigurationError("SHARDS must be at least 1")
+        if settings.slow_handler_threshold < 0:
+            raise ConfigurationError("SLOW_HANDLER_THRESHOLD can't be negative")
+        if settings.poll_close_voters < 0 or settings.poll_open_period < 0:
+            raise ConfigurationError("POLL_CLOSE_VOTERS and POLL_OPEN_PERIOD can't be negative")
+        if settings.hard_distractors and importlib.util.find_spec("numpy") is None:
+            raise ConfigurationError(
+                "HARD_DISTRACTORS needs numpy, install requirements-distractors.txt"
+            )
+        if settings.translation_backend not in (None, "stub", "gemini"):
+            raise ConfigurationError("TRANSLATION_BACKEND must be stub or gemini")
+        if (
+            settings.translation_backend == "gemini"
+            and importlib.util.find_spec("langchain_google_genai") is None
+        ):
+            raise ConfigurationError(
+                "TRANSLATION_BACKEND=gemini needs langchain-google-genai, install requirements-llm.txt"
+            )
+        if settings.translation_concurrency < 1 or settings.translation_timeout <= 0:
+            raise ConfigurationError(
+                "TRANSLATION_CONCURRENCY and TRANSLATION_TIMEOUT must be positive"
+            )
+        return settings
@@ -0,0 +1,382 @@
+# flake8: noqa: E501
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram import Message, Poll
+from telegram.constants import ChatType
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+from telegram.ext import Application
+
+from metrics import DISPATCH_WAIT
+from storage import OutboxStore
+
+logger = logging.getLogger(__name__)
+
+# Telegram Bot API limits: ~1 message per second in a private chat,
+# 20 messages per minute in a group and ~30 messages per second overall
+PRIVATE_CHAT_RATE = 1.0
+PRIVATE_CHAT_BURST = 1
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+
+# Retries of sends that failed with a network error, see `backoff_delay`
+MAX_SEND_ATTEMPTS = 6
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Unfinished outbox entries loaded at a time when replaying after a restart
+REPLAY_BATCH = 500
+
+# Ids of supergroups and channels are below this, private chats and basic groups above
+SUPERGROUP_ID_LIMIT = -10**12
+
+
+@dataclass
+class PollJob:
+    """A single quiz waiting to be sent"""
+
+    chat_id: int
+    question: str
+    options: List[str]
+    correct_option_id: int
+    # Owner and phrase of the quiz, used to learn from the answers
+    user_id: Optional[int] = None
+    phrase: Optional[str] = None
+    # Row in the outbox, set once the job is recorded there
+    outbox_id: Optional[int] = None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter: between half and all of base * 2^(attempt - 1)"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+SentCallback = Callable[[PollJob, Message], Awaitable[None]]
+CompleteCallback = Callable[[List[Message]], Awaitable[None]]
+
+
+class TokenBucket:
+    """Async token bucket; `acquire` waits until a token is available"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = 0.0
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self._updated:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (used on RetryAfter)"""
+        loop = asyncio.get_running_loop()
+        self._blocked_until = max(self._blocked_until, loop.time() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendBudget:
+    """Rate limits for sending to Telegram: one bucket per chat plus a global one"""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    async def acquire(self, chat_id: int) -> None:
+        """Wait until one more message may be sent to the chat"""
+        await self._bucket(chat_id).acquire()
+        await self._global_bucket.acquire()
+
+    def pause(self, chat_id: int, seconds: float) -> None:
+        """Hold back the chat for `seconds` after Telegram asked us to slow down"""
+        self._bucket(chat_id).pause(seconds)
+
+
+class _Batch:
+    """Tracks the jobs submitted together so the requester can be notified"""
+
+    def __init__(
+        self,
+        size: int,
+        on_sent: Optional[SentCallback],
+        on_complete: Optional[CompleteCallback],
+    ) -> None:
+        self.remaining = size
+        self.on_sent = on_sent
+        self.on_complete = on_complete
+        self.messages: List[Message] = []
+
+    async def complete(self) -> None:
+        """Hand the sent messages to `on_complete`, logging what it raises"""
+        if self.on_complete is None:
+            return
+        try:
+            await self.on_complete(self.messages)
+        except Exception:
+            logger.exception("Quiz batch completion callback failed")
+
+
+class PollDispatcher:
+    """Sends queued quizzes in the background, one worker per chat
+
+    Each chat has its own queue and token bucket, so a big batch for one chat
+    never delays another one. All workers also share a global bucket. The
+    buckets live in `budget`, which can be replaced by one shared with other
+    processes.
+
+    With an `outbox`, jobs are recorded before they are queued and removed
+    once they are sent, and `replay` picks up what an earlier run left behind.
+    """
+
+    def __init__(
+        self,
+        budget: Optional[SendBudget] = None,
+        outbox: Optional[OutboxStore] = None,
+        anonymous_groups: bool = False,
+    ) -> None:
+        self.budget = budget or SendBudget()
+        self.outbox = outbox
+        # Hide who voted how from the other members of groups
+        self.anonymous_groups = anonymous_groups
+        self._application: Optional[Application] = None
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._replay_task: Optional[asyncio.Task] = None
+        # Whether a supergroup or channel only takes anonymous polls, by chat id
+        self._anonymous_chats: Dict[int, bool] = {}
+
+    async def start(self, application: Application) -> None:
+        """Bind the dispatcher to the running application (used as post_init)"""
+        self._application = application
+
+    async def stop(self, application: Application) -> None:
+        """Cancel all workers (used as post_shutdown)"""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+
+    def pending(self, chat_id: Optional[int] = None) -> int:
+        """Number of jobs still waiting in the queue(s)"""
+        if chat_id is not None:
+            queue = self._queues.get(chat_id)
+            return queue.qsize() if queue else 0
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def submit(
+        self,
+        jobs: List[PollJob],
+        on_sent: Optional[SentCallback] = None,
+        on_complete: Optional[CompleteCallback] = None,
+    ) -> int:
+        """Queue jobs for sending and return once they are recorded in the outbox
+
+        `on_sent` is awaited after every delivered poll, `on_complete` once
+        after the whole batch has been processed, before returning when
+        there are no jobs.
+        """
+        batch = _Batch(len(jobs), on_sent, on_complete)
+        if not jobs:
+            await batch.complete()
+            return 0
+
+        new_jobs = [job for job in jobs if job.outbox_id is None]
+        if self.outbox is not None and new_jobs:
+            ids = await self.outbox.add(
+                [
+                    (job.chat_id, job.question, job.options, job.correct_option_id, job.user_id, job.phrase)
+                    for job in new_jobs
+                ]
+            )
+            for job, outbox_id in zip(new_jobs, ids):
+                job.outbox_id = outbox_id
+
+        for job in jobs:
+            self._queue_for(job.chat_id).put_nowait((job, batch))
+        return len(jobs)
+
+    def _queue_for(self, chat_id: int) -> asyncio.Queue:
+        if chat_id not in self._queues:
+            self._queues[chat_id] = asyncio.Queue()
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.done():
+            self._workers[chat_id] = asyncio.create_task(self._worker(chat_id))
+        return self._queues[chat_id]
+
+    async def _worker(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        while True:
+            job, batch = await queue.get()
+            try:
+                try:
+                    message = await self._send(job)
+                except NetworkError:
+                    # Left in the outbox, so the next start tries again
+                    logger.error("Giving up on a quiz for chat %s for now", chat_id)
+                    message = None
+                else:
+                    if self.outbox is not None and job.outbox_id is not None:
+                        await self.outbox.finish(job.outbox_id)
+                if message is not None:
+                    batch.messages.append(message)
+                    if batch.on_sent:
+                        await batch.on_sent(job, message)
+            except Exception:
+                logger.exception("Failed to dispatch quiz to chat %s", chat_id)
+            finally:
+                queue.task_done()
+                batch.remaining -= 1
+                if batch.remaining == 0:
+                    await batch.complete()
+
+    async def _send(self, job: PollJob) -> Optional[Message]:
+        """Send the poll; None if Telegram rejected it, NetworkError once out of retries"""
+        attempt = 0
+        while True:
+            waiting_since = time.perf_counter()
+            await self.budget.acquire(job.chat_id)
+            DISPATCH_WAIT.observe(time.perf_counter() - waiting_since)
+            try:
+                return await self._application.bot.send_poll(
+                    chat_id=job.chat_id,
+                    question=job.question,
+                    options=job.options,
+                    type=Poll.QUIZ,
+                    correct_option_id=job.correct_option_id,
+                    is_anonymous=await self._is_anonymous(job.chat_id),
+                )
+            except RetryAfter as exc:
+                # Telegram asked us to slow down, treat it as backpressure for the chat
+                logger.warning(
+                    "Flood limit hit for chat %s, retrying in %ss",
+                    job.chat_id,
+                    exc.retry_after,
+                )
+                self.budget.pause(job.chat_id, exc.retry_after)
+            except BadRequest:
+                # Retrying won't help, e.g. the chat doesn't exist
+                logger.exception("Telegram rejected quiz for chat %s", job.chat_id)
+                return None
+            except NetworkError as exc:
+                # Connection problems and timeouts are usually over soon
+                attempt += 1
+                if attempt >= MAX_SEND_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(
+                    "Sending quiz to chat %s failed (%s), retrying in %.1fs",
+                    job.chat_id,
+                    exc,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+            except TelegramError:
+                logger.exception("Could not send quiz to chat %s", job.chat_id)
+                return None
+
+    async def _is_anonymous(self, chat_id: int) -> bool:
+        """Whether quizzes for the chat have to be anonymous polls
+
+        Answers of anonymous polls don't say who answered, so polls are only
+        anonymous in channels, which don't take any other kind, and in groups
+        with `anonymous_groups`. Telling a channel from a supergroup takes a
+        getChat call, made once per chat.
+        """
+        if chat_id > 0:
+            return False
+        if self.anonymous_groups:
+            return True
+        if chat_id > SUPERGROUP_ID_LIMIT:
+            return False
+        anonymous = self._anonymous_chats.get(chat_id)
+        if anonymous is None:
+            try:
+                chat = await self._application.bot.get_chat(chat_id)
+            except TelegramError as exc:
+                # Sending fails as well if the chat is gone, and says why
+                logger.warning("Could not look up chat %s: %s", chat_id, exc)
+                return False
+            anonymous = self._anonymous_chats[chat_id] = chat.type == ChatType.CHANNEL
+        return anonymous
+
+    def start_replay(
+        self, on_sent: Optional[SentCallback] = None, shards: int = 1, shard_index: int = 0
+    ) -> None:
+        """Run `replay` in the background until it is done or the dispatcher stops"""
+        self._replay_task = asyncio.create_task(self.replay(on_sent, shards, shard_index))
+
+    async def replay(
+        self, on_sent: Optional[SentCallback] = None, shards: int = 1, shard_index: int = 0
+    ) -> int:
+        """Send again what earlier runs left unfinished in the outbox
+
+        Entries are loaded `REPLAY_BATCH` at a time, and the next batch only
+        once the previous one is done, so a huge backlog isn't held in memory.
+        Only entries that existed when the replay started are considered, new
+        ones are already queued by whoever submitted them.
+        """
+        if self.outbox is None:
+            return 0
+        up_to_id = await self.outbox.last_id()
+        after_id = 0
+        replayed = 0
+        while True:
+            rows = await self.outbox.unfinished(
+                after_id, up_to_id, REPLAY_BATCH, shards, shard_index
+            )
+            if not rows:
+                break
+            if not replayed:
+                logger.info("Replaying unfinished quizzes from the outbox")
+            jobs = [PollJob(*row, outbox_id=outbox_id) for outbox_id, row in rows]
+            done = asyncio.Event()
+
+            async def batch_done(messages: List[Message]) -> None:
+                done.set()
+
+            await self.submit(jobs, on_sent=on_sent, on_complete=batch_done)
+            await done.wait()
+            replayed += len(jobs)
+            after_id = rows[-1][0]
+        if replayed:
+            logger.info("Replayed %d quiz(es) from the outbox", replayed)
+        return replayed
@@ -0,0 +1,191 @@
+# flake8: noqa: E501
+
+import random
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from similarity import SimilarityIndex
+
+WRONG_OPTIONS = 3
+
+
+def truncate_translation(translation: str, max_length: int = 95) -> str:
+    """Truncate translation to fit within Telegram's poll option limit"""
+    if len(translation) > max_length:
+        return translation[:max_length] + "..."
+    return translation
+
+
+class OptionPool:
+    """Deduplicated, pre-truncated option strings for one side of a vocabulary
+
+    Options differing only in case count as one, the first spelling is
+    kept, so no wrong option can pass for the correct one. With `hard` set,
+    wrong options are the ones that look most like the correct one instead
+    of random ones, see `SimilarityIndex`.
+    """
+
+    __slots__ = ("options", "_positions", "similar")
+
+    def __init__(self, hard: bool = False) -> None:
+        self.options: List[str] = []
+        # Position of each option by its casefolded text
+        self._positions: Dict[str, int] = {}
+        self.similar: Optional[SimilarityIndex] = SimilarityIndex() if hard else None
+
+    def __len__(self) -> int:
+        return len(self.options)
+
+    def add(self, text: str) -> None:
+        option = truncate_translation(text)
+        key = option.casefold()
+        if key not in self._positions:
+            self._positions[key] = len(self.options)
+            self.options.append(option)
+
+    def _similar(self) -> SimilarityIndex:
+        """The similarity index, extended by the options added since it was last used"""
+        similar = self.similar
+        if len(similar) < len(self.options):
+            similar.extend(self.options[len(similar):])
+        return similar
+
+    def prepare(self, correct_options: Iterable[str]) -> None:
+        """Find the hard options of many questions at once, a no-op in random mode"""
+        if self.similar is None:
+            return
+        positions = [self._positions.get(option.casefold(), -1) for option in correct_options]
+        positions = [position for position in positions if position >= 0]
+        self._similar().neighbours(positions)
+
+    def hardest(self, correct_option: str, k: int = WRONG_OPTIONS) -> Optional[List[str]]:
+        """The `k` options most similar to `correct_option`, None if there are too few"""
+        position = self._positions.get(correct_option.casefold())
+        if position is None:
+            return None
+        neighbours = self._similar().neighbours([position])[0]
+        if len(neighbours) < k:
+            return None
+        return [self.options[neighbour] for neighbour in neighbours[:k]]
+
+    def sample(self, correct_option: str, k: int = WRONG_OPTIONS) -> Optional[List[str]]:
+        """Draw `k` distinct options other than `correct_option`, None if there are too few"""
+        if self.similar is not None:
+            wrong_options = self.hardest(correct_option, k)
+            if wrong_options is not None:
+                return wrong_options
+        options = self.options
+        size = len(options)
+        excluded = self._positions.get(correct_option.casefold(), -1)
+        available = size - (excluded >= 0)
+        if available < k:
+            return None
+
+        # Rejection sampling only pays off when most draws are accepted
+        if available <= 2 * k:
+            candidates = [option for i, option in enumerate(options) if i != excluded]
+            return random.sample(candidates, k)
+
+        picked = set()
+        while len(picked) < k:
+            i = random.randrange(size)
+            if i != excluded:
+                picked.add(i)
+        return [options[i] for i in picked]
+
+    def make_options(self, correct: str) -> Optional[Tuple[List[str], int]]:
+        """Shuffled quiz options for `correct` and the index of the correct one"""
+        correct_option = truncate_translation(correct)
+        wrong_options = self.sample(correct_option)
+        if wrong_options is None:
+            return None
+        all_options = wrong_options + [correct_option]
+        random.shuffle(all_options)
+        return all_options, all_options.index(correct_option)
+
+
+class DistractorIndex:
+    """Option pools of one vocabulary, kept up to date as phrases are added"""
+
+    __slots__ = ("translations", "phrases")
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = (), hard: bool = False) -> None:
+        self.translations = OptionPool(hard)
+        self.phrases = OptionPool(hard)
+        self.add(pairs)
+
+    def __len__(self) -> int:
+        """Number of options of both pools"""
+        return len(self.translations) + len(self.phrases)
+
+    def add(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for phrase, translation in pairs:
+            self.phrases.add(phrase)
+            self.translations.add(translation)
+
+    def prepare(self, mode: str, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Batch the option lookups of the quizzes about to be built for `pairs`"""
+        if mode == "translation":
+            self.translations.prepare(truncate_translation(translation) for _, translation in pairs)
+        else:
+            self.phrases.prepare(truncate_translation(phrase) for phrase, _ in pairs)
+
+    def translation_options(self, translation: str) -> Optional[Tuple[List[str], int]]:
+        """Options for a quiz where the answers are translations"""
+        return self.translations.make_options(translation)
+
+    def phrase_options(self, phrase: str) -> Optional[Tuple[List[str], int]]:
+        """Options for a quiz where the answers are phrases"""
+        return self.phrases.make_options(phrase)
+
+
+class DistractorIndexCache:
+    """Per-user distractor indexes for the most recently active users
+
+    Least recently used indexes are dropped once there are more than
+    `max_users` of them or they hold more than `max_options` options
+    together, since with `hard` every option also has a similarity vector.
+    The index in use is kept however big it is.
+    """
+
+    def __init__(self, max_users: int = 1024, max_options: int = 500_000, hard: bool = False) -> None:
+        self.max_users = max_users
+        self.max_options = max_options
+        self.hard = hard
+        self._indexes: "OrderedDict[int, DistractorIndex]" = OrderedDict()
+        self._options = 0
+
+    def _evict(self) -> None:
+        while len(self._indexes) > 1 and (
+            len(self._indexes) > self.max_users or self._options > self.max_options
+        ):
+            _, index = self._indexes.popitem(last=False)
+            self._options -= len(index)
+
+    def get(self, user_id: int) -> Optional[DistractorIndex]:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+        return index
+
+    def build(self, user_id: int, pairs: Iterable[Tuple[str, str]]) -> DistractorIndex:
+        self.drop(user_id)
+        index = DistractorIndex(pairs, self.hard)
+        self._indexes[user_id] = index
+        self._options += len(index)
+        self._evict()
+        return index
+
+    def add(self, user_id: int, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Extend the user's index if it is loaded, otherwise it is built on next use"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            before = len(index)
+            index.add(pairs)
+            self._options += len(index) - before
+            self._evict()
+
+    def drop(self, user_id: int) -> None:
+        index = self._indexes.pop(user_id, None)
+        if index is not None:
+            self._options -= len(index)
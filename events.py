@@ -0,0 +1,97 @@
+# flake8: noqa: E501
+
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+from storage import AnswerStore
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerEvent(NamedTuple):
+    """A single quiz answer"""
+
+    user_id: int
+    poll_id: str
+    option_id: int
+    # None when we don't know the correct option anymore
+    correct: Optional[bool]
+    answered_at: float
+
+
+class AnswerLog:
+    """Buffers answer events in memory and writes them to the store in batches
+
+    `push` only appends to a ring buffer. The buffer is flushed when it holds
+    `flush_size` events or when `flush` is called by the periodic job. Events
+    being written stay readable until the write commits, and go back in
+    front of the buffer if it fails. If the database falls behind by more
+    than `capacity` events, the oldest ones are dropped and counted in
+    `dropped` instead of growing without bound.
+    """
+
+    def __init__(
+        self, store: AnswerStore, capacity: int = 10000, flush_size: int = 500
+    ) -> None:
+        self.store = store
+        self.flush_size = flush_size
+        self._buffer: Deque[AnswerEvent] = deque(maxlen=capacity)
+        # Batches handed to the store that haven't committed yet
+        self._writing: List[List[AnswerEvent]] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def push(self, event: AnswerEvent) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(event)
+        if len(self._buffer) >= self.flush_size and self._flushing is None:
+            self._flushing = asyncio.create_task(self.flush())
+            self._flushing.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flushing = None
+
+    async def flush(self) -> int:
+        """Write all buffered events, returns how many were written"""
+        events = list(self._buffer)
+        self._buffer.clear()
+        if not events:
+            return 0
+        self._writing.append(events)
+        try:
+            await self.store.append(events)
+        except Exception:
+            logger.exception("Could not write %d answer event(s)", len(events))
+            self._requeue(events)
+            return 0
+        finally:
+            self._writing = [batch for batch in self._writing if batch is not events]
+        return len(events)
+
+    def _requeue(self, events: List[AnswerEvent]) -> None:
+        """Put events that failed to write back in front, dropping the oldest beyond capacity"""
+        backlog = events + list(self._buffer)
+        overflow = len(backlog) - self._buffer.maxlen
+        if overflow > 0:
+            self.dropped += overflow
+            backlog = backlog[overflow:]
+        self._buffer.clear()
+        self._buffer.extend(backlog)
+
+    async def accuracy(self, user_id: int) -> Tuple[int, int]:
+        """Correct and graded answer counts of a user, including unflushed events"""
+        correct, total = await self.store.accuracy(user_id)
+        # Read after the query: batches that committed before it ran are done by now,
+        # their writes finished first on the database thread
+        for batch in (*self._writing, self._buffer):
+            for event in batch:
+                if event.user_id == user_id and event.correct is not None:
+                    total += 1
+                    correct += event.correct
+        return correct, total
@@ -0,0 +1,181 @@
+# flake8: noqa: E501
+
+import logging
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from storage import ScoreStore
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+# Days in the rolling week window, today included
+WEEK_DAYS = 7
+
+WINDOWS = ("day", "week", "all")
+
+
+def day_of(timestamp: float) -> int:
+    """Number of the UTC day `timestamp` falls on"""
+    return int(timestamp // DAY)
+
+
+class Ranking:
+    """Scores of one board, with users grouped by score
+
+    Users with the same score share a bucket, kept in the order they got
+    there, and the distinct scores are kept sorted. Changing a score moves
+    the user between two buckets, and reading the top k walks the buckets
+    from the highest score down, touching at most k of them, however many
+    users there are.
+    """
+
+    __slots__ = ("scores", "buckets", "levels")
+
+    def __init__(self) -> None:
+        self.scores: Dict[int, int] = {}
+        # Users of a score, a dict as an insertion-ordered set
+        self.buckets: Dict[int, Dict[int, None]] = {}
+        self.levels: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, user_id: int, delta: int) -> None:
+        old = self.scores.get(user_id, 0)
+        new = old + delta
+        if old:
+            bucket = self.buckets[old]
+            del bucket[user_id]
+            if not bucket:
+                del self.buckets[old]
+                del self.levels[bisect_left(self.levels, old)]
+        if new <= 0:
+            self.scores.pop(user_id, None)
+            return
+        self.scores[user_id] = new
+        bucket = self.buckets.get(new)
+        if bucket is None:
+            bucket = self.buckets[new] = {}
+            insort(self.levels, new)
+        bucket[user_id] = None
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        """Up to `k` `(user_id, score)` pairs, best first, ties by who got there first"""
+        leaders: List[Tuple[int, int]] = []
+        for score in reversed(self.levels):
+            for user_id in self.buckets[score]:
+                leaders.append((user_id, score))
+                if len(leaders) == k:
+                    return leaders
+        return leaders
+
+    def standing(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """1-based place and score of the user, the place is shared by equal scores"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        above = self.levels[bisect_left(self.levels, score) + 1:]
+        return 1 + sum(len(self.buckets[level]) for level in above), score
+
+
+class ChatBoard:
+    """Day, rolling week and all-time rankings of one chat
+
+    Correct answers are also counted per day for the days of the week
+    window. When a day falls out of the window its counts are taken off the
+    week ranking, so the window rolls without recounting anything.
+    """
+
+    __slots__ = ("today", "rankings", "days")
+
+    def __init__(self, today: int) -> None:
+        self.today = today
+        self.rankings = {window: Ranking() for window in WINDOWS}
+        self.days: Dict[int, Dict[int, int]] = {}
+
+    def roll(self, today: int) -> None:
+        """Move the day and week windows on to `today`"""
+        if today <= self.today:
+            return
+        self.today = today
+        self.rankings["day"] = Ranking()
+        week = self.rankings["week"]
+        for day in [day for day in self.days if day <= today - WEEK_DAYS]:
+            for user_id, correct in self.days.pop(day).items():
+                week.add(user_id, -correct)
+
+    def add(self, user_id: int, day: int, correct: int) -> None:
+        self.rankings["all"].add(user_id, correct)
+        if day <= self.today - WEEK_DAYS:
+            return
+        counts = self.days.setdefault(day, {})
+        counts[user_id] = counts.get(user_id, 0) + correct
+        self.rankings["week"].add(user_id, correct)
+        if day == self.today:
+            self.rankings["day"].add(user_id, correct)
+
+
+class Leaderboard:
+    """Rankings of correct quiz answers per chat, kept up to date answer by answer
+
+    Scores are counted per chat, user and day in the database, so the
+    boards can be rebuilt at startup. Increments are buffered and written
+    together by `flush`, like the answer log.
+    """
+
+    def __init__(self, store: ScoreStore) -> None:
+        self.store = store
+        self._boards: Dict[int, ChatBoard] = {}
+        self.names: Dict[int, str] = {}
+        self._pending: Dict[Tuple[int, int, int], int] = {}
+
+    def _board(self, chat_id: int, today: int) -> ChatBoard:
+        board = self._boards.get(chat_id)
+        if board is None:
+            board = self._boards[chat_id] = ChatBoard(today)
+        else:
+            board.roll(today)
+        return board
+
+    def record(self, chat_id: int, user_id: int, name: str, now: float) -> None:
+        """Count a correct answer in a chat"""
+        today = day_of(now)
+        self._board(chat_id, today).add(user_id, today, 1)
+        self.names[user_id] = name
+        key = (chat_id, user_id, today)
+        self._pending[key] = self._pending.get(key, 0) + 1
+
+    def top(self, chat_id: int, window: str, k: int, now: float) -> List[Tuple[int, int]]:
+        if chat_id not in self._boards:
+            return []
+        return self._board(chat_id, day_of(now)).rankings[window].top(k)
+
+    def standing(self, chat_id: int, window: str, user_id: int, now: float) -> Optional[Tuple[int, int]]:
+        if chat_id not in self._boards:
+            return None
+        return self._board(chat_id, day_of(now)).rankings[window].standing(user_id)
+
+    async def load(self, now: float) -> None:
+        """Rebuild the boards from the stored day counts"""
+        today = day_of(now)
+        for chat_id, user_id, day, correct, name in await self.store.load(today - WEEK_DAYS + 1):
+            self._board(chat_id, today).add(user_id, day, correct)
+            # Rows come oldest first, the newest name wins
+            self.names[user_id] = name
+
+    async def flush(self) -> None:
+        """Write the buffered increments"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            (chat_id, user_id, day, correct, self.names[user_id])
+            for (chat_id, user_id, day), correct in pending.items()
+        ]
+        try:
+            await self.store.add(rows)
+        except Exception:
+            logger.exception("Could not write %d score(s)", len(rows))
+            for key, correct in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + correct
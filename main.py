@@ -1,23 +1,35 @@
 # flake8: noqa: E501
 
+import argparse
+import asyncio
 import logging
-import os
-from dotenv import load_dotenv
 import random
-from typing import Dict
-import asyncio
+import sys
+import tempfile
+import time
+import warnings
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
 
 from telegram import (
+    Bot,
+    CallbackQuery,
+    ChatMember,
     KeyboardButton,
     KeyboardButtonPollType,
+    Message,
     Poll,
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
     Update,
 )
-from telegram.constants import ParseMode
+from telegram.constants import ChatType
+from telegram.error import TelegramError
+from telegram.request import BaseRequest, HTTPXRequest
+from telegram.warnings import PTBUserWarning
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     MessageHandler,
@@ -27,20 +39,72 @@ from telegram.ext import (
     ConversationHandler,
 )
 
-# Load environment variables
-load_dotenv()
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TARGET_CHAT_ID = int(os.getenv("TARGET_CHAT_ID"))
-
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+from config import ConfigurationError, Settings
+from dispatch import PollDispatcher, PollJob
+from events import AnswerEvent, AnswerLog
+from metrics import (
+    ANSWERS_RECEIVED,
+    DISPATCH_QUEUE,
+    HANDLER_LATENCY,
+    OPEN_POLLS,
+    PARSE_ERRORS,
+    POLLS_CLOSED,
+    POLLS_SENT,
+    REGISTERED_POLLS,
+    VOCABULARY_SIZE,
+    InstrumentedRequest,
+    MetricsServer,
+    instrument,
+    slow_handlers,
+)
+from distractors import DistractorIndex, DistractorIndexCache, truncate_translation
+from leaderboard import WEEK_DAYS, WINDOWS, Leaderboard, day_of
+from pages import LIST_VIEW, PICKER_VIEW, PageCache, parse_page_data, picker_links
+from persistence import StatePersistence
+from parsing import iter_file_phrases, parse_phrase_line, parse_phrase_only
+from phrase_table import PhraseTable
+from poll_lifecycle import PollLifecycle
+from poll_registry import PollRegistry
+from profiler import sample_for
+from practice import SESSION_LENGTH, PracticeSession, PracticeSessions
+from quiz_pool import POOL_SIZE, QuizPool, QuizPoolCache
+from scheduler import ReviewScheduler
+from search import SearchIndex, SearchIndexCache
+from sharding import ShardClient, run_sharded, shard_of
+from storage import (
+    AnswerStore,
+    Database,
+    OutboxStore,
+    ReviewStore,
+    ScoreStore,
+    StateStore,
+    TargetStore,
+    TranslationStore,
+    VocabularyStore,
 )
-# set higher logging level for httpx to avoid all GET and POST requests being logged
-logging.getLogger("httpx").setLevel(logging.WARNING)
+from translator import Translator, create_backend
+from update_processor import PerUserUpdateProcessor
 
 logger = logging.getLogger(__name__)
 
+# Number of overdue phrases offered by the "Due" option
+DUE_QUIZ_LIMIT = 20
+# Quizzes built between yields to the event loop when sending all phrases
+QUIZ_BUILD_CHUNK = 500
+# Chats a user's quizzes can be sent to at the same time
+MAX_TARGET_CHATS = 10
+# Matches listed by /find
+FIND_RESULT_LIMIT = 15
+# Places shown by /leaderboard
+LEADERBOARD_SIZE = 10
+# Longest and default /profile run, in seconds
+PROFILE_MAX_SECONDS = 120
+PROFILE_DEFAULT_SECONDS = 10
+
+# Bulk import settings
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_PROGRESS_INTERVAL = 3
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
 
 # Conversation states
 WAITING_FOR_PHRASE = 0
@@ -49,15 +113,97 @@ WAITING_FOR_MIX_PHRASES_REVERSED = 2
 SELECTING_QUIZ_MODE = 3
 SELECTING_PHRASES = 4
 
-# Dictionary to store user phrases
-user_phrases: Dict[int, Dict[str, str]] = {}
+# Services that depend on the settings are created by configure()
+settings: Settings
+# Persistent storage of user phrases and their review schedule
+database: Database
+vocabulary: VocabularyStore
+# Chats users registered for their quizzes
+targets: TargetStore
+# Spaced repetition schedules of all phrases, read by due time
+review_scheduler: ReviewScheduler
+# Quiz answers, written to the database in batches
+answer_log: AnswerLog
+# Sent polls we may still have to stop
+poll_registry: PollRegistry
+# Rankings of correct answers per chat
+leaderboard: Leaderboard
+# Answer tallies of open polls and their closing deadlines
+poll_lifecycle: PollLifecycle
+# Conversations, user_data and bot_data, plus quiz info of sent polls
+persistence: StatePersistence
+# Local /metrics endpoint, only started when a metrics port is set
+metrics_server: Optional[MetricsServer] = None
+# Fills in pasted lines without a translation, only set up when a backend is configured
+translator: Optional[Translator] = None
+# Connection to the front process when running as a shard worker
+shard_client: Optional[ShardClient] = None
+# Sampling run started by /profile, at most one at a time
+profile_task: Optional[asyncio.Task] = None
+
+# Wrong answer pools of recently active users
+distractor_indexes = DistractorIndexCache()
+
+# One-at-a-time quiz sessions in private chats
+practice_sessions = PracticeSessions()
+
+# /find indexes of recently active users
+search_indexes = SearchIndexCache()
+
+# Rendered pages of /list and the phrase picker
+phrase_pages = PageCache()
+
+# Quizzes built ahead of time for "📋 All"
+quiz_pools = QuizPoolCache(lambda user_id, mode: build_quiz_pool(user_id, mode))
+
+# Background sender for all quizzes, configure() attaches its outbox
+poll_dispatcher = PollDispatcher()
+DISPATCH_QUEUE.set_function(poll_dispatcher.pending)
+
+
+def configure(new_settings: Settings) -> None:
+    """Create the services that depend on the settings"""
+    global settings, database, vocabulary, targets, review_scheduler, answer_log, leaderboard, poll_registry, poll_lifecycle, persistence, metrics_server, translator
+    settings = new_settings
+    database = Database(settings.database_path)
+    vocabulary = VocabularyStore(database)
+    targets = TargetStore(database)
+    review_scheduler = ReviewScheduler(ReviewStore(database), settings.shards, settings.shard_index)
+    answer_log = AnswerLog(AnswerStore(database))
+    leaderboard = Leaderboard(ScoreStore(database))
+    poll_registry = PollRegistry(settings.poll_registry_size, settings.poll_registry_ttl)
+    poll_lifecycle = PollLifecycle(settings.poll_close_voters, settings.poll_open_period)
+    persistence = StatePersistence(
+        StateStore(database), settings.persistence_interval, settings.poll_registry_ttl
+    )
+    poll_dispatcher.outbox = OutboxStore(database)
+    poll_dispatcher.anonymous_groups = settings.anonymous_group_quizzes
+    distractor_indexes.hard = settings.hard_distractors
+    slow_handlers.threshold = settings.slow_handler_threshold
+    REGISTERED_POLLS.set_function(lambda: len(poll_registry))
+    OPEN_POLLS.set_function(lambda: len(poll_lifecycle))
+    if settings.metrics_port:
+        metrics_server = MetricsServer(settings.metrics_port, collect=collect_metrics)
+    if settings.translation_backend:
+        translator = Translator(
+            create_backend(settings.translation_backend, settings.translation_model),
+            TranslationStore(database),
+            settings.translation_language,
+            settings.translation_concurrency,
+            settings.translation_timeout,
+        )
 
 
+@instrument
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Inform user about what this bot can do"""
     await update.message.reply_text(
         "Welcome to the Translation Quiz Bot! 🎯\n\n"
         "📋 /list – See your phrases\n"
+        "🔍 /find – Search your phrases and translations\n"
+        "🏋️ /practice – Answer quizzes one by one in this chat\n"
+        "🎯 /targets – See where your quizzes are sent\n"
+        "🎯 /progress – See how well you answer quizzes\n"
         "ℹ️ /help – More information\n"
         "🔀 /create_quiz_mix_answers – Create quizzes with mixed answers\n"
         "🔄 /create_quiz_mix_phrases – Create quizzes with mixed phrases\n"
@@ -66,6 +212,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
 
 
+def translate_hint() -> str:
+    if translator is None:
+        return ""
+    return "🤖 Send just the phrase and I'll add the translation for you.\n\n"
+
+
+@instrument
 async def add_quiz_mix(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of adding new mixed quizzes"""
     await update.message.reply_text(
@@ -73,6 +226,7 @@ async def add_quiz_mix(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         "`phrase - translation`\n\n"
         "📄 You can send multiple phrases at once, one per line.\n"
         "🤓 I will create quizzes where incorrect options are correct translations of other phrases!\n\n"
+        f"{translate_hint()}"
         "📌 Example:\n"
         "`buzzkill - душніла, зануда`\n"
         "`no rush - не спіши`",
@@ -81,6 +235,7 @@ async def add_quiz_mix(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return WAITING_FOR_MIX_PHRASE
 
 
+@instrument
 async def add_quiz_mix_phrases(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
@@ -90,6 +245,7 @@ async def add_quiz_mix_phrases(
         "`phrase - translation`\n\n"
         "📄 You can send multiple phrases at once, one per line.\n"
         "🎯 I will create quizzes where the *translation* is the question and the *phrase* is the answer!\n\n"
+        f"{translate_hint()}"
         "📌 Example:\n"
         "`hello - привіт`\n"
         "`goodbye - до побачення`",
@@ -98,110 +254,330 @@ async def add_quiz_mix_phrases(
     return WAITING_FOR_MIX_PHRASES_REVERSED
 
 
-def truncate_translation(translation: str, max_length: int = 95) -> str:
-    """Truncate translation to fit within Telegram's poll option limit"""
-    if len(translation) > max_length:
-        return translation[:max_length] + "..."
-    return translation
+async def remember_poll(job: PollJob, message: Message) -> None:
+    """Save quiz info of a sent poll for later use"""
+    POLLS_SENT.inc()
+    sent_at = time.time()
+    quiz_data = {
+        "chat_id": job.chat_id,
+        "message_id": message.message_id,
+        "user_id": job.user_id,
+        "phrase": job.phrase,
+        "correct_option_id": job.correct_option_id,
+        "sent_at": sent_at,
+    }
+    poll_registry.add(message.poll.id, quiz_data)
+    poll_lifecycle.open(message.poll.id, sent_at)
+    persistence.remember_poll(message.poll.id, quiz_data)
+    if shard_client is not None:
+        shard_client.claim_poll(message.poll.id)
+
+
+async def find_poll(poll_id: str) -> Optional[Dict[str, Any]]:
+    """Quiz info of a sent poll, read back from the database after a restart"""
+    quiz_data = poll_registry.get(poll_id)
+    if quiz_data is None:
+        quiz_data = await persistence.load_poll(poll_id)
+        if quiz_data is not None:
+            poll_registry.add(poll_id, quiz_data)
+    return quiz_data
+
+
+async def close_poll(bot: Bot, poll_id: str, reason: str) -> None:
+    """Stop a sent poll and forget about it"""
+    poll_lifecycle.close(poll_id)
+    quiz_data = await find_poll(poll_id)
+    poll_registry.close(poll_id)
+    persistence.forget_poll(poll_id)
+    if quiz_data is None:
+        return
+    try:
+        await bot.stop_poll(quiz_data["chat_id"], quiz_data["message_id"])
+    except TelegramError as exc:
+        # e.g. the message was deleted, there is nothing left to close
+        logger.warning("Could not close poll %s: %s", poll_id, exc)
+        return
+    POLLS_CLOSED.inc(reason=reason)
 
 
-async def receive_mix_phrase(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Parse phrases and create mixed quizzes where wrong answers are other correct translations"""
-    user_id = update.effective_user.id
-    text = update.message.text.strip()
+async def target_chats(user_id: Optional[int]) -> List[int]:
+    """Chats the user registered for their quizzes, or the default target chat"""
+    chat_ids = await targets.get(user_id) if user_id is not None else []
+    return chat_ids or [settings.target_chat_id]
 
-    # Initialize user's phrase dictionary if it doesn't exist
-    if user_id not in user_phrases:
-        user_phrases[user_id] = {}
 
-    # Split input into lines and process each line
-    lines = text.split("\n")
-    phrases_and_translations = []
-    added_count = 0
-    error_count = 0
-    duplicate_count = 0
-    quiz_messages = []
+async def fan_out(jobs: List[PollJob]) -> List[PollJob]:
+    """A copy of every quiz for each target chat of its owner
 
-    # First, collect all valid phrases and translations
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
+    The dispatcher has a queue per chat, so the copies are sent concurrently
+    and a slow chat only delays its own quizzes.
+    """
+    fanned_out = []
+    for job in jobs:
+        for chat_id in await target_chats(job.user_id):
+            fanned_out.append(replace(job, chat_id=chat_id))
+    return fanned_out
 
-        line = line.replace("✅", "").strip()
-        parts = line.split(" - ", 1)
-        if len(parts) != 2:
-            error_count += 1
-            continue
 
-        phrase, translation = parts
-        phrase = phrase.strip()
-        translation = translation.strip()
+async def queue_quizzes(
+    context: ContextTypes.DEFAULT_TYPE,
+    jobs: List[PollJob],
+    notify_chat_id: Optional[int] = None,
+) -> int:
+    """Send quizzes to their target chats and optionally report back once all of them are sent"""
 
-        if translation.endswith("."):
-            translation = translation[:-1]
+    async def notify_user(messages: List[Message]) -> None:
+        await context.bot.send_message(
+            notify_chat_id, f"🎯 Sent {len(messages)} quiz(es) to the target chat(s)!"
+        )
 
-        # Add to phrases_and_translations for quiz creation regardless of duplicates
-        phrases_and_translations.append((phrase, translation))
+    if not jobs:
+        return 0
+    return await poll_dispatcher.submit(
+        await fan_out(jobs),
+        on_sent=remember_poll,
+        on_complete=notify_user if notify_chat_id is not None else None,
+    )
 
-        # Only add to user_phrases if it's not a duplicate
-        if phrase not in user_phrases[user_id]:
-            user_phrases[user_id][phrase] = translation
-            added_count += 1
-        else:
-            duplicate_count += 1
 
-    # Now create quizzes using other translations as wrong answers
-    for phrase, correct_translation in phrases_and_translations:
-        # Get other translations as wrong options
-        other_translations = [
-            t for p, t in phrases_and_translations if t != correct_translation
-        ]
+def translation_quiz(
+    distractors: DistractorIndex, user_id: int, phrase: str, translation: str
+) -> Optional[PollJob]:
+    """Quiz where the question is a phrase and the answers are translations"""
+    options = distractors.translation_options(translation)
+    if options is None:
+        return None
+    all_options, correct_index = options
+    return PollJob(
+        chat_id=settings.target_chat_id,
+        question=f"📝 Який правильний переклад «{phrase}»?",
+        options=all_options,
+        correct_option_id=correct_index,
+        user_id=user_id,
+        phrase=phrase,
+    )
 
-        # If we don't have enough other translations, skip this phrase
-        if len(other_translations) < 3:
-            continue
 
-        # Select 3 random translations as wrong options
-        wrong_options = random.sample(
-            other_translations, min(3, len(other_translations))
+def phrase_quiz(
+    distractors: DistractorIndex, user_id: int, phrase: str, translation: str
+) -> Optional[PollJob]:
+    """Quiz where the question is a translation and the answers are phrases"""
+    options = distractors.phrase_options(phrase)
+    if options is None:
+        return None
+    all_options, correct_index = options
+    return PollJob(
+        chat_id=settings.target_chat_id,
+        question=f"📝 What is the English phrase for «{translation}»?",
+        options=all_options,
+        correct_option_id=correct_index,
+        user_id=user_id,
+        phrase=phrase,
+    )
+
+
+def build_quizzes(
+    distractors: DistractorIndex,
+    user_id: int,
+    mode: str,
+    pairs: List[Tuple[str, str]],
+) -> List[PollJob]:
+    """Quizzes in the given mode, phrases without enough wrong answers are skipped"""
+    build_quiz = translation_quiz if mode == "translation" else phrase_quiz
+    distractors.prepare(mode, pairs)
+    quiz_jobs = []
+    for phrase, translation in pairs:
+        quiz = build_quiz(distractors, user_id, phrase, translation)
+        if quiz is not None:
+            quiz_jobs.append(quiz)
+    return quiz_jobs
+
+
+async def build_quiz_pool(user_id: int, mode: str) -> QuizPool:
+    """Quizzes for the first phrases of the user, ready for the "📋 All" option"""
+    phrases = await vocabulary.get_phrases(user_id)
+    distractors = await get_distractor_index(user_id)
+    pairs = phrases.slice(0, POOL_SIZE)
+    return QuizPool(build_quizzes(distractors, user_id, mode, pairs), len(pairs))
+
+
+async def queue_all_quizzes(
+    context: ContextTypes.DEFAULT_TYPE,
+    user_id: int,
+    mode: str,
+    phrases: PhraseTable,
+    notify_chat_id: int,
+) -> Tuple[int, int]:
+    """Queue quizzes for all phrases, starting right away with the ready pool
+
+    Whatever the pool doesn't cover is built in the background in chunks, so
+    a large vocabulary neither delays the first poll nor blocks other updates.
+    Returns the number of quizzes queued and the most that can still follow,
+    phrases without enough wrong answers are skipped when they are built.
+    """
+    pool = quiz_pools.take(user_id, mode)
+    ready, covered = (pool.jobs, pool.covered) if pool else ([], 0)
+    # Snapshot, the cached table may change while we are building
+    pairs = phrases.slice(covered)
+    if len(pairs) <= QUIZ_BUILD_CHUNK:
+        distractors = await get_distractor_index(user_id)
+        quiz_jobs = ready + build_quizzes(distractors, user_id, mode, pairs)
+        return await queue_quizzes(context, quiz_jobs, notify_chat_id), 0
+
+    sent_first: List[Message] = []
+
+    async def count_first(messages: List[Message]) -> None:
+        sent_first.extend(messages)
+
+    async def notify_user(messages: List[Message]) -> None:
+        # Every chat gets both parts in order, so the first one is done by now
+        await context.bot.send_message(
+            notify_chat_id,
+            f"🎯 Sent {len(sent_first) + len(messages)} quiz(es) to the target chat(s)!",
+        )
+
+    async def build_rest() -> None:
+        distractors = await get_distractor_index(user_id)
+        quiz_jobs: List[PollJob] = []
+        for start in range(0, len(pairs), QUIZ_BUILD_CHUNK):
+            chunk = pairs[start:start + QUIZ_BUILD_CHUNK]
+            quiz_jobs.extend(build_quizzes(distractors, user_id, mode, chunk))
+            await asyncio.sleep(0)
+        await poll_dispatcher.submit(
+            await fan_out(quiz_jobs), on_sent=remember_poll, on_complete=notify_user
         )
 
-        # Truncate all options to fit within Telegram's limit
-        truncated_translation = truncate_translation(correct_translation)
-        truncated_incorrect = [truncate_translation(opt) for opt in wrong_options]
+    ready = await fan_out(ready)
+    queued = await poll_dispatcher.submit(ready, on_sent=remember_poll, on_complete=count_first)
+    context.application.create_task(build_rest())
+    return queued, len(pairs) * len(await target_chats(user_id))
+
+
+async def get_distractor_index(user_id: int) -> DistractorIndex:
+    """Distractor index over the user's whole vocabulary, built on first use"""
+    index = distractor_indexes.get(user_id)
+    if index is None:
+        phrases = await vocabulary.get_phrases(user_id)
+        index = distractor_indexes.build(user_id, phrases.items())
+    return index
+
+
+def get_search_index(user_id: int, phrases: PhraseTable) -> SearchIndex:
+    """Search index over the user's whole vocabulary, built on first use"""
+    index = search_indexes.get(user_id)
+    # Positions have to line up with the vocabulary, rebuild if they drifted
+    if index is None or len(index) != len(phrases):
+        index = search_indexes.build(user_id, phrases.items())
+    return index
+
+
+async def add_user_phrases(user_id: int, pairs: List[Tuple[str, str]]) -> int:
+    """Save phrases for the user and keep the derived indexes in sync"""
+    added = await vocabulary.add_phrases(user_id, pairs)
+    distractor_indexes.add(user_id, added)
+    search_indexes.add(user_id, added)
+    if added:
+        phrase_pages.invalidate(user_id)
+        quiz_pools.invalidate(user_id)
+        await review_scheduler.track(user_id, (phrase for phrase, _ in added), time.time())
+    return len(added)
+
+
+async def clear_user_phrases(user_id: int) -> int:
+    """Remove all phrases of the user together with the derived indexes"""
+    removed = await vocabulary.clear(user_id)
+    distractor_indexes.drop(user_id)
+    search_indexes.drop(user_id)
+    phrase_pages.invalidate(user_id)
+    quiz_pools.invalidate(user_id)
+    await review_scheduler.forget_user(user_id)
+    return removed
+
+
+@instrument
+async def send_due_quizzes(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job sending the most overdue phrases of all users to the target chat"""
+    now = time.time()
+    due = await review_scheduler.pop_due(now, settings.review_budget)
+    quiz_jobs = []
+    unsent = []
+    for user_id, phrase in due:
+        translation = await vocabulary.get_translation(user_id, phrase)
+        if translation is None:
+            continue
+        distractors = await get_distractor_index(user_id)
+        build_quiz = random.choice((translation_quiz, phrase_quiz))
+        quiz = build_quiz(distractors, user_id, phrase, translation)
+        if quiz is not None:
+            quiz_jobs.append(quiz)
+        else:
+            unsent.append((user_id, phrase))
+    # Not enough wrong answers yet, they stay due instead of waiting a day
+    await review_scheduler.release(unsent, now)
+    if quiz_jobs:
+        logger.info("Sending %d due quiz(es)", len(quiz_jobs))
+        await queue_quizzes(context, quiz_jobs)
+
+
+async def collect_pasted_phrases(text: str) -> Tuple[List[Tuple[str, str]], int]:
+    """Phrases of a pasted message and the number of lines that couldn't be used
+
+    With a translator configured, lines holding just a phrase are translated,
+    all of them with a single model call.
+    """
+    pairs: List[Optional[Tuple[str, str]]] = []
+    untranslated = {}
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        pair = parse_phrase_line(line)
+        if pair is None and translator is not None:
+            phrase = parse_phrase_only(line)
+            if phrase is not None:
+                untranslated[len(pairs)] = phrase
+        pairs.append(pair)
+
+    if untranslated:
+        translations = await translator.translate(list(untranslated.values()))
+        for i, phrase in untranslated.items():
+            if phrase in translations:
+                pairs[i] = (phrase, translations[phrase])
+
+    error_count = pairs.count(None)
+    if error_count:
+        PARSE_ERRORS.inc(error_count)
+    return [pair for pair in pairs if pair is not None], error_count
+
+
+@instrument
+async def receive_mix_phrase(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Parse phrases and create mixed quizzes where wrong answers are other correct translations"""
+    user_id = update.effective_user.id
+    text = update.message.text.strip()
 
-        # Combine all options and shuffle them
-        all_options = [truncated_translation] + truncated_incorrect
-        random.shuffle(all_options)
+    quiz_jobs = []
 
-        # Find the index of the correct answer
-        correct_index = all_options.index(truncated_translation)
+    # First, collect all valid phrases and translations, duplicates included
+    phrases_and_translations, error_count = await collect_pasted_phrases(text)
 
-        # Create quiz for this phrase in the target chat
-        message = await context.bot.send_poll(
-            chat_id=TARGET_CHAT_ID,
-            question=f"📝 Який правильний переклад «{phrase}»?",
-            options=all_options,
-            type=Poll.QUIZ,
-            correct_option_id=correct_index,
-        )
+    # Save the whole message in one batch, duplicates are skipped by the store
+    added_count = await add_user_phrases(user_id, phrases_and_translations)
+    duplicate_count = len(phrases_and_translations) - added_count
 
-        # Add 2-second delay between polls
-        await asyncio.sleep(2)
+    # Now create quizzes using other translations from this message as wrong answers
+    distractors = DistractorIndex(phrases_and_translations, distractor_indexes.hard)
+    distractors.prepare("translation", phrases_and_translations)
+    for phrase, translation in phrases_and_translations:
+        # Phrases without enough other translations are skipped
+        quiz = translation_quiz(distractors, user_id, phrase, translation)
+        if quiz is not None:
+            quiz_jobs.append(quiz)
 
-        # Save quiz info for later use
-        payload = {
-            message.poll.id: {
-                "chat_id": TARGET_CHAT_ID,
-                "message_id": message.message_id,
-            }
-        }
-        context.bot_data.update(payload)
-        quiz_messages.append(message)
+    # Hand the quizzes over to the dispatcher, the user is notified once they are sent
+    queued_count = await queue_quizzes(context, quiz_jobs, update.effective_chat.id)
 
     # Send feedback to user
-    if added_count > 0 or quiz_messages:
+    if added_count > 0 or queued_count:
         message = f"✅ Successfully added {added_count} phrase(s)!\n"
         if duplicate_count > 0:
             message += (
@@ -209,7 +585,7 @@ async def receive_mix_phrase(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
         if error_count > 0:
             message += f"❌ {error_count} line(s) couldn't be processed.\n"
-        message += f"\nCreated {len(quiz_messages)} mixed quiz(es) in the target chat!"
+        message += f"\nQueued {queued_count} mixed quiz(es) for the target chat(s)!"
     else:
         message = "❌ No phrases were added. Please make sure to use the format:\nphrase - translation"
 
@@ -217,6 +593,7 @@ async def receive_mix_phrase(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 
+@instrument
 async def receive_mix_phrases_reversed(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
@@ -224,94 +601,29 @@ async def receive_mix_phrases_reversed(
     user_id = update.effective_user.id
     text = update.message.text.strip()
 
-    # Initialize user's phrase dictionary if it doesn't exist
-    if user_id not in user_phrases:
-        user_phrases[user_id] = {}
-
-    # Split input into lines and process each line
-    lines = text.split("\n")
-    phrases_and_translations = []
-    added_count = 0
-    error_count = 0
-    duplicate_count = 0
-    quiz_messages = []
-
-    # First, collect all valid phrases and translations
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        line = line.replace("✅", "").strip()
-        parts = line.split(" - ", 1)
-        if len(parts) != 2:
-            error_count += 1
-            continue
-
-        phrase, translation = parts
-        phrase = phrase.strip()
-        translation = translation.strip()
-
-        if translation.endswith("."):
-            translation = translation[:-1]
+    quiz_jobs = []
 
-        # Add to phrases_and_translations for quiz creation regardless of duplicates
-        phrases_and_translations.append((phrase, translation))
+    # First, collect all valid phrases and translations, duplicates included
+    phrases_and_translations, error_count = await collect_pasted_phrases(text)
 
-        # Only add to user_phrases if it's not a duplicate
-        if phrase not in user_phrases[user_id]:
-            user_phrases[user_id][phrase] = translation
-            added_count += 1
-        else:
-            duplicate_count += 1
+    # Save the whole message in one batch, duplicates are skipped by the store
+    added_count = await add_user_phrases(user_id, phrases_and_translations)
+    duplicate_count = len(phrases_and_translations) - added_count
 
-    # Now create quizzes using other phrases as wrong answers
+    # Now create quizzes using other phrases from this message as wrong answers
+    distractors = DistractorIndex(phrases_and_translations, distractor_indexes.hard)
+    distractors.prepare("phrase", phrases_and_translations)
     for phrase, translation in phrases_and_translations:
-        # Get other phrases as wrong options
-        other_phrases = [p for p, t in phrases_and_translations if p != phrase]
-
-        # If we don't have enough other phrases, skip this translation
-        if len(other_phrases) < 3:
-            continue
-
-        # Select 3 random phrases as wrong options
-        wrong_options = random.sample(other_phrases, min(3, len(other_phrases)))
-
-        # Truncate all options to fit within Telegram's limit
-        truncated_phrase = truncate_translation(phrase)
-        truncated_incorrect = [truncate_translation(opt) for opt in wrong_options]
-
-        # Combine all options and shuffle them
-        all_options = [truncated_phrase] + truncated_incorrect
-        random.shuffle(all_options)
+        # Translations without enough other phrases are skipped
+        quiz = phrase_quiz(distractors, user_id, phrase, translation)
+        if quiz is not None:
+            quiz_jobs.append(quiz)
 
-        # Find the index of the correct answer
-        correct_index = all_options.index(truncated_phrase)
-
-        # Create quiz for this translation in the target chat
-        message = await context.bot.send_poll(
-            chat_id=TARGET_CHAT_ID,
-            question=f"📝 What is the English phrase for «{translation}»?",
-            options=all_options,
-            type=Poll.QUIZ,
-            correct_option_id=correct_index,
-        )
-
-        # Add 2-second delay between polls
-        await asyncio.sleep(2)
-
-        # Save quiz info for later use
-        payload = {
-            message.poll.id: {
-                "chat_id": TARGET_CHAT_ID,
-                "message_id": message.message_id,
-            }
-        }
-        context.bot_data.update(payload)
-        quiz_messages.append(message)
+    # Hand the quizzes over to the dispatcher, the user is notified once they are sent
+    queued_count = await queue_quizzes(context, quiz_jobs, update.effective_chat.id)
 
     # Send feedback to user
-    if added_count > 0 or quiz_messages:
+    if added_count > 0 or queued_count:
         message = f"✅ Successfully added {added_count} phrase(s)!\n"
         if duplicate_count > 0:
             message += (
@@ -319,7 +631,7 @@ async def receive_mix_phrases_reversed(
             )
         if error_count > 0:
             message += f"❌ {error_count} line(s) couldn't be processed.\n"
-        message += f"\nCreated {len(quiz_messages)} mixed quiz(es) in the target chat!"
+        message += f"\nQueued {queued_count} mixed quiz(es) for the target chat(s)!"
     else:
         message = "❌ No phrases were added. Please make sure to use the format:\nphrase - translation"
 
@@ -327,70 +639,202 @@ async def receive_mix_phrases_reversed(
     return ConversationHandler.END
 
 
+@instrument
+async def receive_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Import phrases from an uploaded .txt, .csv or .tsv file"""
+    user_id = update.effective_user.id
+    document = update.message.document
+
+    # Bots can't download files bigger than this
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            "❌ This file is too big, please split it into files of up to 20 MB."
+        )
+        return
+
+    progress = await update.message.reply_text(f"⏳ Importing {document.file_name}...")
+    added_count = 0
+    total_count = 0
+    error_count = 0
+    last_update = time.monotonic()
+
+    # Spool the download to disk and parse it line by line, so only one
+    # chunk of phrases is held in memory at a time
+    with tempfile.TemporaryFile() as file:
+        tg_file = await document.get_file()
+        await tg_file.download_to_memory(out=file)
+        file.seek(0)
+
+        chunk = []
+        for pair in iter_file_phrases(file, document.file_name):
+            if pair is None:
+                error_count += 1
+                PARSE_ERRORS.inc()
+                continue
+            chunk.append(pair)
+            if len(chunk) < IMPORT_CHUNK_SIZE:
+                continue
+
+            added_count += await add_user_phrases(user_id, chunk)
+            total_count += len(chunk)
+            chunk = []
+            # Edits are rate limited too, so don't report every chunk
+            if time.monotonic() - last_update >= IMPORT_PROGRESS_INTERVAL:
+                last_update = time.monotonic()
+                await progress.edit_text(
+                    f"⏳ Importing {document.file_name}: {total_count} line(s) processed..."
+                )
+
+        if chunk:
+            added_count += await add_user_phrases(user_id, chunk)
+            total_count += len(chunk)
+
+    message = f"✅ Imported {added_count} new phrase(s) from {document.file_name}!\n"
+    if total_count > added_count:
+        message += f"⚠️ Skipped {total_count - added_count} duplicate phrase(s) in your vocabulary.\n"
+    if error_count > 0:
+        message += f"❌ {error_count} line(s) couldn't be processed.\n"
+    await progress.edit_text(message)
+
+
+@instrument
 async def list_phrases(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show all phrases added by the user"""
     user_id = update.effective_user.id
-    if user_id not in user_phrases or not user_phrases[user_id]:
+    phrases = await vocabulary.get_phrases(user_id)
+    if not phrases:
         await update.message.reply_text(
             "You haven't added any phrases yet. Use /create_quiz_mix_answers or /create_quiz_mix_phrases to add some!"
         )
         return
 
-    message = "📚 Your phrases:\n\n"
-    for phrase, translation in user_phrases[user_id].items():
-        message += f"✅ {phrase} - {translation}\n"
+    message, reply_markup = phrase_pages.get(user_id, phrases, 0, LIST_VIEW)
+    await update.message.reply_text(message, reply_markup=reply_markup)
 
-    await update.message.reply_text(message)
 
+async def pressed_page(query: CallbackQuery) -> Optional[Tuple[int, str, int]]:
+    """Owner, view and page of a pressed page button, None after telling the user why not"""
+    parsed = parse_page_data(query.data)
+    if parsed is None:
+        await query.answer("This list is outdated, send /list again.", show_alert=True)
+        return None
+    # Buttons in group chats can be pressed by anyone, only the owner may use them
+    if parsed[0] != query.from_user.id:
+        await query.answer("Only the user who asked for this list can turn its pages.", show_alert=True)
+        return None
+    return parsed
+
+
+@instrument
+async def turn_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show another page of the phrase list or the phrase picker"""
+    query = update.callback_query
+    parsed = await pressed_page(query)
+    if parsed is None:
+        return
+    owner, view, page = parsed
+    phrases = await vocabulary.get_phrases(owner)
+    message, reply_markup = phrase_pages.get(owner, phrases, page, view)
+    await query.answer()
+    if message != query.message.text:
+        await query.edit_message_text(message, reply_markup=reply_markup)
+
+
+@instrument
+async def find_phrases(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the phrases whose phrase or translation contains the query"""
+    query = " ".join(context.args)
+    if not query.strip():
+        await update.message.reply_text(
+            "🔍 Send /find <text> to search your phrases and translations."
+        )
+        return
+
+    user_id = update.effective_user.id
+    phrases = await vocabulary.get_phrases(user_id)
+    if not phrases:
+        await update.message.reply_text(
+            "You haven't added any phrases yet. Use /create_quiz_mix_answers or /create_quiz_mix_phrases to add some!"
+        )
+        return
 
-TOTAL_VOTER_COUNT = 3
+    index = get_search_index(user_id, phrases)
+    positions = index.find(query, FIND_RESULT_LIMIT + 1)
+    if not positions:
+        await update.message.reply_text(f"🔍 Nothing matches \"{query}\".")
+        return
 
+    message = f"🔍 Phrases matching \"{query}\":\n\n"
+    for position in positions[:FIND_RESULT_LIMIT]:
+        phrase, translation = phrases.item(position)
+        message += f"{position + 1}. {truncate_translation(phrase)} - {truncate_translation(translation)}\n"
+    if len(positions) > FIND_RESULT_LIMIT:
+        message += f"\nShowing the first {FIND_RESULT_LIMIT}, try a longer query to narrow it down.\n"
+    message += "\nOpen a page to pick one of them for a quiz."
+    await update.message.reply_text(
+        message, reply_markup=picker_links(user_id, positions[:FIND_RESULT_LIMIT])
+    )
 
-async def receive_poll_answer(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
-) -> None:
-    """Summarize a users poll vote"""
+
+@instrument
+async def receive_quiz_vote(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Log a quiz answer and reschedule the phrase when its owner answered"""
     answer = update.poll_answer
-    answered_poll = context.bot_data[answer.poll_id]
-    try:
-        questions = answered_poll["questions"]
-    # this means this poll answer update is from an old poll, we can't do our answering then
-    except KeyError:
+    ANSWERS_RECEIVED.inc()
+    # answers on behalf of a chat are anonymous, there is nobody to track
+    if answer.user is None:
         return
-    selected_options = answer.option_ids
-    answer_string = ""
-    for question_id in selected_options:
-        if question_id != selected_options[-1]:
-            answer_string += questions[question_id] + " and "
-        else:
-            answer_string += questions[question_id]
-    await context.bot.send_message(
-        answered_poll["chat_id"],
-        f"{update.effective_user.mention_html()} feels {answer_string}!",
-        parse_mode=ParseMode.HTML,
-    )
-    answered_poll["answers"] += 1
-    # Close poll after three participants voted
-    if answered_poll["answers"] == TOTAL_VOTER_COUNT:
-        await context.bot.stop_poll(
-            answered_poll["chat_id"], answered_poll["message_id"]
+    quiz_data = await find_poll(answer.poll_id)
+    correct = None
+    if quiz_data is not None:
+        correct = tuple(answer.option_ids) == (quiz_data["correct_option_id"],)
+    answer_log.push(
+        AnswerEvent(
+            user_id=answer.user.id,
+            poll_id=answer.poll_id,
+            option_id=answer.option_ids[0] if answer.option_ids else -1,
+            correct=correct,
+            answered_at=time.time(),
         )
+    )
+    if correct:
+        leaderboard.record(quiz_data["chat_id"], answer.user.id, answer.user.full_name, time.time())
+    if poll_lifecycle.record_answer(answer.poll_id, answer.user.id, answer.option_ids):
+        await close_poll(context.bot, answer.poll_id, "voters")
+    session = practice_sessions.get(answer.user.id)
+    if session is not None and session.poll_id == answer.poll_id:
+        # The learner is waiting for the next quiz
+        await continue_practice(context.bot, session, bool(correct))
+
+    if quiz_data is None or quiz_data.get("phrase") is None:
+        return
+    # only the learner who owns the vocabulary is scheduled, written with the next answer batch
+    if answer.user.id != quiz_data["user_id"]:
+        return
+    review_scheduler.record(quiz_data["user_id"], quiz_data["phrase"], correct, time.time())
+
+
+@instrument
+async def receive_poll_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Take in the answer totals of a sent poll and close it once enough people answered"""
+    poll = update.poll
+    if poll.is_closed:
+        # Closed by us or by hand, either way it can't be answered anymore
+        poll_lifecycle.close(poll.id)
+        poll_registry.close(poll.id)
+        persistence.forget_poll(poll.id)
+        return
+    # The only answer updates Telegram sends for anonymous polls
+    if poll_lifecycle.record_totals(
+        poll.id, [option.voter_count for option in poll.options], poll.total_voter_count
+    ):
+        await close_poll(context.bot, poll.id, "voters")
 
 
-async def receive_quiz_answer(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
-) -> None:
-    """Close quiz after three participants took it"""
-    # the bot can receive closed poll updates we don't care about
-    if update.poll.is_closed:
-        return
-    if update.poll.total_voter_count == TOTAL_VOTER_COUNT:
-        try:
-            quiz_data = context.bot_data[update.poll.id]
-        # this means this poll answer update is from an old poll, we can't stop it then
-        except KeyError:
-            return
-        await context.bot.stop_poll(quiz_data["chat_id"], quiz_data["message_id"])
+async def close_expired_polls(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job closing the polls whose open period is over"""
+    for poll_id in poll_lifecycle.expired(time.time()):
+        await close_poll(context.bot, poll_id, "deadline")
 
 
 async def preview(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -418,11 +862,97 @@ async def receive_poll(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )
 
 
+async def build_practice_quiz(user_id: int, phrase: str) -> Optional[PollJob]:
+    """Quiz on one phrase in a random mode, None if the phrase is gone"""
+    translation = await vocabulary.get_translation(user_id, phrase)
+    if translation is None:
+        return None
+    distractors = await get_distractor_index(user_id)
+    build_quiz = random.choice((translation_quiz, phrase_quiz))
+    return build_quiz(distractors, user_id, phrase, translation)
+
+
+async def send_practice_quiz(bot: Bot, session: PracticeSession, job: PollJob) -> None:
+    """Send a quiz of the session right away and prefetch the next one"""
+    job = replace(job, chat_id=session.chat_id)
+    # Not anonymous, the answer has to tell us who is practicing
+    try:
+        message = await bot.send_poll(
+            chat_id=job.chat_id,
+            question=job.question,
+            options=job.options,
+            type=Poll.QUIZ,
+            correct_option_id=job.correct_option_id,
+            is_anonymous=False,
+        )
+    except TelegramError:
+        # e.g. the user blocked the bot, the session can't go on
+        logger.exception("Could not send practice quiz to user %s", session.user_id)
+        practice_sessions.end(session.user_id)
+        return
+    await remember_poll(job, message)
+    session.asked(message.poll.id, job.phrase, build_practice_quiz)
+
+
+async def continue_practice(bot: Bot, session: PracticeSession, correct: bool) -> None:
+    """Count the answer and send the next quiz, or the summary once the session is over"""
+    session.record(correct)
+    job = await session.take_next(build_practice_quiz)
+    if practice_sessions.get(session.user_id) is not session:
+        return
+    if job is None:
+        practice_sessions.end(session.user_id)
+        await bot.send_message(session.chat_id, session.summary())
+        return
+    await send_practice_quiz(bot, session, job)
+
+
+@instrument
+async def start_practice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Start a practice session of quizzes sent one at a time"""
+    if update.effective_chat.type != ChatType.PRIVATE:
+        await update.message.reply_text("🏋️ Send /practice in our private chat to start a session.")
+        return
+    user_id = update.effective_user.id
+    phrases = await vocabulary.get_phrases(user_id)
+    if not phrases:
+        await update.message.reply_text(
+            "You don't have any phrases yet! Use /create_quiz_mix_answers to add some."
+        )
+        return
+    picked = random.sample(range(len(phrases)), min(SESSION_LENGTH, len(phrases)))
+    session = PracticeSession(
+        user_id, update.effective_chat.id, [phrases.item(position)[0] for position in picked]
+    )
+    practice_sessions.start(session)
+    job = await session.take_next(build_practice_quiz)
+    if job is None:
+        practice_sessions.end(user_id)
+        await update.message.reply_text(
+            "❌ Not enough different translations for a quiz yet, add a few more phrases."
+        )
+        return
+    await update.message.reply_text(
+        f"🏋️ Practice started with {len(picked)} phrase(s). Answer a quiz to get the next one, "
+        "wrong answers come back later. /cancel to stop."
+    )
+    await send_practice_quiz(context.bot, session, job)
+
+
+@instrument
+async def cancel_practice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """End the user's practice session, if there is one, with its summary"""
+    session = practice_sessions.end(update.effective_user.id)
+    if session is not None:
+        await update.message.reply_text(session.summary())
+
+
+@instrument
 async def create_random_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of creating a random quiz"""
     user_id = update.effective_user.id
-    if user_id not in user_phrases or not user_phrases[user_id]:
-        await update.message.reply_text(
+    if not await vocabulary.count(user_id):
+        await update.effective_message.reply_text(
             "❌ You haven't added any phrases yet. Use /create_quiz_mix_answers or /create_quiz_mix_phrases to add some!"
         )
         return ConversationHandler.END
@@ -437,7 +967,7 @@ async def create_random_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE)
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
 
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "🎲 Choose quiz mode:\n\n"
         "🔀 Translation Quiz - Question is phrase, answers are translations\n"
         "🔄 Phrase Quiz - Question is translation, answers are phrases",
@@ -446,6 +976,19 @@ async def create_random_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return SELECTING_QUIZ_MODE
 
 
+@instrument
+async def pick_from_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """Start creating a quiz from a /find result, showing the picker page it links to"""
+    query = update.callback_query
+    parsed = await pressed_page(query)
+    if parsed is None:
+        return None
+    await query.answer()
+    context.user_data["picker_page"] = parsed[2]
+    return await create_random_quiz(update, context)
+
+
+@instrument
 async def select_quiz_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle quiz mode selection and ask for phrase selection"""
     user_id = update.effective_user.id
@@ -466,29 +1009,36 @@ async def select_quiz_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("Please select a valid mode.")
         return SELECTING_QUIZ_MODE
 
+    # Get the quizzes for "📋 All" ready while the user is choosing
+    quiz_pools.refill(user_id, context.user_data["quiz_mode"])
+
     # Create keyboard with phrase selection options
     keyboard = [
         [KeyboardButton("🎲 Random")],
+        [KeyboardButton("⏰ Due")],
         [KeyboardButton("📋 All")],
         [KeyboardButton("❌ Cancel")],
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
 
-    # Show user's phrases
-    phrases = list(user_phrases[user_id].items())
-    message = "📚 Your phrases:\n\n"
-    for i, (phrase, translation) in enumerate(phrases, 1):
-        message += f"{i}. {phrase} - {translation}\n"
+    # Show the page a /find link pointed to, or the first one; the others are rendered on demand
+    phrases = await vocabulary.get_phrases(user_id)
+    picker_page = context.user_data.pop("picker_page", 0)
+    page, page_markup = phrase_pages.get(user_id, phrases, picker_page, PICKER_VIEW)
+    await update.message.reply_text(page, reply_markup=page_markup)
 
-    message += "\n🎯 Choose phrases:\n"
+    message = "🎯 Choose phrases:\n"
     message += "🎲 Random - Get random phrase\n"
+    message += "⏰ Due - Phrases you should review now\n"
     message += "📋 All - Use all phrases\n"
+    message += "🔢 Number - Use the phrase with this number\n"
     message += "❌ Cancel - Cancel operation"
 
     await update.message.reply_text(message, reply_markup=reply_markup)
     return SELECTING_PHRASES
 
 
+@instrument
 async def create_quiz_from_selection(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
@@ -504,7 +1054,7 @@ async def create_quiz_from_selection(
         return ConversationHandler.END
 
     # Get phrases to use
-    phrases = list(user_phrases[user_id].items())
+    phrases = await vocabulary.get_phrases(user_id)
     if not phrases:
         await update.message.reply_text(
             "No phrases available.", reply_markup=ReplyKeyboardRemove()
@@ -512,14 +1062,27 @@ async def create_quiz_from_selection(
         return ConversationHandler.END
 
     if text == "🎲 Random":
-        selected_phrases = [random.choice(phrases)]
+        index = random.randrange(len(phrases))
+        selected_phrases = [phrases.item(index)]
+    elif text == "⏰ Due":
+        now = time.time()
+        due = await review_scheduler.pop_due_for_user(user_id, now, DUE_QUIZ_LIMIT)
+        selected_phrases = [(phrase, phrases[phrase]) for phrase in due if phrase in phrases]
     elif text == "📋 All":
-        selected_phrases = phrases
+        queued_count, pending_count = await queue_all_quizzes(
+            context, user_id, quiz_mode, phrases, update.effective_chat.id
+        )
+        message = f"✅ Queued {queued_count} quiz(es) for the target chat(s)!"
+        if pending_count:
+            message += f" Up to {pending_count} more are being prepared."
+        await update.message.reply_text(message, reply_markup=ReplyKeyboardRemove())
+        return ConversationHandler.END
     else:
         try:
             index = int(text) - 1
             if 0 <= index < len(phrases):
-                selected_phrases = [phrases[index]]
+                # Numbers are shared by all picker pages, no need to build the full list
+                selected_phrases = [phrases.item(index)]
             else:
                 await update.message.reply_text(
                     "Invalid phrase number.", reply_markup=ReplyKeyboardRemove()
@@ -531,68 +1094,152 @@ async def create_quiz_from_selection(
             )
             return SELECTING_PHRASES
 
-    quiz_messages = []
-    for phrase, translation in selected_phrases:
-        if quiz_mode == "translation":
-            # Get other translations as wrong options
-            other_translations = [t for p, t in phrases if t != translation]
-            if len(other_translations) < 3:
-                continue
+    distractors = await get_distractor_index(user_id)
+    quiz_jobs = build_quizzes(distractors, user_id, quiz_mode, selected_phrases)
+    if text == "⏰ Due":
+        # Only the phrases that got a quiz wait for their answer
+        built = {job.phrase for job in quiz_jobs}
+        await review_scheduler.release(
+            [(user_id, phrase) for phrase, _ in selected_phrases if phrase not in built], now
+        )
+    queued_count = await queue_quizzes(context, quiz_jobs, update.effective_chat.id)
+    await update.message.reply_text(
+        f"✅ Queued {queued_count} quiz(es) for the target chat(s)!",
+        reply_markup=ReplyKeyboardRemove(),
+    )
+    return ConversationHandler.END
 
-            wrong_options = random.sample(
-                other_translations, min(3, len(other_translations))
-            )
-            truncated_translation = truncate_translation(translation)
-            truncated_incorrect = [truncate_translation(opt) for opt in wrong_options]
-            all_options = [truncated_translation] + truncated_incorrect
-            random.shuffle(all_options)
-            correct_index = all_options.index(truncated_translation)
-
-            message = await context.bot.send_poll(
-                chat_id=TARGET_CHAT_ID,
-                question=f"📝 Який правильний переклад «{phrase}»?",
-                options=all_options,
-                type=Poll.QUIZ,
-                correct_option_id=correct_index,
-            )
-        else:  # phrase mode
-            # Get other phrases as wrong options
-            other_phrases = [p for p, t in phrases if p != phrase]
-            if len(other_phrases) < 3:
-                continue
 
-            wrong_options = random.sample(other_phrases, min(3, len(other_phrases)))
-            truncated_phrase = truncate_translation(phrase)
-            truncated_incorrect = [truncate_translation(opt) for opt in wrong_options]
-            all_options = [truncated_phrase] + truncated_incorrect
-            random.shuffle(all_options)
-            correct_index = all_options.index(truncated_phrase)
-
-            message = await context.bot.send_poll(
-                chat_id=TARGET_CHAT_ID,
-                question=f"📝 What is the English phrase for «{translation}»?",
-                options=all_options,
-                type=Poll.QUIZ,
-                correct_option_id=correct_index,
-            )
+@instrument
+async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show who answered the most quizzes in this chat correctly"""
+    window = context.args[0].lower() if context.args else "week"
+    if window not in WINDOWS:
+        await update.message.reply_text("Usage: /leaderboard [day|week|all]")
+        return
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+    now = time.time()
+    standing = None
+    if settings.shards > 1:
+        # Every worker only counts the answers to its own quizzes, the database has them all
+        await leaderboard.flush()
+        since_day = {"day": day_of(now), "week": day_of(now) - WEEK_DAYS + 1, "all": 0}[window]
+        leaders = await leaderboard.store.top(chat_id, since_day, LEADERBOARD_SIZE)
+    else:
+        leaders = [
+            (leader_id, correct, leaderboard.names[leader_id])
+            for leader_id, correct in leaderboard.top(chat_id, window, LEADERBOARD_SIZE, now)
+        ]
+        standing = leaderboard.standing(chat_id, window, user_id, now)
+
+    title = {"day": "today", "week": "the last 7 days", "all": "all time"}[window]
+    if not leaders:
+        await update.message.reply_text(f"🏆 No correct answers in this chat yet ({title}).")
+        return
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    message = f"🏆 Leaderboard for {title}\n\n"
+    for position, (leader_id, correct, name) in enumerate(leaders, 1):
+        message += f"{medals.get(position, f'{position}.')} {name} – {correct}\n"
+    if standing is not None and all(leader_id != user_id for leader_id, _, _ in leaders):
+        message += f"\nYou: #{standing[0]} with {standing[1]}\n"
+    await update.message.reply_text(message)
 
-        await asyncio.sleep(2)
-        payload = {
-            message.poll.id: {
-                "chat_id": TARGET_CHAT_ID,
-                "message_id": message.message_id,
-            }
-        }
-        context.bot_data.update(payload)
-        quiz_messages.append(message)
 
+@instrument
+async def show_progress(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show how many quizzes the user answered correctly"""
+    correct, total = await answer_log.accuracy(update.effective_user.id)
+    if not total:
+        await update.message.reply_text(
+            "You haven't answered any quizzes yet!\n\n"
+            "Answers to quizzes in channels are anonymous and can't be counted"
+            + (", and neither can answers in groups." if settings.anonymous_group_quizzes else ".")
+        )
+        return
     await update.message.reply_text(
-        f"✅ Created {len(quiz_messages)} quiz(es) in the target chat!",
-        reply_markup=ReplyKeyboardRemove(),
+        f"🎯 You answered {correct} of {total} quiz(es) correctly ({correct / total:.0%})."
     )
-    return ConversationHandler.END
 
 
+async def collect_metrics() -> None:
+    """Refresh gauges that need a database query"""
+    VOCABULARY_SIZE.set(await vocabulary.total())
+
+
+@instrument
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show runtime statistics to bot admins"""
+    if update.effective_user.id not in settings.admin_ids:
+        return
+    await collect_metrics()
+
+    message = "📊 Bot statistics\n\n"
+    message += f"📚 Phrases: {VOCABULARY_SIZE.value():.0f}\n"
+    message += f"📨 Polls sent: {POLLS_SENT.value():.0f}\n"
+    message += f"🗳️ Answers received: {ANSWERS_RECEIVED.value():.0f}\n"
+    message += f"❌ Parse errors: {PARSE_ERRORS.value():.0f}\n"
+    message += f"⏳ Quizzes queued: {poll_dispatcher.pending()}\n"
+    message += f"📬 Open polls: {len(poll_lifecycle)}\n"
+    registry_stats = poll_registry.stats()
+    message += (
+        f"🗂️ Poll registry: {registry_stats['size']} polls, {registry_stats['hits']} hits, "
+        f"{registry_stats['misses']} misses, {registry_stats['evictions']} evictions\n"
+    )
+    message += "\n⏱️ Handler latency (p50 / p99, count):\n"
+    for (labels, (_, _, count)) in sorted(HANDLER_LATENCY.values.items()):
+        name = dict(labels)["handler"]
+        p50 = HANDLER_LATENCY.quantile(0.5, handler=name)
+        p99 = HANDLER_LATENCY.quantile(0.99, handler=name)
+        message += f"{name}: ≤{p50 * 1000:g} / ≤{p99 * 1000:g} ms, {count}\n"
+    await update.message.reply_text(message)
+
+
+async def send_profile(bot: Bot, chat_id: int, seconds: float) -> None:
+    """Sample the event loop thread for a while and send the stacks as a document"""
+    sampler = await sample_for(seconds)
+    await bot.send_document(
+        chat_id,
+        sampler.collapsed().encode(),
+        filename=f"profile-{int(time.time())}.folded",
+        caption=(
+            f"🔥 {sampler.samples} samples over {seconds:g}s. Collapsed stacks, "
+            "open them in speedscope or pass them to flamegraph.pl."
+        ),
+    )
+
+
+@instrument
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Profile the running bot for a few seconds, for bot admins"""
+    global profile_task
+    if update.effective_user.id not in settings.admin_ids:
+        return
+    try:
+        seconds = float(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        await update.message.reply_text(f"Usage: /profile <seconds>, at most {PROFILE_MAX_SECONDS}")
+        return
+    if profile_task is not None and not profile_task.done():
+        await update.message.reply_text("⏱️ A profile is already being taken, try again when it is sent.")
+        return
+    # In the background, so the admin's other updates aren't held up meanwhile
+    profile_task = context.application.create_task(
+        send_profile(context.bot, update.effective_chat.id, seconds)
+    )
+    await update.message.reply_text(f"⏱️ Profiling for {seconds:g}s…")
+
+
+async def flush_answer_log(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job writing buffered quiz answers, reviews and scores to the database"""
+    await answer_log.flush()
+    await review_scheduler.flush()
+    await leaderboard.flush()
+
+
+@instrument
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Display a help message"""
     await update.message.reply_text(
@@ -602,36 +1249,165 @@ async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "🔄 /create_quiz_mix_phrases – Create quizzes with mixed phrases\n"
         "🎲 /create_random_quiz – Create random quiz from your phrases\n"
         "📋 /list – List your phrases\n"
+        "🔍 /find <text> – Search your phrases and translations\n"
+        "🏋️ /practice – Quizzes one at a time in our private chat, /cancel to stop\n"
+        "🎯 /progress – See how well you answer quizzes\n"
+        "📎 Send a .txt, .csv or .tsv file to import phrases in bulk\n"
+        "🎯 /targets – Chats your quizzes are sent to (/add_target, /remove_target)\n"
         "🗑️ /clear – Clear all your phrases\n",
     )
 
 
+@instrument
+async def list_targets(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the chats the user's quizzes are sent to"""
+    chat_ids = await targets.get(update.effective_user.id)
+    if not chat_ids:
+        await update.message.reply_text(
+            "🎯 Your quizzes go to the default target chat.\n\n"
+            "Send /add_target in a group to send them there instead, "
+            "or /add_target <chat id> here."
+        )
+        return
+    message = "🎯 Your quizzes are sent to:\n"
+    message += "\n".join(f"• {chat_id}" for chat_id in chat_ids)
+    message += "\n\nRemove one with /remove_target <chat id>."
+    await update.message.reply_text(message)
+
+
+def target_chat_argument(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """Chat id given to /add_target or /remove_target, or the group it was sent in"""
+    if context.args:
+        try:
+            return int(context.args[0])
+        except ValueError:
+            return None
+    if update.effective_chat.type != ChatType.PRIVATE:
+        return update.effective_chat.id
+    return None
+
+
+@instrument
+async def add_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send the user's quizzes to one more chat"""
+    user_id = update.effective_user.id
+    chat_id = target_chat_argument(update, context)
+    if chat_id is None:
+        await update.message.reply_text(
+            "Send /add_target in the group, or /add_target <chat id> here."
+        )
+        return
+
+    if chat_id != update.effective_chat.id:
+        # Only chats the user is in, so nobody can send quizzes to strangers
+        try:
+            member = await context.bot.get_chat_member(chat_id, user_id)
+            is_member = member.status not in (ChatMember.LEFT, ChatMember.BANNED)
+        except TelegramError:
+            is_member = False
+        if not is_member:
+            await update.message.reply_text(
+                "❌ I can't find you in that chat. Add me there and send /add_target in it."
+            )
+            return
+
+    if len(await targets.get(user_id)) >= MAX_TARGET_CHATS:
+        await update.message.reply_text(
+            f"❌ You can send quizzes to at most {MAX_TARGET_CHATS} chats."
+        )
+        return
+    if await targets.add(user_id, chat_id):
+        await update.message.reply_text(f"✅ Your quizzes will also be sent to {chat_id}.")
+    else:
+        await update.message.reply_text(f"ℹ️ Your quizzes are already sent to {chat_id}.")
+
+
+@instrument
+async def remove_target(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Stop sending the user's quizzes to a chat"""
+    chat_id = target_chat_argument(update, context)
+    if chat_id is None:
+        await update.message.reply_text(
+            "Send /remove_target in the group, or /remove_target <chat id> here."
+        )
+        return
+    if await targets.remove(update.effective_user.id, chat_id):
+        await update.message.reply_text(f"✅ Quizzes won't be sent to {chat_id} anymore.")
+    else:
+        await update.message.reply_text(f"ℹ️ {chat_id} isn't one of your target chats.")
+
+
+@instrument
 async def clear_phrases(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Clear all phrases for the current user"""
     user_id = update.effective_user.id
 
-    if user_id not in user_phrases or not user_phrases[user_id]:
+    # Clear the user's phrases
+    if not await clear_user_phrases(user_id):
         await update.message.reply_text("You don't have any phrases to clear!")
         return
 
-    # Clear the user's phrases
-    user_phrases[user_id] = {}
     await update.message.reply_text("✅ All your phrases have been cleared!")
 
 
-def main() -> None:
-    """Run bot."""
-    # Create the Application and pass it your bot's token.
-    print("Starting bot...")
-    token = TELEGRAM_BOT_TOKEN
-    application = Application.builder().token(token).build()
-
+async def post_init(application: Application) -> None:
+    """Start background services once the bot is initialized"""
+    await poll_dispatcher.start(application)
+    poll_dispatcher.start_replay(remember_poll, settings.shards, settings.shard_index)
+    if metrics_server is not None:
+        await metrics_server.start()
+    await leaderboard.load(time.time())
+    for poll_id, quiz_data in (await persistence.load_polls()).items():
+        # Polls without an owner are closed by the first shard
+        if shard_of(quiz_data["user_id"] or 0, settings.shards) == settings.shard_index:
+            poll_lifecycle.open(poll_id, quiz_data.get("sent_at", time.time()))
+
+
+async def post_shutdown(application: Application) -> None:
+    """Stop background services and close the database"""
+    await poll_dispatcher.stop(application)
+    await quiz_pools.stop()
+    await practice_sessions.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await answer_log.flush()
+    await review_scheduler.flush()
+    await leaderboard.flush()
+    # Polls sent while the dispatcher was winding down are still staged
+    await persistence.flush()
+    await database.close()
+
+
+def build_application(
+    new_settings: Settings, request: Optional[BaseRequest] = None
+) -> Application:
+    """Create the Application with all services, handlers and jobs set up"""
+    configure(new_settings)
+    builder = (
+        Application.builder()
+        .token(settings.telegram_bot_token)
+        .concurrent_updates(PerUserUpdateProcessor(settings.update_workers))
+    )
+    if request is not None:
+        builder = builder.get_updates_request(request)
+    else:
+        # Concurrent handlers need more than the single default connection
+        request = HTTPXRequest(connection_pool_size=settings.update_workers + 4)
+    # getUpdates is excluded on purpose, long polling would drown the other methods
+    builder = builder.request(InstrumentedRequest(request))
+    builder = builder.persistence(persistence)
+    application = builder.post_init(post_init).post_shutdown(post_shutdown).build()
+
+    # The /find links only start the conversation, they don't need tracking per message
+    warnings.filterwarnings("ignore", message="If 'per_message=False'", category=PTBUserWarning)
     # Add conversation handler for adding phrases
     conv_handler = ConversationHandler(
         entry_points=[
             CommandHandler("create_quiz_mix_answers", add_quiz_mix),
             CommandHandler("create_quiz_mix_phrases", add_quiz_mix_phrases),
             CommandHandler("create_random_quiz", create_random_quiz),
+            # Page links of /find results, numbers sent after them pick a phrase
+            CallbackQueryHandler(pick_from_search, pattern=rf"^page:\d+:{PICKER_VIEW}:"),
         ],
         states={
             WAITING_FOR_MIX_PHRASE: [
@@ -652,18 +1428,131 @@ def main() -> None:
             ],
         },
         fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)],
+        # Users halfway through a flow pick up where they were after a restart
+        name="quiz_setup",
+        persistent=True,
     )
 
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("list", list_phrases))
+    application.add_handler(CommandHandler("find", find_phrases))
+    application.add_handler(CommandHandler("practice", start_practice))
+    # Own group, so /cancel also ends a session while a conversation is open
+    application.add_handler(CommandHandler("cancel", cancel_practice), group=1)
+    application.add_handler(CommandHandler("progress", show_progress))
+    application.add_handler(CommandHandler("leaderboard", show_leaderboard))
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CommandHandler("profile", profile))
+    application.add_handler(CallbackQueryHandler(turn_page, pattern=r"^page:"))
     application.add_handler(CommandHandler("help", help_handler))
     application.add_handler(CommandHandler("clear", clear_phrases))
-    application.add_handler(PollAnswerHandler(receive_quiz_answer))
-    application.add_handler(PollHandler(receive_quiz_answer))
+    application.add_handler(CommandHandler("targets", list_targets))
+    application.add_handler(CommandHandler("add_target", add_target))
+    application.add_handler(CommandHandler("remove_target", remove_target))
+    application.add_handler(
+        MessageHandler(
+            filters.ChatType.PRIVATE
+            & (
+                filters.Document.FileExtension("txt")
+                | filters.Document.FileExtension("csv")
+                | filters.Document.FileExtension("tsv")
+            ),
+            receive_document,
+        )
+    )
+    application.add_handler(PollAnswerHandler(receive_quiz_vote))
+    application.add_handler(PollHandler(receive_poll_update))
+
+    # Send phrases that are due for a review
+    application.job_queue.run_repeating(
+        send_due_quizzes,
+        interval=settings.review_interval,
+        first=settings.review_interval,
+    )
+
+    # Close polls that have been open for too long, one job for all of them
+    if settings.poll_open_period:
+        application.job_queue.run_repeating(
+            close_expired_polls,
+            interval=poll_lifecycle.wheel.tick,
+            first=poll_lifecycle.wheel.tick,
+        )
+
+    # Write quiz answers to the database in batches
+    application.job_queue.run_repeating(
+        flush_answer_log,
+        interval=settings.answer_flush_interval,
+        first=settings.answer_flush_interval,
+    )
+    return application
+
+
+def setup_logging(
+    format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+) -> None:
+    """Enable logging"""
+    logging.basicConfig(format=format, level=logging.INFO)
+    # set higher logging level for httpx to avoid all GET and POST requests being logged
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def main() -> None:
+    """Run bot."""
+    parser = argparse.ArgumentParser(description="Telegram Study Words Bot")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report import time per module and exit",
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=1.0,
+        help="seconds allowed until the bot can process its first update",
+    )
+    parser.add_argument(
+        "--startup-database",
+        help="run post_init of the startup profile against a copy of this database",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if args.profile_startup:
+        from startup_profile import profile_startup
+
+        sys.exit(0 if profile_startup(args.startup_budget, args.startup_database) else 1)
+
+    try:
+        new_settings = Settings.from_env()
+    except ConfigurationError as exc:
+        logger.error("%s, check your environment or .env file", exc)
+        sys.exit(1)
+
+    if new_settings.shards > 1:
+        # Worker processes own the handlers, this one only routes updates
+        print(f"Starting bot with {new_settings.shards} shards...")
+        run_sharded(new_settings)
+        return
+
+    # Create the Application and pass it your bot's token.
+    print("Starting bot...")
+    application = build_application(new_settings)
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if settings.webhook_url:
+        # Telegram pushes updates to our local web server instead of us polling
+        application.run_webhook(
+            listen=settings.webhook_listen,
+            port=settings.webhook_port,
+            url_path=settings.webhook_path,
+            webhook_url=settings.webhook_url,
+            secret_token=settings.webhook_secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
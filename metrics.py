@@ -0,0 +1,465 @@
+# flake8: noqa: E501
+
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import math
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[LabelKey, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` whenever the gauge is rendered"""
+        self._function = function
+
+    def value(self, **labels: Any) -> float:
+        if self._function is not None and not labels:
+            return self._function()
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self._function is not None:
+            lines.append(f"{self.name} {self._function()}")
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # label key -> (bucket counts, sum, count)
+        self.values: Dict[LabelKey, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, fraction: float, **labels: Any) -> float:
+        """Upper bound of the bucket holding the given quantile"""
+        series = self.values.get(_label_key(labels))
+        if not series or not series[2]:
+            return 0.0
+        rank = fraction * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets, series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str) -> Histogram:
+        return self._register(Histogram(name, documentation))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HANDLER_LATENCY = registry.histogram(
+    "bot_handler_duration_seconds", "Time spent in each update handler"
+)
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Handlers that raised an exception"
+)
+SLOW_HANDLERS = registry.counter(
+    "bot_slow_handlers_total", "Handlers that ran longer than the slow handler threshold"
+)
+API_LATENCY = registry.histogram(
+    "bot_api_request_duration_seconds", "Round-trip time of Bot API requests by method"
+)
+DISPATCH_WAIT = registry.histogram(
+    "bot_dispatch_wait_seconds", "Time quizzes waited for the rate limiter"
+)
+POLLS_SENT = registry.counter("bot_polls_sent_total", "Quizzes sent")
+ANSWERS_RECEIVED = registry.counter("bot_answers_received_total", "Quiz answers received")
+POLLS_CLOSED = registry.counter("bot_polls_closed_total", "Quizzes closed by the bot, by reason")
+PARSE_ERRORS = registry.counter(
+    "bot_parse_errors_total", "Lines that couldn't be parsed as phrase - translation"
+)
+TRANSLATION_REQUESTS = registry.counter(
+    "bot_translation_requests_total", "Model calls translating phrases by result"
+)
+TRANSLATION_CACHE_HITS = registry.counter(
+    "bot_translation_cache_hits_total", "Phrases whose translation came from the cache"
+)
+TRANSLATION_LATENCY = registry.histogram(
+    "bot_translation_duration_seconds", "Time model calls took, waiting for a free slot included"
+)
+VOCABULARY_SIZE = registry.gauge("bot_vocabulary_phrases", "Phrases stored for all users")
+REGISTERED_POLLS = registry.gauge("bot_poll_registry_size", "Polls remembered by the registry")
+OPEN_POLLS = registry.gauge("bot_open_polls", "Sent quizzes that haven't been closed yet")
+DISPATCH_QUEUE = registry.gauge("bot_dispatch_queue_size", "Quizzes waiting to be sent")
+
+
+def update_type(update: Any) -> str:
+    """Kind of an update, e.g. `message` or `poll_answer`"""
+    if not isinstance(update, Update):
+        return "none"
+    return next((kind for kind in Update.ALL_TYPES if getattr(update, kind, None) is not None), "unknown")
+
+
+def coroutine_stack(task: "asyncio.Task[Any]") -> str:
+    """Where a task is waiting, from its outermost coroutine down the chain of awaits"""
+    frames = []
+    awaited: Any = task.get_coro()
+    while awaited is not None:
+        frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None)
+    return "".join(traceback.StackSummary.extract(frames).format())
+
+
+class SlowHandlerWatch:
+    """A running handler the detector keeps time of"""
+
+    __slots__ = ("name", "kind", "task", "frame", "loop", "thread_id", "deadline", "reported", "finished")
+
+    def __init__(self, name: str, kind: str, task: "asyncio.Task[Any]", frame: FrameType, deadline: float) -> None:
+        self.name = name
+        self.kind = kind
+        self.task: Optional["asyncio.Task[Any]"] = task
+        # Frame of the instrumented wrapper, on the loop thread's stack while the handler runs
+        self.frame: Optional[FrameType] = frame
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.deadline = deadline
+        self.reported = False
+        self.finished = False
+
+
+def running_stack(frame: Optional[FrameType], outermost: Optional[FrameType]) -> Optional[str]:
+    """The stack from `outermost` down to `frame`, None if `outermost` isn't on it"""
+    frames = []
+    while frame is not None:
+        frames.append((frame, frame.f_lineno))
+        if frame is outermost:
+            return "".join(traceback.StackSummary.extract(reversed(frames)).format())
+        frame = frame.f_back
+    return None
+
+
+class SlowHandlerDetector:
+    """Logs handlers that run longer than `threshold` seconds, 0 turns it off
+
+    A watchdog thread wakes up when a handler passes the threshold and reads
+    the current frame of the event loop thread. If the handler's code is on
+    that stack, the handler is running and holds up the loop, and that
+    stack is logged. Otherwise the handler is suspended, waiting for
+    something, and the chain of awaits it waits in is logged. A handler
+    that returns before the watchdog gets to it is logged with its time
+    only, which only happens when many handlers are slow at once.
+    """
+
+    def __init__(self, threshold: float = 1.0) -> None:
+        self.threshold = threshold
+        self._deadlines: List[Tuple[float, int, SlowHandlerWatch]] = []
+        self._counter = itertools.count()
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, name: str, update: Any) -> Optional[SlowHandlerWatch]:
+        if not self.threshold:
+            return None
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        # The caller is the instrumented wrapper
+        watch = SlowHandlerWatch(name, update_type(update), task, sys._getframe(1), time.perf_counter() + self.threshold)
+        with self._wakeup:
+            heapq.heappush(self._deadlines, (watch.deadline, next(self._counter), watch))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="slow-handlers", daemon=True)
+                self._thread.start()
+            elif self._deadlines[0][2] is watch:
+                self._wakeup.notify()
+        return watch
+
+    def _overdue(self) -> List[SlowHandlerWatch]:
+        """Wait for handlers that are still running at their deadline"""
+        with self._wakeup:
+            while True:
+                overdue = []
+                now = time.perf_counter()
+                while self._deadlines and (self._deadlines[0][2].finished or self._deadlines[0][0] <= now):
+                    watch = heapq.heappop(self._deadlines)[2]
+                    if not watch.finished:
+                        overdue.append(watch)
+                if overdue:
+                    return overdue
+                self._wakeup.wait(self._deadlines[0][0] - now if self._deadlines else None)
+
+    def _watch(self) -> None:
+        while True:
+            overdue = self._overdue()
+            frames = sys._current_frames()
+            for watch in overdue:
+                task, frame = watch.task, watch.frame
+                if task is None:
+                    continue
+                stack = running_stack(frames.get(watch.thread_id), frame)
+                if stack is not None:
+                    state = "holding up the event loop in"
+                else:
+                    # Suspended, the chain of awaits says what it waits for
+                    state = "waiting in"
+                    stack = coroutine_stack(task)
+                with self._wakeup:
+                    if watch.finished:
+                        continue
+                    watch.reported = True
+                try:
+                    watch.loop.call_soon_threadsafe(functools.partial(SLOW_HANDLERS.inc, handler=watch.name))
+                except RuntimeError:
+                    # The loop was closed in the meantime
+                    continue
+                logger.warning(
+                    "Handler %s for a %s update still running after %gs, %s:\n%s",
+                    watch.name,
+                    watch.kind,
+                    self.threshold,
+                    state,
+                    stack,
+                )
+            del frames
+
+    def finish(self, watch: Optional[SlowHandlerWatch], elapsed: float) -> None:
+        if watch is None:
+            return
+        with self._wakeup:
+            watch.finished = True
+            reported = watch.reported
+        # Not needed anymore, don't keep the handler's locals alive until the deadline
+        watch.task = watch.frame = None
+        if not reported and elapsed >= self.threshold:
+            SLOW_HANDLERS.inc(handler=watch.name)
+            logger.warning(
+                "Handler %s for a %s update took %.2fs, it returned before the watchdog got to it",
+                watch.name,
+                watch.kind,
+                elapsed,
+            )
+
+
+# Threshold set by the bot's configure()
+slow_handlers = SlowHandlerDetector()
+
+
+def instrument(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Record the latency of an update handler under its function name and report it when slow"""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        watch = slow_handlers.start(name, args[0] if args else None)
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_LATENCY.observe(elapsed, handler=name)
+            slow_handlers.finish(watch, elapsed)
+
+    return wrapper
+
+
+class InstrumentedRequest(BaseRequest):
+    """Wraps another request object and times every Bot API call by method"""
+
+    def __init__(self, wrapped: BaseRequest) -> None:
+        self.wrapped = wrapped
+
+    async def initialize(self) -> None:
+        await self.wrapped.initialize()
+
+    async def shutdown(self) -> None:
+        await self.wrapped.shutdown()
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.wrapped.read_timeout
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout: Any = BaseRequest.DEFAULT_NONE,
+        write_timeout: Any = BaseRequest.DEFAULT_NONE,
+        connect_timeout: Any = BaseRequest.DEFAULT_NONE,
+        pool_timeout: Any = BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        try:
+            return await self.wrapped.do_request(
+                url,
+                method,
+                request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, method=url.rsplit("/", 1)[-1])
+
+
+class MetricsServer:
+    """Serves `GET /metrics` on a local port, without any extra dependencies"""
+
+    def __init__(
+        self,
+        port: int,
+        host: str = "127.0.0.1",
+        collect: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        self.port = port
+        self.host = host
+        self.collect = collect
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # Skip the headers, we don't need any of them
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                if self.collect is not None:
+                    await self.collect()
+                status = "200 OK"
+                body = registry.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except Exception:
+            logger.exception("Failed to serve metrics request")
+        finally:
+            writer.close()
@@ -0,0 +1,115 @@
+# flake8: noqa: E501
+
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from distractors import truncate_translation
+from phrase_table import PhraseTable
+
+# 15 lines of at most ~200 characters stay well below the 4096 character limit
+PAGE_SIZE = 15
+
+LIST_VIEW = "list"
+PICKER_VIEW = "pick"
+
+HEADERS = {
+    LIST_VIEW: "📚 Your phrases",
+    PICKER_VIEW: "📚 Your phrases (send a number to pick one)",
+}
+
+
+def page_count(total: int) -> int:
+    return max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+
+
+def page_of(position: int) -> int:
+    """Page number (0-based) that shows the phrase at a 0-based position"""
+    return position // PAGE_SIZE
+
+
+def render_page(phrases: PhraseTable, page: int, view: str) -> str:
+    """Render a single page, only touching the phrases on that page"""
+    start = page * PAGE_SIZE
+    message = f"{HEADERS[view]} – page {page + 1}/{page_count(len(phrases))}:\n\n"
+    for i, (phrase, translation) in enumerate(phrases.slice(start, start + PAGE_SIZE), start + 1):
+        phrase = truncate_translation(phrase)
+        translation = truncate_translation(translation)
+        if view == PICKER_VIEW:
+            message += f"{i}. {phrase} - {translation}\n"
+        else:
+            message += f"✅ {phrase} - {translation}\n"
+    return message
+
+
+def page_data(owner: int, view: str, page: int) -> str:
+    """Callback data of a page button, naming the user whose phrases it shows"""
+    return f"page:{owner}:{view}:{page}"
+
+
+def parse_page_data(data: str) -> Optional[Tuple[int, str, int]]:
+    """Owner, view and page of a page button, None for buttons of an older format"""
+    parts = data.split(":")
+    if len(parts) != 4 or parts[2] not in HEADERS:
+        return None
+    try:
+        return int(parts[1]), parts[2], int(parts[3])
+    except ValueError:
+        return None
+
+
+def page_keyboard(owner: int, page: int, total: int, view: str) -> InlineKeyboardMarkup:
+    """Previous / next buttons for a page, empty when everything fits on one page"""
+    pages = page_count(total)
+    buttons = []
+    if page > 0:
+        buttons.append(
+            InlineKeyboardButton("⬅️ Previous", callback_data=page_data(owner, view, page - 1))
+        )
+    if page < pages - 1:
+        buttons.append(
+            InlineKeyboardButton("Next ➡️", callback_data=page_data(owner, view, page + 1))
+        )
+    return InlineKeyboardMarkup([buttons] if buttons else [])
+
+
+def picker_links(owner: int, positions: Iterable[int], limit: int = 5) -> InlineKeyboardMarkup:
+    """Buttons opening the picker pages that show the phrases at `positions`"""
+    pages = sorted({page_of(position) for position in positions})[:limit]
+    buttons = [
+        InlineKeyboardButton(f"📄 Page {page + 1}", callback_data=page_data(owner, PICKER_VIEW, page))
+        for page in pages
+    ]
+    return InlineKeyboardMarkup([buttons] if buttons else [])
+
+
+class PageCache:
+    """Rendered phrase list pages of recently active users
+
+    Pages are rendered on first request and kept until the user's vocabulary
+    changes, so flipping back and forth costs nothing.
+    """
+
+    def __init__(self, max_users: int = 1024) -> None:
+        self.max_users = max_users
+        self._pages: "OrderedDict[int, Dict[Tuple[str, int], str]]" = OrderedDict()
+
+    def get(
+        self, user_id: int, phrases: PhraseTable, page: int, view: str
+    ) -> Tuple[str, InlineKeyboardMarkup]:
+        page = min(max(page, 0), page_count(len(phrases)) - 1)
+        pages = self._pages.get(user_id)
+        if pages is None:
+            pages = self._pages[user_id] = {}
+            while len(self._pages) > self.max_users:
+                self._pages.popitem(last=False)
+        self._pages.move_to_end(user_id)
+
+        text = pages.get((view, page))
+        if text is None:
+            text = pages[(view, page)] = render_page(phrases, page, view)
+        return text, page_keyboard(user_id, page, len(phrases), view)
+
+    def invalidate(self, user_id: int) -> None:
+        self._pages.pop(user_id, None)
@@ -0,0 +1,68 @@
+# flake8: noqa: E501
+
+import csv
+import io
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+PhrasePair = Tuple[str, str]
+
+
+def clean_pair(phrase: str, translation: str) -> Optional[PhrasePair]:
+    """Strip a phrase and translation the same way for every input source"""
+    phrase = phrase.replace("✅", "").strip()
+    translation = translation.replace("✅", "").strip()
+
+    if translation.endswith("."):
+        translation = translation[:-1]
+
+    if not phrase or not translation:
+        return None
+    return phrase, translation
+
+
+def parse_phrase_line(line: str) -> Optional[PhrasePair]:
+    """Parse a `phrase - translation` line, None if it doesn't follow the format"""
+    line = line.replace("✅", "").strip()
+    parts = line.split(" - ", 1)
+    if len(parts) != 2:
+        return None
+    return clean_pair(*parts)
+
+
+def parse_phrase_only(line: str) -> Optional[str]:
+    """The phrase of a line that has no translation, None if it has one or no words"""
+    phrase = line.replace("✅", "").strip()
+    if " - " in phrase or not any(char.isalnum() for char in phrase):
+        return None
+    return phrase
+
+
+def parse_phrase_lines(lines: Iterable[str]) -> Iterator[Optional[PhrasePair]]:
+    """Yield a pair for every non-empty line, or None for lines that couldn't be parsed"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        yield parse_phrase_line(line)
+
+
+def parse_phrase_rows(rows: Iterable[List[str]]) -> Iterator[Optional[PhrasePair]]:
+    """Same as `parse_phrase_lines` for CSV/TSV rows of `phrase, translation`"""
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) < 2:
+            yield None
+            continue
+        yield clean_pair(row[0], row[1])
+
+
+def iter_file_phrases(file: BinaryIO, file_name: str) -> Iterator[Optional[PhrasePair]]:
+    """Stream phrases out of an uploaded vocabulary file line by line"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    extension = file_name.rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return parse_phrase_rows(csv.reader(text))
+    if extension == "tsv":
+        return parse_phrase_rows(csv.reader(text, delimiter="\t"))
+    return parse_phrase_lines(text)
@@ -0,0 +1,224 @@
+# flake8: noqa: E501
+
+import asyncio
+import json
+import logging
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from storage import StateStore
+
+logger = logging.getLogger(__name__)
+
+USER = "user"
+CHAT = "chat"
+BOT = "bot"
+POLL = "poll"
+CONVERSATION = "conversation:"
+
+# Fingerprint of entries whose stored state we haven't seen yet
+UNKNOWN = object()
+
+Entry = Tuple[str, str]
+
+
+class StatePersistence(BasePersistence[Dict[Any, Any], Dict[Any, Any], Dict[Any, Any]]):
+    """Persistence that only writes what changed, in batches, and loads users lazily
+
+    Every `update_interval` seconds the Application hands over the data of
+    each user and chat that had an update since the last run. Entries are
+    pickled and compared with a fingerprint of what is stored, only real
+    changes are staged, and the staged changes of a run are written in one
+    transaction once the run is over. Empty data isn't stored at all.
+
+    User and chat data start out empty and are read from the database the
+    first time a handler needs them. Startup still reads the keys of all
+    stored user and chat entries, one query per kind, so users without
+    stored data cost no query at all. That scan and the set of keys it
+    fills grow with the number of users and chats that have data, by about
+    150 bytes per entry, but their data itself isn't read. Bot data
+    and the states of open conversations are read at startup. Quiz info of
+    sent polls is kept here too and written as soon as it changes, so
+    answers still count after a restart or a crash.
+    """
+
+    def __init__(self, store: StateStore, update_interval: float = 5, poll_ttl: float = 24 * 60 * 60) -> None:
+        super().__init__(PersistenceInput(callback_data=False), update_interval)
+        self.store = store
+        self.poll_ttl = poll_ttl
+        # Fingerprint of the stored pickle, None when nothing is stored
+        self._stored: Dict[Entry, Optional[int]] = {}
+        self._staged: Dict[Entry, Optional[bytes]] = {}
+        # Batches handed to the database that haven't committed yet
+        self._writing: List[Dict[Entry, Optional[bytes]]] = []
+        self._loading: Dict[Entry, "asyncio.Future[None]"] = {}
+        # User and chat entries that had a row at startup, the others need no query
+        self._existing: Set[Entry] = set()
+        self._flush_scheduled = False
+        self._flushes: Set[asyncio.Task] = set()
+        # Created on first use, inside the running loop
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    def _stage(self, kind: str, key: str, data: Any, track: bool = True) -> None:
+        """Stage `data` for writing unless it is what's stored, None deletes the entry"""
+        entry = (kind, key)
+        blob = None if data is None else pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        if track:
+            fingerprint = None if blob is None else hash(blob)
+            if self._stored.get(entry, UNKNOWN) == fingerprint:
+                return
+            self._stored[entry] = fingerprint
+        self._staged[entry] = blob
+
+    def _schedule_flush(self) -> None:
+        """Write the staged changes once the Application has handed over this run's data"""
+        if self._flush_scheduled or not self._staged:
+            return
+        self._flush_scheduled = True
+        task = asyncio.create_task(self._flush_staged())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_staged(self) -> None:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        # One batch at a time, a later batch committing first would be undone by the earlier one
+        async with self._write_lock:
+            self._flush_scheduled = False
+            staged, self._staged = self._staged, {}
+            if not staged:
+                return
+            changes = [(kind, key, blob) for (kind, key), blob in staged.items()]
+            self._writing.append(staged)
+            try:
+                await self.store.write(changes, time.time(), expire=(POLL, self.poll_ttl))
+            except Exception:
+                logger.exception("Failed to write %d state change(s), retrying with the next batch", len(changes))
+                for entry, blob in staged.items():
+                    self._staged.setdefault(entry, blob)
+            finally:
+                self._writing.remove(staged)
+
+    async def _refresh(self, kind: str, key: str, data: Dict[Any, Any]) -> None:
+        """Fill `data` from the database the first time the entry is used"""
+        entry = (kind, key)
+        if entry in self._stored:
+            return
+        if entry not in self._existing:
+            self._stored[entry] = None
+            return
+        loading = self._loading.get(entry)
+        if loading is not None:
+            # Handlers of the same chat share one dict, the first one fills it
+            await loading
+            return
+        loading = self._loading[entry] = asyncio.get_running_loop().create_future()
+        try:
+            blob = await self.store.get(kind, key)
+            if blob is not None:
+                data.update(pickle.loads(blob))
+            self._stored[entry] = None if blob is None else hash(blob)
+        finally:
+            del self._loading[entry]
+            loading.set_result(None)
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        # Read user by user in refresh_user_data
+        self._existing.update((USER, key) for key in await self.store.keys(USER))
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        self._existing.update((CHAT, key) for key in await self.store.keys(CHAT))
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        blob = await self.store.get(BOT, "")
+        self._stored[(BOT, "")] = None if blob is None else hash(blob)
+        return {} if blob is None else pickle.loads(blob)
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        kind = CONVERSATION + name
+        conversations = {}
+        for key, blob in await self.store.get_kind(kind):
+            conversations[tuple(json.loads(key))] = pickle.loads(blob)
+            self._stored[(kind, key)] = hash(blob)
+        return conversations
+
+    async def update_conversation(
+        self, name: str, key: Tuple[int, ...], new_state: Optional[object]
+    ) -> None:
+        # Ended conversations are None and get deleted
+        self._stage(CONVERSATION + name, json.dumps(list(key)), new_state)
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        # Data that was never read can't have been changed by a handler
+        if (USER, str(user_id)) in self._stored:
+            self._stage(USER, str(user_id), data or None)
+            self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        if (CHAT, str(chat_id)) in self._stored:
+            self._stage(CHAT, str(chat_id), data or None)
+            self._schedule_flush()
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        self._stage(BOT, "", data or None)
+        self._schedule_flush()
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(USER, str(user_id), None)
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage(CHAT, str(chat_id), None)
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        await self._refresh(USER, str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        await self._refresh(CHAT, str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    def remember_poll(self, poll_id: str, data: Dict[str, Any]) -> None:
+        """Write the quiz info of a sent poll, with whatever else is staged by then"""
+        # Not fingerprinted, polls are written once and would only pile up
+        self._stage(POLL, poll_id, data, track=False)
+        # Not left for the next run, a crash in between would lose the poll
+        self._schedule_flush()
+
+    def forget_poll(self, poll_id: str) -> None:
+        self._stage(POLL, poll_id, None, track=False)
+        self._schedule_flush()
+
+    async def load_poll(self, poll_id: str) -> Optional[Dict[str, Any]]:
+        """Quiz info of a poll sent before the last restart"""
+        entry = (POLL, poll_id)
+        # Changes that aren't committed yet win over the database, None means forgotten
+        for batch in (self._staged, *reversed(self._writing)):
+            if entry in batch:
+                blob = batch[entry]
+                return None if blob is None else pickle.loads(blob)
+        blob = await self.store.get(POLL, poll_id)
+        return None if blob is None else pickle.loads(blob)
+
+    async def load_polls(self) -> Dict[str, Dict[str, Any]]:
+        """Quiz info of all polls still open at the last shutdown"""
+        return {poll_id: pickle.loads(blob) for poll_id, blob in await self.store.get_kind(POLL)}
+
+    async def flush(self) -> None:
+        """Write everything staged, called when the Application shuts down"""
+        await asyncio.gather(*self._flushes)
+        await self._flush_staged()
@@ -0,0 +1,176 @@
+# flake8: noqa: E501
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from collections.abc import ItemsView
+
+# Above this many new phrases the lookup index is rebuilt instead of updated
+INSORT_LIMIT = 64
+
+
+class StringTable:
+    """Interns strings under small integer ids, shared by every vocabulary
+
+    Common words are stored once no matter how many users have them. Ids are
+    reference counted and reused once the last vocabulary holding them is gone.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._strings: List[Optional[str]] = []
+        # Mostly small ints, which Python doesn't allocate separately
+        self._refs: List[int] = []
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def intern_all(self, texts: Iterable[str]) -> List[int]:
+        """Ids of `texts`, taking a reference to each"""
+        ids = self._ids
+        strings = self._strings
+        refs = self._refs
+        free = self._free
+        result = []
+        for text in texts:
+            string_id = ids.get(text)
+            if string_id is None:
+                if free:
+                    string_id = free.pop()
+                    strings[string_id] = text
+                    refs[string_id] = 0
+                else:
+                    string_id = len(strings)
+                    strings.append(text)
+                    refs.append(0)
+                ids[text] = string_id
+            refs[string_id] += 1
+            result.append(string_id)
+        return result
+
+    def lookup(self, text: str) -> Optional[int]:
+        """Id of `text` if it is interned, without taking a reference"""
+        return self._ids.get(text)
+
+    def string(self, string_id: int) -> str:
+        return self._strings[string_id]
+
+    def release_all(self, string_ids: Iterable[int]) -> None:
+        """Drop a reference to each id, forgetting strings nobody uses anymore"""
+        ids = self._ids
+        strings = self._strings
+        refs = self._refs
+        for string_id in string_ids:
+            refs[string_id] -= 1
+            if not refs[string_id]:
+                del ids[strings[string_id]]
+                strings[string_id] = None
+                self._free.append(string_id)
+
+
+strings = StringTable()
+
+
+class _PhraseItems(ItemsView):
+    """`items()` that walks the id arrays instead of looking every key up"""
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        table = self._mapping
+        string = table.strings.string
+        for phrase_id, translation_id in zip(table._phrase_ids, table._translation_ids):
+            yield string(phrase_id), string(translation_id)
+
+
+class PhraseTable(Mapping[str, str]):
+    """One user's phrases as read-only mapping of phrase -> translation
+
+    Phrases and translations are kept as interned ids in two arrays in the
+    order they were added, so the mapping iterates like the dict it replaces.
+    Lookups by phrase binary search a sorted copy of the phrase ids. That is
+    4 bytes per string reference instead of a dict entry and a `str` object.
+    """
+
+    __slots__ = ("strings", "_phrase_ids", "_translation_ids", "_sorted_ids", "_sorted_positions")
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = (), table: StringTable = strings) -> None:
+        self.strings = table
+        self._phrase_ids = array("I")
+        self._translation_ids = array("I")
+        self._sorted_ids = array("I")
+        self._sorted_positions = array("I")
+        self.add(pairs)
+
+    def __del__(self) -> None:
+        self.strings.release_all(self._phrase_ids)
+        self.strings.release_all(self._translation_ids)
+
+    def __len__(self) -> int:
+        return len(self._phrase_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        string = self.strings.string
+        return (string(phrase_id) for phrase_id in self._phrase_ids)
+
+    def _indexed(self, phrase_id: int) -> int:
+        """Position of the phrase with this id, -1 if the user doesn't have it"""
+        sorted_ids = self._sorted_ids
+        i = bisect_left(sorted_ids, phrase_id)
+        if i < len(sorted_ids) and sorted_ids[i] == phrase_id:
+            return self._sorted_positions[i]
+        return -1
+
+    def _position(self, phrase: str) -> int:
+        phrase_id = self.strings.lookup(phrase)
+        return -1 if phrase_id is None else self._indexed(phrase_id)
+
+    def __getitem__(self, phrase: str) -> str:
+        position = self._position(phrase)
+        if position < 0:
+            raise KeyError(phrase)
+        return self.strings.string(self._translation_ids[position])
+
+    def __contains__(self, phrase: object) -> bool:
+        return isinstance(phrase, str) and self._position(phrase) >= 0
+
+    def items(self) -> _PhraseItems:
+        return _PhraseItems(self)
+
+    def item(self, position: int) -> Tuple[str, str]:
+        """Phrase and translation at a 0-based position in insertion order"""
+        string = self.strings.string
+        return string(self._phrase_ids[position]), string(self._translation_ids[position])
+
+    def slice(self, start: int, stop: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Phrases and translations from `start` up to `stop`, like `list(items())[start:stop]`"""
+        string = self.strings.string
+        return [
+            (string(phrase_id), string(translation_id))
+            for phrase_id, translation_id in zip(self._phrase_ids[start:stop], self._translation_ids[start:stop])
+        ]
+
+    def add(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Append new phrases, skipping known ones, and return how many were added"""
+        start = len(self._phrase_ids)
+        # New phrases in order, the first translation of a phrase wins
+        added: Dict[str, str] = {}
+        for phrase, translation in pairs:
+            if phrase not in added and (not start or self._position(phrase) < 0):
+                added[phrase] = translation
+        if not added:
+            return 0
+        self._phrase_ids.extend(self.strings.intern_all(added.keys()))
+        self._translation_ids.extend(self.strings.intern_all(added.values()))
+
+        if len(added) <= INSORT_LIMIT:
+            for position in range(start, len(self._phrase_ids)):
+                phrase_id = self._phrase_ids[position]
+                i = bisect_left(self._sorted_ids, phrase_id)
+                self._sorted_ids.insert(i, phrase_id)
+                self._sorted_positions.insert(i, position)
+        else:
+            order = sorted(range(len(self._phrase_ids)), key=self._phrase_ids.__getitem__)
+            self._sorted_ids = array("I", map(self._phrase_ids.__getitem__, order))
+            self._sorted_positions = array("I", order)
+        return len(added)
@@ -0,0 +1,152 @@
+# flake8: noqa: E501
+
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Set
+
+
+class TimerWheel:
+    """Hashed timer wheel: deadlines rounded up to whole ticks, kept in a ring of slots
+
+    Scheduling and cancelling are a dict operation each. Advancing the wheel
+    by one tick only looks at the keys hashed to that tick's slot, so the
+    cost of a tick doesn't grow with the number of timers that aren't due,
+    as long as there are enough slots to spread them over.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, now: Optional[float] = None) -> None:
+        self.tick = tick
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._where: Dict[Hashable, int] = {}
+        # Last tick whose timers have been handed out
+        self._current = int((time.time() if now is None else now) // tick)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Fire `key` at the first tick at or after `deadline`, replacing an earlier timer"""
+        self.cancel(key)
+        # Timers already due fire with the next tick
+        due = max(math.ceil(deadline / self.tick), self._current + 1)
+        slot = due % len(self._slots)
+        self._slots[slot][key] = due
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Keys of all timers due by `now`, which are removed from the wheel"""
+        target = int(now // self.tick)
+        # Once around the ring visits every slot, however long we were idle
+        steps = min(target - self._current, len(self._slots))
+        expired: List[Hashable] = []
+        for tick in range(self._current + 1, self._current + steps + 1):
+            bucket = self._slots[tick % len(self._slots)]
+            # Keys of later rounds share the slot and stay
+            due = [key for key, at in bucket.items() if at <= target]
+            for key in due:
+                del bucket[key]
+                del self._where[key]
+            expired.extend(due)
+        self._current = max(self._current, target)
+        return expired
+
+
+class PollTally:
+    """Answers counted for one open poll"""
+
+    __slots__ = ("counts", "voters", "answered")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = []
+        self.voters = 0
+        # Users whose answer arrived as a poll answer update
+        self.answered: Set[int] = set()
+
+    def add(self, option_ids: Sequence[int]) -> None:
+        for option_id in option_ids:
+            if option_id >= len(self.counts):
+                self.counts.extend([0] * (option_id + 1 - len(self.counts)))
+            self.counts[option_id] += 1
+        self.voters += 1
+
+    def merge(self, counts: Sequence[int], voters: int) -> None:
+        """Take in the totals of a poll update, both sources only ever undercount"""
+        for option_id, count in enumerate(counts):
+            if option_id >= len(self.counts):
+                self.counts.append(count)
+            elif count > self.counts[option_id]:
+                self.counts[option_id] = count
+        self.voters = max(self.voters, voters)
+
+
+class PollLifecycle:
+    """Tallies of open polls and when each of them is due to be closed
+
+    A poll is due once `max_voters` people answered it or `open_period`
+    seconds after it was sent, 0 turns either rule off. Answers are counted
+    from poll answer updates and corrected by the totals of poll updates,
+    the only ones Telegram sends for anonymous polls. Deadlines live on a
+    timer wheel that is advanced by one periodic job for all polls.
+    """
+
+    def __init__(
+        self,
+        max_voters: int = 3,
+        open_period: float = 24 * 60 * 60,
+        tick: float = 1.0,
+        slots: int = 512,
+    ) -> None:
+        self.max_voters = max_voters
+        self.open_period = open_period
+        self.wheel = TimerWheel(tick, slots)
+        self._tallies: Dict[str, PollTally] = {}
+
+    def __len__(self) -> int:
+        return len(self._tallies)
+
+    def open(self, poll_id: str, sent_at: float) -> PollTally:
+        """Start tracking a sent poll, or return its tally if it is tracked already"""
+        tally = self._tallies.get(poll_id)
+        if tally is None:
+            tally = self._tallies[poll_id] = PollTally()
+            if self.open_period:
+                self.wheel.schedule(poll_id, sent_at + self.open_period)
+        return tally
+
+    def get(self, poll_id: str) -> Optional[PollTally]:
+        return self._tallies.get(poll_id)
+
+    def record_answer(self, poll_id: str, user_id: int, option_ids: Sequence[int]) -> bool:
+        """Count a user's answer, True when the poll is now due to be closed"""
+        tally = self._tallies.get(poll_id)
+        # Quiz answers can't be changed, retracted votes of regular polls are left counted
+        if tally is None or not option_ids or user_id in tally.answered:
+            return False
+        tally.answered.add(user_id)
+        tally.add(option_ids)
+        return self._full(tally)
+
+    def record_totals(self, poll_id: str, counts: Sequence[int], voters: int) -> bool:
+        """Count the totals of a poll update, True when the poll is now due to be closed"""
+        tally = self._tallies.get(poll_id)
+        if tally is None:
+            return False
+        tally.merge(counts, voters)
+        return self._full(tally)
+
+    def _full(self, tally: PollTally) -> bool:
+        return bool(self.max_voters) and tally.voters >= self.max_voters
+
+    def close(self, poll_id: str) -> Optional[PollTally]:
+        """Stop tracking a poll and return its final tally"""
+        self.wheel.cancel(poll_id)
+        return self._tallies.pop(poll_id, None)
+
+    def expired(self, now: float) -> List[str]:
+        """Polls whose deadline passed, they stay tracked until they are closed"""
+        return [poll_id for poll_id in self.wheel.advance(now) if poll_id in self._tallies]
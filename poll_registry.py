@@ -0,0 +1,79 @@
+# flake8: noqa: E501
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class PollRegistry:
+    """Remembers where sent polls live, bounded by size and idle time
+
+    Entries are kept in least-recently-used order. An entry expires when it
+    hasn't been looked up for `ttl` seconds, and the least recently used entry
+    is evicted once `max_size` is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 24 * 60 * 60,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.closed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        # The front of the dict is the entry that was touched longest ago
+        while self._entries:
+            poll_id, (touched, _) = next(iter(self._entries.items()))
+            if now - touched < self.ttl:
+                break
+            del self._entries[poll_id]
+            self.evictions += 1
+
+    def add(self, poll_id: str, data: Dict[str, Any]) -> None:
+        now = self._clock()
+        self._expire(now)
+        self._entries[poll_id] = (now, data)
+        self._entries.move_to_end(poll_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, poll_id: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        self._expire(now)
+        entry = self._entries.get(poll_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[poll_id] = (now, entry[1])
+        self._entries.move_to_end(poll_id)
+        return entry[1]
+
+    def close(self, poll_id: str) -> Optional[Dict[str, Any]]:
+        """Forget a poll that has been closed"""
+        entry = self._entries.pop(poll_id, None)
+        if entry is None:
+            return None
+        self.closed += 1
+        return entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "closed": self.closed,
+        }
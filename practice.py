@@ -0,0 +1,130 @@
+# flake8: noqa: E501
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from dispatch import PollJob
+
+logger = logging.getLogger(__name__)
+
+# Phrases asked per session
+SESSION_LENGTH = 20
+# A wrongly answered phrase is asked again after this many other questions
+RETRY_GAP = 3
+
+QuizBuilder = Callable[[int, str], Awaitable[Optional[PollJob]]]
+
+
+class PracticeSession:
+    """Quizzes of one learner in their private chat, asked one at a time
+
+    Phrases are asked in random order and a wrongly answered one comes back
+    a few questions later, so the session is over once every phrase has been
+    answered right. The quiz after the current one is built while the
+    current one is still being answered.
+    """
+
+    def __init__(self, user_id: int, chat_id: int, phrases: List[str]) -> None:
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.queue: Deque[str] = deque(phrases)
+        # Poll and phrase of the quiz waiting for an answer
+        self.poll_id: Optional[str] = None
+        self.phrase: Optional[str] = None
+        self.next: Optional["asyncio.Task[Optional[PollJob]]"] = None
+        self.answered = 0
+        self.correct = 0
+        self.streak = 0
+        self.best_streak = 0
+
+    def asked(self, poll_id: str, phrase: str, build: QuizBuilder) -> None:
+        """Remember the quiz just sent and start building the one after it"""
+        self.poll_id = poll_id
+        self.phrase = phrase
+        self.next = asyncio.create_task(self._build_next(build))
+
+    def record(self, correct: bool) -> None:
+        self.answered += 1
+        if correct:
+            self.correct += 1
+            self.streak += 1
+            self.best_streak = max(self.best_streak, self.streak)
+        else:
+            self.streak = 0
+            # Behind the quiz that is already built
+            self.queue.insert(min(RETRY_GAP - 1, len(self.queue)), self.phrase)
+        self.poll_id = None
+
+    async def take_next(self, build: QuizBuilder) -> Optional[PollJob]:
+        """The prefetched quiz, None once the session is over"""
+        job = None
+        if self.next is not None:
+            task, self.next = self.next, None
+            # Waits without raising if the session is cancelled meanwhile
+            await asyncio.wait((task,))
+            if task.cancelled():
+                return None
+            job = task.result()
+        if job is None and self.queue:
+            # Nothing was left when the prefetch ran, a wrong answer may have put a phrase back
+            job = await self._build_next(build)
+        return job
+
+    async def _build_next(self, build: QuizBuilder) -> Optional[PollJob]:
+        while self.queue:
+            phrase = self.queue.popleft()
+            try:
+                job = await build(self.user_id, phrase)
+            except Exception:
+                logger.exception("Failed to build practice quiz for user %s", self.user_id)
+                continue
+            # Deleted phrases and ones without enough wrong answers are skipped
+            if job is not None:
+                return job
+        return None
+
+    def cancel(self) -> None:
+        if self.next is not None:
+            self.next.cancel()
+            self.next = None
+
+    def summary(self) -> str:
+        if not self.answered:
+            return "🏁 Practice over, no quizzes answered."
+        return (
+            f"🏁 Practice over: {self.correct} of {self.answered} answered correctly "
+            f"({self.correct / self.answered:.0%}), best streak {self.best_streak}."
+        )
+
+
+class PracticeSessions:
+    """Running practice sessions, at most one per user"""
+
+    def __init__(self) -> None:
+        self._sessions: Dict[int, PracticeSession] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: int) -> Optional[PracticeSession]:
+        return self._sessions.get(user_id)
+
+    def start(self, session: PracticeSession) -> None:
+        """Run `session`, replacing the user's previous one"""
+        self.end(session.user_id)
+        self._sessions[session.user_id] = session
+
+    def end(self, user_id: int) -> Optional[PracticeSession]:
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            session.cancel()
+        return session
+
+    async def stop(self) -> None:
+        tasks = [session.next for session in self._sessions.values() if session.next is not None]
+        for session in self._sessions.values():
+            session.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sessions.clear()
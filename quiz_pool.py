@@ -0,0 +1,84 @@
+# flake8: noqa: E501
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dispatch import PollJob
+
+logger = logging.getLogger(__name__)
+
+# Quizzes kept ready per user and mode
+POOL_SIZE = 50
+# Seconds a refill waits, so it runs after the handler that asked for it
+REFILL_DELAY = 1.0
+
+QUIZ_MODES = ("translation", "phrase")
+
+
+class QuizPool:
+    """Ready-to-send quizzes for the first `covered` phrases of a vocabulary"""
+
+    __slots__ = ("jobs", "covered")
+
+    def __init__(self, jobs: List[PollJob], covered: int) -> None:
+        self.jobs = jobs
+        self.covered = covered
+
+
+PoolBuilder = Callable[[int, str], Awaitable[QuizPool]]
+
+
+class QuizPoolCache:
+    """Pre-built quiz pools of recently active users, refilled in the background
+
+    A pool is handed out once by `take`, the next one is only built when
+    `refill` asks for it, so users who don't come back cost no rebuild.
+    Pools, and refills still running, are dropped whenever the user's
+    vocabulary changes.
+    """
+
+    def __init__(self, build: PoolBuilder, max_users: int = 1024) -> None:
+        self.build = build
+        self.max_users = max_users
+        self._pools: "OrderedDict[int, Dict[str, QuizPool]]" = OrderedDict()
+        self._refills: Dict[Tuple[int, str], asyncio.Task] = {}
+
+    def take(self, user_id: int, mode: str) -> Optional[QuizPool]:
+        """Hand out the ready pool, if there is one"""
+        pools = self._pools.get(user_id)
+        return pools.pop(mode, None) if pools else None
+
+    def refill(self, user_id: int, mode: str) -> None:
+        """Build the pool in the background unless it is ready or being built"""
+        key = (user_id, mode)
+        if key in self._refills or mode in self._pools.get(user_id, ()):
+            return
+        self._refills[key] = asyncio.create_task(self._refill(user_id, mode))
+
+    def invalidate(self, user_id: int) -> None:
+        self._pools.pop(user_id, None)
+        for mode in QUIZ_MODES:
+            task = self._refills.get((user_id, mode))
+            if task is not None:
+                task.cancel()
+
+    async def stop(self) -> None:
+        for task in self._refills.values():
+            task.cancel()
+        await asyncio.gather(*self._refills.values(), return_exceptions=True)
+        self._refills.clear()
+
+    async def _refill(self, user_id: int, mode: str) -> None:
+        try:
+            await asyncio.sleep(REFILL_DELAY)
+            pool = await self.build(user_id, mode)
+            self._pools.setdefault(user_id, {})[mode] = pool
+            self._pools.move_to_end(user_id)
+            while len(self._pools) > self.max_users:
+                self._pools.popitem(last=False)
+        except Exception:
+            logger.exception("Failed to build quiz pool for user %s", user_id)
+        finally:
+            del self._refills[(user_id, mode)]
@@ -0,0 +1,128 @@
+# flake8: noqa: E501
+
+import logging
+from typing import Iterable, List, Tuple
+
+from storage import ReviewStore
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+# How long a sent but unanswered quiz waits before it may be sent again
+PENDING_TIMEOUT = DAY
+
+# Days until a new phrase is first due, the same as after a first right answer
+FIRST_INTERVAL = 1
+
+# SM-2 answer grades, a quiz only tells us right or wrong
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 1
+
+
+class ReviewState:
+    """SM-2 learning state of a single phrase"""
+
+    __slots__ = ("ease", "interval", "repetitions", "due")
+
+    def __init__(
+        self, ease: float = 2.5, interval: float = 0.0, repetitions: int = 0, due: float = 0.0
+    ) -> None:
+        self.ease = ease
+        self.interval = interval
+        self.repetitions = repetitions
+        self.due = due
+
+    def review(self, quality: int, now: float) -> None:
+        """Apply an answer graded 0-5 and move the due time accordingly"""
+        if quality >= 3:
+            if self.repetitions == 0:
+                self.interval = 1
+            elif self.repetitions == 1:
+                self.interval = 6
+            else:
+                self.interval = round(self.interval * self.ease, 1)
+            self.repetitions += 1
+        else:
+            self.repetitions = 0
+            self.interval = 1
+        self.ease = max(
+            1.3, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        )
+        self.due = now + self.interval * DAY
+
+
+class ReviewScheduler:
+    """SM-2 review states of all users, kept in the database and read by due time
+
+    The reviews table is indexed on the due time, overall and per user, so
+    the most overdue phrases are a short index scan away and no state is
+    held in memory, however many phrases there are. With several shards
+    each process only hands out the phrases of its own users. Answers are
+    buffered and written in batches by `flush`, so recording one is free.
+    """
+
+    def __init__(self, store: ReviewStore, shards: int = 1, shard_index: int = 0) -> None:
+        self.store = store
+        self.shards = shards
+        self.shard_index = shard_index
+        # (user_id, phrase, correct, answered_at) in the order they came in
+        self._answers: List[Tuple[int, str, bool, float]] = []
+
+    async def track(self, user_id: int, phrases: Iterable[str], now: float) -> None:
+        """Start scheduling new phrases, first due one interval from now
+
+        They were just added, and quizzed too when they were pasted.
+        """
+        state = ReviewState(due=now + FIRST_INTERVAL * DAY)
+        await self.store.add(
+            (user_id, phrase, state.ease, state.interval, state.repetitions, state.due)
+            for phrase in phrases
+        )
+
+    async def forget_user(self, user_id: int) -> None:
+        await self.store.delete_user(user_id)
+
+    def record(self, user_id: int, phrase: str, correct: bool, now: float) -> None:
+        """Buffer the learner's answer to a quiz, the phrase is rescheduled with the next flush"""
+        self._answers.append((user_id, phrase, correct, now))
+
+    async def flush(self) -> None:
+        """Reschedule the phrases of the buffered answers, with one read and one write"""
+        if not self._answers:
+            return
+        answers, self._answers = self._answers, []
+        try:
+            rows = await self.store.get_many((user_id, phrase) for user_id, phrase, _, _ in answers)
+            states = {key: ReviewState(*row) for key, row in rows.items()}
+            # Phrases deleted since aren't scheduled anymore
+            for user_id, phrase, correct, now in answers:
+                state = states.get((user_id, phrase))
+                if state is not None:
+                    state.review(CORRECT_QUALITY if correct else WRONG_QUALITY, now)
+            await self.store.save(
+                (user_id, phrase, state.ease, state.interval, state.repetitions, state.due)
+                for (user_id, phrase), state in states.items()
+            )
+        except Exception:
+            logger.exception("Could not reschedule %d answered phrase(s)", len(answers))
+            self._answers[:0] = answers
+
+    async def pop_due(self, now: float, limit: int) -> List[Tuple[int, str]]:
+        """The `limit` most overdue phrases of all users
+
+        They aren't handed out again until they are answered or the quiz is
+        forgotten after `PENDING_TIMEOUT`.
+        """
+        return await self.store.take_due(
+            now, limit, now + PENDING_TIMEOUT, self.shards, self.shard_index
+        )
+
+    async def pop_due_for_user(self, user_id: int, now: float, limit: int) -> List[str]:
+        """The `limit` most overdue phrases of one user"""
+        due = await self.store.take_due(now, limit, now + PENDING_TIMEOUT, user_id=user_id)
+        return [phrase for _, phrase in due]
+
+    async def release(self, phrases: Iterable[Tuple[int, str]], now: float) -> None:
+        """Make `(user_id, phrase)` pairs handed out by a pop due again, their quiz wasn't sent"""
+        await self.store.reschedule(phrases, now)
@@ -0,0 +1,121 @@
+# flake8: noqa: E501
+
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Substrings up to this long have posting lists, longer queries are checked against the keys
+GRAM_SIZE = 3
+# Joins phrase and translation keys, normalized queries never contain it
+SEPARATOR = "\x1f"
+
+
+def normalize(text: str) -> str:
+    """Search key of `text`: NFKC-normalized, casefolded, single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def substrings(key: str, size: int) -> List[str]:
+    """Every substring of `key` of length `size`, repeats included"""
+    return [key[i:i + size] for i in range(len(key) - size + 1)]
+
+
+def grams(key: str) -> Set[str]:
+    """Every substring of `key` up to GRAM_SIZE characters long"""
+    found = set(key)
+    for size in range(2, GRAM_SIZE + 1):
+        found.update(substrings(key, size))
+    return found
+
+
+class SearchIndex:
+    """N-gram inverted index over the phrases and translations of one vocabulary
+
+    Entries are numbered by vocabulary position, so results are in the order
+    phrases are listed and numbered in the picker. Every substring of up to
+    GRAM_SIZE characters has a posting list, so short queries are answered
+    by theirs alone and longer ones only check the entries of their rarest
+    trigram. Posting lists are arrays of positions that only grow, which
+    keeps adding phrases incremental.
+    """
+
+    __slots__ = ("keys", "postings")
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = ()) -> None:
+        self.keys: List[str] = []
+        self.postings: Dict[str, array] = {}
+        self.add(pairs)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        postings = self.postings
+        for phrase, translation in pairs:
+            position = len(self.keys)
+            phrase_key = normalize(phrase)
+            translation_key = normalize(translation)
+            self.keys.append(phrase_key + SEPARATOR + translation_key)
+            # Grams of each side, none of them spans the separator
+            for gram in grams(phrase_key) | grams(translation_key):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(position)
+
+    def find(self, query: str, limit: int) -> List[int]:
+        """Positions of up to `limit` entries matching `query`, in vocabulary order"""
+        query = normalize(query)
+        if not query:
+            return []
+        if len(query) <= GRAM_SIZE:
+            # The posting list of a short query is the exact answer
+            return list(self.postings.get(query, ())[:limit])
+
+        candidates = None
+        for gram in set(substrings(query, GRAM_SIZE)):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+        # Entries with the rarest gram, checked against the whole query
+        keys = self.keys
+        matches = []
+        for position in candidates:
+            if query in keys[position]:
+                matches.append(position)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+class SearchIndexCache:
+    """Per-user search indexes for the most recently active users"""
+
+    def __init__(self, max_users: int = 256) -> None:
+        self.max_users = max_users
+        self._indexes: "OrderedDict[int, SearchIndex]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[SearchIndex]:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+        return index
+
+    def build(self, user_id: int, pairs: Iterable[Tuple[str, str]]) -> SearchIndex:
+        index = SearchIndex(pairs)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def add(self, user_id: int, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Extend the user's index if it is loaded, otherwise it is built on next use"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(pairs)
+
+    def drop(self, user_id: int) -> None:
+        self._indexes.pop(user_id, None)
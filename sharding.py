@@ -0,0 +1,330 @@
+# flake8: noqa: E501
+
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import signal
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+from telegram.request import BaseRequest
+
+from config import Settings
+from dispatch import SendBudget
+from poll_registry import PollRegistry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks whether a starting worker died
+WORKER_START_POLL = 1.0
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Shard that owns the user; stable across processes and restarts"""
+    return user_id % shards
+
+
+class ShardCoordinator:
+    """Front process side of the IPC channel shared by all workers
+
+    Workers connect over loopback TCP and exchange one JSON object per line.
+    They ask for send tokens, which come from a single `SendBudget`, so the
+    Telegram limits hold for the whole deployment and not per process. They
+    also report the polls they sent, so answers can be routed back to them.
+    """
+
+    def __init__(self, registry_size: int, registry_ttl: float, host: str = "127.0.0.1") -> None:
+        self.host = host
+        self.port = 0
+        self.budget = SendBudget()
+        self.poll_owners = PollRegistry(registry_size, registry_ttl)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def owner_of(self, poll_id: str) -> Optional[int]:
+        """Shard that sent the poll, if it told us"""
+        data = self.poll_owners.get(poll_id)
+        return data["shard"] if data else None
+
+    async def _grant(self, writer: asyncio.StreamWriter, request_id: int, chat_id: int) -> None:
+        await self.budget.acquire(chat_id)
+        writer.write(json.dumps({"id": request_id}).encode() + b"\n")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shard = None
+        grants: Set[asyncio.Task] = set()
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message["op"]
+                if op == "acquire":
+                    task = asyncio.create_task(
+                        self._grant(writer, message["id"], message["chat_id"])
+                    )
+                    grants.add(task)
+                    task.add_done_callback(grants.discard)
+                elif op == "pause":
+                    self.budget.pause(message["chat_id"], message["seconds"])
+                elif op == "poll":
+                    self.poll_owners.add(message["poll_id"], {"shard": shard})
+                elif op == "hello":
+                    shard = message["shard"]
+        except (ConnectionError, ValueError):
+            logger.exception("Broken connection to shard %s", shard)
+        finally:
+            for task in grants:
+                task.cancel()
+            writer.close()
+
+
+class ShardClient(SendBudget):
+    """Worker process side of the IPC channel
+
+    Stands in for the dispatcher's local `SendBudget`, so every quiz a worker
+    sends waits for a token from the front process.
+    """
+
+    def __init__(self, shard: int, port: int, host: str = "127.0.0.1") -> None:
+        super().__init__()
+        self.shard = shard
+        self.port = port
+        self.host = host
+        # Called once the front process goes away
+        self.on_close: Optional[Callable[[], None]] = None
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._send({"op": "hello", "shard": self.shard})
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def close(self) -> None:
+        self.on_close = None
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError("Not connected to the front process")
+        self._writer.write(json.dumps(message).encode() + b"\n")
+
+    async def acquire(self, chat_id: int) -> None:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        try:
+            self._send({"op": "acquire", "id": request_id, "chat_id": chat_id})
+            await future
+        finally:
+            del self._waiting[request_id]
+
+    def pause(self, chat_id: int, seconds: float) -> None:
+        self._send({"op": "pause", "chat_id": chat_id, "seconds": seconds})
+
+    def claim_poll(self, poll_id: str) -> None:
+        """Ask the front process to route updates about this poll to us"""
+        self._send({"op": "poll", "poll_id": poll_id})
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            async for line in reader:
+                future = self._waiting.get(json.loads(line)["id"])
+                if future is not None and not future.done():
+                    future.set_result(None)
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost connection to the front process"))
+            if self.on_close is not None:
+                self.on_close()
+
+
+async def serve_shard(
+    settings: Settings,
+    updates: Any,
+    port: int,
+    ready: Any,
+    request: Optional[BaseRequest] = None,
+) -> None:
+    """Process the updates of one shard until a None arrives on `updates`"""
+    import main
+
+    client = ShardClient(settings.shard_index, port)
+    await client.connect()
+    # Stop as well when the front process dies without saying goodbye
+    client.on_close = lambda: updates.put(None)
+    main.poll_dispatcher.budget = client
+    main.shard_client = client
+
+    application = main.build_application(settings, request=request)
+    loop = asyncio.get_running_loop()
+    async with application:
+        await main.post_init(application)
+        await application.start()
+        ready.set()
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.stop()
+        await main.post_shutdown(application)
+    await client.close()
+
+
+def run_worker(
+    settings: Settings,
+    updates: Any,
+    port: int,
+    ready: Any,
+    request: Optional[BaseRequest] = None,
+) -> None:
+    """Entry point of a worker process"""
+    # Ctrl-C goes to the whole process group, the front process shuts us down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import main
+
+    main.setup_logging(f"%(asctime)s - shard {settings.shard_index} - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(serve_shard(settings, updates, port, ready, request))
+
+
+class ShardRouter:
+    """Starts one worker process per shard and hands each update to its shard
+
+    Updates go to the shard of `effective_user.id`, so a user's conversation
+    and vocabulary always live in the same process. Poll and poll answer
+    updates go to the shard that sent the poll, when it has told us.
+    """
+
+    def __init__(self, settings: Settings, worker: Callable[..., None] = run_worker) -> None:
+        self.settings = settings
+        self.shards = settings.shards
+        self.worker = worker
+        self.coordinator = ShardCoordinator(settings.poll_registry_size, settings.poll_registry_ttl)
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: List[Any] = []
+        self._processes: List[Any] = []
+
+    async def start(self) -> None:
+        """Start the workers and wait until all of them can take updates"""
+        await self.coordinator.start()
+        starting = []
+        for index in range(self.shards):
+            shard_settings = replace(
+                self.settings,
+                shard_index=index,
+                metrics_port=self.settings.metrics_port + index if self.settings.metrics_port else 0,
+            )
+            queue = self._context.Queue()
+            ready = self._context.Event()
+            process = self._context.Process(
+                target=self.worker,
+                args=(shard_settings, queue, self.coordinator.port, ready),
+                name=f"shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._queues.append(queue)
+            self._processes.append(process)
+            starting.append((process, ready))
+
+        def wait_ready(process: Any, ready: Any) -> None:
+            while not ready.wait(WORKER_START_POLL):
+                if not process.is_alive():
+                    raise RuntimeError(f"Worker {process.name} exited during startup")
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(None, wait_ready, process, ready) for process, ready in starting)
+        )
+        logger.info("Started %d shard workers", self.shards)
+
+    def shard_for(self, update: Update) -> int:
+        poll_id = None
+        if update.poll is not None:
+            poll_id = update.poll.id
+        elif update.poll_answer is not None:
+            poll_id = update.poll_answer.poll_id
+        if poll_id is not None:
+            owner = self.coordinator.owner_of(poll_id)
+            if owner is not None:
+                return owner
+        user = update.effective_user
+        return shard_of(user.id, self.shards) if user else 0
+
+    def route(self, update: Update) -> None:
+        self._queues[self.shard_for(update)].put(update.to_dict())
+
+    async def stop(self) -> None:
+        """Let the workers finish their pending updates and wait for them to exit"""
+        for queue in self._queues:
+            queue.put(None)
+
+        def join() -> None:
+            for process in self._processes:
+                process.join()
+
+        await asyncio.get_running_loop().run_in_executor(None, join)
+        await self.coordinator.stop()
+
+
+async def serve_front(settings: Settings) -> None:
+    """Receive updates from Telegram and route them to the shard workers"""
+    router = ShardRouter(settings)
+    await router.start()
+
+    updates: asyncio.Queue = asyncio.Queue()
+    updater = Updater(Bot(settings.telegram_bot_token), updates)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    async def forward() -> None:
+        while True:
+            router.route(await updates.get())
+
+    try:
+        async with updater:
+            if settings.webhook_url:
+                await updater.start_webhook(
+                    listen=settings.webhook_listen,
+                    port=settings.webhook_port,
+                    url_path=settings.webhook_path,
+                    webhook_url=settings.webhook_url,
+                    secret_token=settings.webhook_secret,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            else:
+                await updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            forwarding = asyncio.create_task(forward())
+            await stopping.wait()
+            await updater.stop()
+            forwarding.cancel()
+            while not updates.empty():
+                router.route(updates.get_nowait())
+    finally:
+        await router.stop()
+
+
+def run_sharded(settings: Settings) -> None:
+    """Run the front process of a sharded deployment"""
+    asyncio.run(serve_front(settings))
@@ -0,0 +1,129 @@
+# flake8: noqa: E501
+
+from typing import List, Sequence, Tuple
+
+# Columns hashed character trigrams are folded into
+DIMENSIONS = 256
+GRAM_SIZE = 3
+# Most similar options remembered per option
+NEIGHBOURS = 8
+# Options compared against the whole pool in one matrix product
+BATCH_SIZE = 256
+# Indexed options turned into floats at a time while comparing, 8 MB of them
+CHUNK_SIZE = 8192
+
+
+def features(text: str) -> List[int]:
+    """Hashed trigram columns of `text`, padded so one-letter words have grams too"""
+    padded = f" {text.casefold()} "
+    grams = (padded[i:i + GRAM_SIZE] for i in range(max(1, len(padded) - GRAM_SIZE + 1)))
+    return [hash(gram) % DIMENSIONS for gram in grams]
+
+
+class SimilarityIndex:
+    """Character n-gram vectors of option strings and their cached nearest neighbours
+
+    Every option is a vector of hashed trigram counts, so the cosine
+    similarity of two options is a dot product scaled by their norms.
+    Counts are stored as bytes, options are truncated well below 255
+    characters, and only a chunk of them is turned into floats at a time.
+    Neighbours are computed for a whole batch of options with one matrix
+    product per chunk and kept in arrays too, so an option costs about 320
+    bytes. When options are added, the cached neighbours are only compared
+    with the new ones. Needs numpy, which is imported on first use.
+    """
+
+    def __init__(self) -> None:
+        import numpy
+
+        self._np = numpy
+        self._size = 0
+        self._counts = numpy.zeros((0, DIMENSIONS), dtype=numpy.uint8)
+        # Inverse norms of the count vectors
+        self._scales = numpy.zeros(0, dtype=numpy.float32)
+        # Neighbours and their similarities, best first, padded with -1 and -inf
+        self._ids = numpy.zeros((0, NEIGHBOURS), dtype=numpy.int32)
+        self._scores = numpy.zeros((0, NEIGHBOURS), dtype=numpy.float32)
+        self._known = numpy.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, size: int) -> None:
+        np = self._np
+        # Grow geometrically, vocabularies are extended a message at a time
+        capacity = max(size, 2 * len(self._counts))
+        start = self._size
+        grown = (
+            np.zeros((capacity, DIMENSIONS), dtype=np.uint8),
+            np.zeros(capacity, dtype=np.float32),
+            np.full((capacity, NEIGHBOURS), -1, dtype=np.int32),
+            np.full((capacity, NEIGHBOURS), -np.inf, dtype=np.float32),
+            np.zeros(capacity, dtype=bool),
+        )
+        for new, old in zip(grown, (self._counts, self._scales, self._ids, self._scores, self._known)):
+            new[:start] = old[:start]
+        self._counts, self._scales, self._ids, self._scores, self._known = grown
+
+    def extend(self, texts: Sequence[str]) -> None:
+        """Add vectors for `texts`, numbered on from the options already indexed"""
+        if not texts:
+            return
+        np = self._np
+        start = self._size
+        end = start + len(texts)
+        if end > len(self._counts):
+            self._grow(end)
+
+        rows: List[int] = []
+        columns: List[int] = []
+        for row, text in enumerate(texts, start):
+            grams = features(text)
+            rows.extend([row] * len(grams))
+            columns.extend(grams)
+        np.add.at(self._counts, (np.array(rows), np.array(columns)), 1)
+        norms = np.linalg.norm(self._counts[start:end].astype(np.float32), axis=1)
+        self._scales[start:end] = 1 / np.maximum(norms, 1e-12)
+        self._size = end
+        # New options may be closer than the neighbours found so far
+        cached = np.nonzero(self._known[:start])[0].tolist()
+        for i in range(0, len(cached), BATCH_SIZE):
+            self._compute(cached[i:i + BATCH_SIZE], start)
+
+    def neighbours(self, positions: Sequence[int]) -> List[Tuple[int, ...]]:
+        """Most similar other options of each position, best first"""
+        missing = sorted({position for position in positions if not self._known[position]})
+        for i in range(0, len(missing), BATCH_SIZE):
+            self._compute(missing[i:i + BATCH_SIZE], 0)
+        return [tuple(i for i in self._ids[position].tolist() if i >= 0) for position in positions]
+
+    def _compute(self, batch: List[int], start: int) -> None:
+        """Neighbours of `batch` among the options from `start` on, merged with the ones found before"""
+        np = self._np
+        rows = np.array(batch)
+        queries = self._counts[rows].astype(np.float32) * self._scales[rows, None]
+        best_ids = self._ids[rows]
+        best_scores = self._scores[rows]
+        for chunk in range(start, self._size, CHUNK_SIZE):
+            chunk_end = min(chunk + CHUNK_SIZE, self._size)
+            # Scaling the scores is cheaper than scaling the chunk
+            scores = queries @ self._counts[chunk:chunk_end].astype(np.float32).T
+            scores *= self._scales[chunk:chunk_end]
+            # An option is not its own distractor
+            own = (rows >= chunk) & (rows < chunk_end)
+            scores[np.nonzero(own)[0], rows[own] - chunk] = -np.inf
+            k = min(NEIGHBOURS, chunk_end - chunk)
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+            best_ids = np.concatenate((best_ids, top + chunk), axis=1)
+            best_scores = np.concatenate((best_scores, np.take_along_axis(scores, top, axis=1)), axis=1)
+            top = np.argpartition(best_scores, -NEIGHBOURS, axis=1)[:, -NEIGHBOURS:]
+            best_ids = np.take_along_axis(best_ids, top, axis=1)
+            best_scores = np.take_along_axis(best_scores, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        best_ids[np.isneginf(best_scores)] = -1
+        self._ids[rows] = best_ids
+        self._scores[rows] = best_scores
+        self._known[rows] = True
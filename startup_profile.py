@@ -0,0 +1,113 @@
+# flake8: noqa: E501
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Modules shown in the report
+REPORT_TOP = 15
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int, int]]:
+    """Parse `-X importtime` output into (module, depth, self us, cumulative us)"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_times(module: str = "main") -> List[Tuple[str, int, int, int]]:
+    """Import `module` in a fresh interpreter and return its import times"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def time_by_package(rows: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Sum the self time of every module per top-level package, in microseconds"""
+    totals: Dict[str, int] = {}
+    for name, _, self_us, _ in rows:
+        package = name.split(".", 1)[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return totals
+
+
+def time_startup(database_path: Optional[str] = None) -> Tuple[float, float]:
+    """Seconds it takes to build the Application and to run its post_init
+
+    post_init loads what grows with the data (reviews, scores, open polls),
+    so it is run against a copy of `database_path` when one is given.
+    """
+    import main
+    from config import Settings
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "startup.db")
+        if database_path is not None:
+            shutil.copyfile(database_path, path)
+        settings = Settings(
+            telegram_bot_token="123:startup-profile",
+            target_chat_id=-1,
+            database_path=path,
+        )
+        start = time.perf_counter()
+        application = main.build_application(settings)
+        build_seconds = time.perf_counter() - start
+
+        async def initialize() -> float:
+            start = time.perf_counter()
+            await main.post_init(application)
+            elapsed = time.perf_counter() - start
+            await main.post_shutdown(application)
+            return elapsed
+
+        post_init_seconds = asyncio.run(initialize())
+    return build_seconds, post_init_seconds
+
+
+def profile_startup(budget: float, database_path: Optional[str] = None) -> bool:
+    """Print where startup time goes and whether it fits into `budget` seconds"""
+    rows = import_times()
+    import_seconds = next(
+        (cumulative for name, depth, _, cumulative in rows if name == "main" and depth == 0), 0
+    ) / 1e6
+    build_seconds, post_init_seconds = time_startup(database_path)
+    total = import_seconds + build_seconds + post_init_seconds
+
+    print(f"{'package':<30} {'self ms':>10}")
+    packages = sorted(time_by_package(rows).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[:REPORT_TOP]:
+        print(f"{package:<30} {self_us / 1000:>10.1f}")
+
+    print()
+    print(f"{'imported by main':<30} {'cumulative ms':>14}")
+    direct = sorted(
+        (row for row in rows if row[1] == 1), key=lambda row: row[3], reverse=True
+    )
+    for name, _, _, cumulative_us in direct[:REPORT_TOP]:
+        print(f"{name:<30} {cumulative_us / 1000:>14.1f}")
+
+    print()
+    print(f"import main:        {import_seconds * 1000:8.1f} ms")
+    print(f"build application:  {build_seconds * 1000:8.1f} ms")
+    print(f"post_init:          {post_init_seconds * 1000:8.1f} ms")
+    print(f"total:              {total * 1000:8.1f} ms (budget {budget * 1000:.0f} ms)")
+    if total > budget:
+        print("Startup is over budget")
+        return False
+    return True
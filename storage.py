@@ -0,0 +1,809 @@
+# flake8: noqa: E501
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from phrase_table import PhraseTable
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    """SQLite connection in WAL mode, used from a single background thread
+
+    All queries run on one worker thread so the event loop never blocks on disk
+    I/O and the connection is never shared between threads concurrently.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        conn = self._connection()
+        with conn:
+            result = fn(conn, *args)
+        # A cursor freed on the event loop thread resets its statement there,
+        # which breaks the next query that reuses it from the statement cache
+        if isinstance(result, sqlite3.Cursor):
+            result.close()
+            return None
+        return result
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(connection, *args)` inside a transaction on the database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call, fn, *args)
+        )
+
+    async def close(self) -> None:
+        def _close() -> None:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, _close)
+
+
+PHRASES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phrases (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    phrase TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    UNIQUE (user_id, phrase)
+)
+"""
+
+
+class VocabularyStore:
+    """Per-user phrases persisted in SQLite with an LRU cache of hot users
+
+    Writes go straight through to the database, reads of recently active users
+    are served from memory. Cached vocabularies are compact `PhraseTable`s that
+    keep insertion order, which is the order phrases are listed and numbered in.
+    """
+
+    def __init__(self, db: Database, cache_size: int = 1024) -> None:
+        self.db = db
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, PhraseTable]" = OrderedDict()
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            await self.db.run(lambda conn: conn.execute(PHRASES_SCHEMA))
+            self._schema_ready = True
+
+    def _remember(self, user_id: int, phrases: PhraseTable) -> None:
+        self._cache[user_id] = phrases
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get_phrases(self, user_id: int) -> PhraseTable:
+        """Return the user's phrases in insertion order (do not modify the result)"""
+        phrases = self._cache.get(user_id)
+        if phrases is not None:
+            self._cache.move_to_end(user_id)
+            return phrases
+
+        await self._ensure_schema()
+        rows = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT phrase, translation FROM phrases WHERE user_id = ? ORDER BY id",
+                (user_id,),
+            ).fetchall()
+        )
+        phrases = PhraseTable(rows)
+        self._remember(user_id, phrases)
+        return phrases
+
+    async def get_translation(self, user_id: int, phrase: str) -> Optional[str]:
+        """Look up a single phrase without loading a cold user's whole vocabulary"""
+        phrases = self._cache.get(user_id)
+        if phrases is not None:
+            return phrases.get(phrase)
+
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT translation FROM phrases WHERE user_id = ? AND phrase = ?",
+                (user_id, phrase),
+            ).fetchone()
+        )
+        return row[0] if row else None
+
+    async def count(self, user_id: int) -> int:
+        phrases = self._cache.get(user_id)
+        if phrases is not None:
+            return len(phrases)
+
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT COUNT(*) FROM phrases WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        )
+        return row[0]
+
+    async def total(self) -> int:
+        """Number of phrases of all users"""
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute("SELECT COUNT(*) FROM phrases").fetchone()
+        )
+        return row[0]
+
+    async def add_phrases(
+        self, user_id: int, pairs: Iterable[Tuple[str, str]]
+    ) -> List[Tuple[str, str]]:
+        """Add new phrases in one transaction and return the ones that were not known yet"""
+        phrases = await self.get_phrases(user_id)
+        added: Dict[str, str] = {}
+        for phrase, translation in pairs:
+            if phrase not in phrases and phrase not in added:
+                added[phrase] = translation
+        if not added:
+            return []
+
+        rows = [(user_id, phrase, translation) for phrase, translation in added.items()]
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT OR IGNORE INTO phrases (user_id, phrase, translation) VALUES (?, ?, ?)",
+                rows,
+            )
+        )
+        # The cached table may have been evicted while we were writing
+        phrases = self._cache.get(user_id, phrases)
+        phrases.add(added.items())
+        self._remember(user_id, phrases)
+        return list(added.items())
+
+    async def clear(self, user_id: int) -> int:
+        """Delete all phrases of a user and return how many were removed"""
+        await self._ensure_schema()
+        removed = await self.db.run(
+            lambda conn: conn.execute(
+                "DELETE FROM phrases WHERE user_id = ?", (user_id,)
+            ).rowcount
+        )
+        self._remember(user_id, PhraseTable())
+        return removed
+
+    async def import_user_phrases(self, data: Dict[int, Dict[str, str]]) -> int:
+        """One-shot import of the old `{user_id: {phrase: translation}}` format"""
+        imported = 0
+        for user_id, phrases in data.items():
+            added = await self.add_phrases(int(user_id), phrases.items())
+            imported += len(added)
+        return imported
+
+
+REVIEWS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    user_id INTEGER NOT NULL,
+    phrase TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    due REAL NOT NULL,
+    PRIMARY KEY (user_id, phrase)
+)
+"""
+
+
+REVIEWS_DUE_INDEX = "CREATE INDEX IF NOT EXISTS reviews_due ON reviews (due)"
+REVIEWS_USER_DUE_INDEX = "CREATE INDEX IF NOT EXISTS reviews_user_due ON reviews (user_id, due)"
+
+ReviewRow = Tuple[int, str, float, float, int, float]
+
+
+class ReviewStore:
+    """Spaced repetition state of every phrase, indexed by due time"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            now = time.time()
+
+            def _create(conn: sqlite3.Connection) -> None:
+                created = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews'"
+                ).fetchone() is None
+                conn.execute(PHRASES_SCHEMA)
+                conn.execute(REVIEWS_SCHEMA)
+                conn.execute(REVIEWS_DUE_INDEX)
+                conn.execute(REVIEWS_USER_DUE_INDEX)
+                if created:
+                    # Phrases stored before there were reviews, scheduled once
+                    _backfill(conn, now)
+
+            await self.db.run(_create)
+            self._schema_ready = True
+
+    async def backfill(self, now: float) -> int:
+        """Schedule phrases that have no review state, due at `now`"""
+        await self._ensure_schema()
+        return await self.db.run(_backfill, now)
+
+    async def get_many(
+        self, keys: Iterable[Tuple[int, str]]
+    ) -> Dict[Tuple[int, str], Tuple[float, float, int, float]]:
+        """`(ease, interval, repetitions, due)` of the `(user_id, phrase)` keys that are scheduled"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        await self._ensure_schema()
+
+        def _get(conn: sqlite3.Connection) -> Dict[Tuple[int, str], Tuple[float, float, int, float]]:
+            states = {}
+            for key in keys:
+                row = conn.execute(
+                    "SELECT ease, interval, repetitions, due FROM reviews WHERE user_id = ? AND phrase = ?",
+                    key,
+                ).fetchone()
+                if row is not None:
+                    states[key] = row
+            return states
+
+        return await self.db.run(_get)
+
+    async def add(self, rows: Iterable[ReviewRow]) -> None:
+        """Insert `(user_id, phrase, ease, interval, repetitions, due)` rows of phrases not scheduled yet"""
+        rows = list(rows)
+        if not rows:
+            return
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT OR IGNORE INTO reviews (user_id, phrase, ease, interval, repetitions, due) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        )
+
+    async def save(self, rows: Iterable[ReviewRow]) -> None:
+        """Insert or update `(user_id, phrase, ease, interval, repetitions, due)` rows"""
+        rows = list(rows)
+        if not rows:
+            return
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT OR REPLACE INTO reviews (user_id, phrase, ease, interval, repetitions, due) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        )
+
+    async def take_due(
+        self,
+        now: float,
+        limit: int,
+        pending_until: float,
+        shards: int = 1,
+        shard_index: int = 0,
+        user_id: Optional[int] = None,
+    ) -> List[Tuple[int, str]]:
+        """The `limit` phrases due longest, moved on to `pending_until` in the same transaction
+
+        Only phrases of users in `shard_index`, or only those of `user_id`.
+        """
+        await self._ensure_schema()
+
+        def _take(conn: sqlite3.Connection) -> List[Tuple[int, str]]:
+            if user_id is None:
+                rows = conn.execute(
+                    "SELECT user_id, phrase FROM reviews WHERE due <= ? AND user_id % ? = ? "
+                    "ORDER BY due LIMIT ?",
+                    (now, shards, shard_index, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT user_id, phrase FROM reviews WHERE user_id = ? AND due <= ? "
+                    "ORDER BY due LIMIT ?",
+                    (user_id, now, limit),
+                ).fetchall()
+            conn.executemany(
+                "UPDATE reviews SET due = ? WHERE user_id = ? AND phrase = ?",
+                [(pending_until, row_user_id, phrase) for row_user_id, phrase in rows],
+            )
+            return rows
+
+        return await self.db.run(_take)
+
+    async def reschedule(self, keys: Iterable[Tuple[int, str]], due: float) -> None:
+        """Move the `(user_id, phrase)` keys to `due`"""
+        rows = [(due, user_id, phrase) for user_id, phrase in keys]
+        if not rows:
+            return
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "UPDATE reviews SET due = ? WHERE user_id = ? AND phrase = ?", rows
+            )
+        )
+
+    async def delete_user(self, user_id: int) -> None:
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.execute("DELETE FROM reviews WHERE user_id = ?", (user_id,))
+        )
+
+
+def _backfill(conn: sqlite3.Connection, now: float) -> int:
+    return conn.execute(
+        "INSERT OR IGNORE INTO reviews (user_id, phrase, ease, interval, repetitions, due) "
+        "SELECT user_id, phrase, 2.5, 0, 0, ? FROM phrases",
+        (now,),
+    ).rowcount
+
+
+ANSWERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    user_id INTEGER NOT NULL,
+    poll_id TEXT NOT NULL,
+    option_id INTEGER NOT NULL,
+    correct INTEGER,
+    answered_at REAL NOT NULL
+)
+"""
+
+ANSWERS_INDEX = "CREATE INDEX IF NOT EXISTS answers_user ON answers (user_id)"
+
+
+class AnswerStore:
+    """Append-only log of quiz answers"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+
+            def _create(conn: sqlite3.Connection) -> None:
+                conn.execute(ANSWERS_SCHEMA)
+                conn.execute(ANSWERS_INDEX)
+
+            await self.db.run(_create)
+            self._schema_ready = True
+
+    async def append(
+        self, rows: List[Tuple[int, str, int, Optional[bool], float]]
+    ) -> None:
+        """Append `(user_id, poll_id, option_id, correct, answered_at)` rows"""
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT INTO answers (user_id, poll_id, option_id, correct, answered_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        )
+
+    async def accuracy(self, user_id: int) -> Tuple[int, int]:
+        """Number of correct answers and of graded answers of a user"""
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT COALESCE(SUM(correct), 0), COUNT(correct) FROM answers WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        )
+        return row[0], row[1]
+
+
+TRANSLATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    key TEXT PRIMARY KEY,
+    translation TEXT NOT NULL
+)
+"""
+
+# Keys per query, below SQLite's limit on bound parameters
+TRANSLATION_LOOKUP_CHUNK = 500
+
+
+class TranslationStore:
+    """Model translations addressed by a hash of what was asked, shared by all users"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            await self.db.run(lambda conn: conn.execute(TRANSLATIONS_SCHEMA))
+            self._schema_ready = True
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Cached translations of the keys that have one"""
+        await self._ensure_schema()
+
+        def _get(conn: sqlite3.Connection) -> Dict[str, str]:
+            found: Dict[str, str] = {}
+            for start in range(0, len(keys), TRANSLATION_LOOKUP_CHUNK):
+                chunk = keys[start:start + TRANSLATION_LOOKUP_CHUNK]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(
+                    conn.execute(
+                        f"SELECT key, translation FROM translations WHERE key IN ({placeholders})",
+                        chunk,
+                    )
+                )
+            return found
+
+        return await self.db.run(_get)
+
+    async def put_many(self, rows: List[Tuple[str, str]]) -> None:
+        """Store `(key, translation)` rows"""
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translation) VALUES (?, ?)", rows
+            )
+        )
+
+
+TARGETS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, chat_id)
+)
+"""
+
+
+class TargetStore:
+    """Chats each user's quizzes are sent to, with an LRU cache of hot users"""
+
+    def __init__(self, db: Database, cache_size: int = 1024) -> None:
+        self.db = db
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, List[int]]" = OrderedDict()
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            await self.db.run(lambda conn: conn.execute(TARGETS_SCHEMA))
+            self._schema_ready = True
+
+    def _remember(self, user_id: int, chat_ids: List[int]) -> None:
+        self._cache[user_id] = chat_ids
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, user_id: int) -> List[int]:
+        """Registered chats of the user in the order they were added (do not modify)"""
+        chat_ids = self._cache.get(user_id)
+        if chat_ids is not None:
+            self._cache.move_to_end(user_id)
+            return chat_ids
+
+        await self._ensure_schema()
+        rows = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT chat_id FROM targets WHERE user_id = ? ORDER BY rowid", (user_id,)
+            ).fetchall()
+        )
+        chat_ids = [chat_id for chat_id, in rows]
+        self._remember(user_id, chat_ids)
+        return chat_ids
+
+    async def add(self, user_id: int, chat_id: int) -> bool:
+        """Register a chat, False if it already was"""
+        chat_ids = await self.get(user_id)
+        if chat_id in chat_ids:
+            return False
+        await self.db.run(
+            lambda conn: conn.execute(
+                "INSERT OR IGNORE INTO targets (user_id, chat_id) VALUES (?, ?)",
+                (user_id, chat_id),
+            )
+        )
+        self._remember(user_id, chat_ids + [chat_id])
+        return True
+
+    async def remove(self, user_id: int, chat_id: int) -> bool:
+        """Unregister a chat, False if it wasn't registered"""
+        chat_ids = await self.get(user_id)
+        if chat_id not in chat_ids:
+            return False
+        await self.db.run(
+            lambda conn: conn.execute(
+                "DELETE FROM targets WHERE user_id = ? AND chat_id = ?", (user_id, chat_id)
+            )
+        )
+        self._remember(user_id, [other for other in chat_ids if other != chat_id])
+        return True
+
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    correct_option_id INTEGER NOT NULL,
+    user_id INTEGER,
+    phrase TEXT
+)
+"""
+
+# chat_id, question, options, correct_option_id, user_id, phrase
+OutboxRow = Tuple[int, str, List[str], int, Optional[int], Optional[str]]
+
+
+class OutboxStore:
+    """Quizzes that were queued for sending but not finished yet
+
+    A row is written before the quiz is handed to the sender and deleted once
+    Telegram returned the poll (or rejected it for good), so whatever is left
+    after a crash still has to be sent.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            await self.db.run(lambda conn: conn.execute(OUTBOX_SCHEMA))
+            self._schema_ready = True
+
+    async def add(self, rows: List[OutboxRow]) -> List[int]:
+        """Record quizzes in one transaction and return their ids"""
+        await self._ensure_schema()
+
+        def _add(conn: sqlite3.Connection) -> List[int]:
+            ids = []
+            for chat_id, question, options, correct_option_id, user_id, phrase in rows:
+                cursor = conn.execute(
+                    "INSERT INTO outbox (chat_id, question, options, correct_option_id, user_id, phrase) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (chat_id, question, json.dumps(options), correct_option_id, user_id, phrase),
+                )
+                ids.append(cursor.lastrowid)
+            return ids
+
+        return await self.db.run(_add)
+
+    async def finish(self, outbox_id: int) -> None:
+        await self.db.run(
+            lambda conn: conn.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+        )
+
+    async def last_id(self) -> int:
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()
+        )
+        return row[0]
+
+    async def unfinished(
+        self, after_id: int, up_to_id: int, limit: int, shards: int = 1, shard_index: int = 0
+    ) -> List[Tuple[int, OutboxRow]]:
+        """Next `limit` unfinished quizzes with `after_id < id <= up_to_id`, by id
+
+        With several shards only the quizzes of users in `shard_index` are returned.
+        """
+        await self._ensure_schema()
+        rows = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT id, chat_id, question, options, correct_option_id, user_id, phrase "
+                "FROM outbox WHERE id > ? AND id <= ? AND COALESCE(user_id, 0) % ? = ? "
+                "ORDER BY id LIMIT ?",
+                (after_id, up_to_id, shards, shard_index, limit),
+            ).fetchall()
+        )
+        return [
+            (row[0], (row[1], row[2], json.loads(row[3]), row[4], row[5], row[6]))
+            for row in rows
+        ]
+
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+STATE_INDEX = "CREATE INDEX IF NOT EXISTS state_updated ON state (kind, updated_at)"
+
+
+class StateStore:
+    """Pickled bot state (user, chat and bot data, conversations, polls) by kind and key"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+
+            def _create(conn: sqlite3.Connection) -> None:
+                conn.execute(STATE_SCHEMA)
+                conn.execute(STATE_INDEX)
+
+            await self.db.run(_create)
+            self._schema_ready = True
+
+    async def get(self, kind: str, key: str) -> Optional[bytes]:
+        await self._ensure_schema()
+        row = await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT data FROM state WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        )
+        return row[0] if row else None
+
+    async def get_kind(self, kind: str) -> List[Tuple[str, bytes]]:
+        """All `(key, data)` rows of a kind"""
+        await self._ensure_schema()
+        return await self.db.run(
+            lambda conn: conn.execute(
+                "SELECT key, data FROM state WHERE kind = ?", (kind,)
+            ).fetchall()
+        )
+
+    async def keys(self, kind: str) -> List[str]:
+        """Keys of all rows of a kind, without their data"""
+        await self._ensure_schema()
+        return await self.db.run(
+            lambda conn: [
+                key for (key,) in conn.execute("SELECT key FROM state WHERE kind = ?", (kind,))
+            ]
+        )
+
+    async def write(
+        self,
+        changes: List[Tuple[str, str, Optional[bytes]]],
+        now: float,
+        expire: Optional[Tuple[str, float]] = None,
+    ) -> None:
+        """Apply `(kind, key, data)` changes in one transaction, None data deletes the row
+
+        `expire=(kind, seconds)` also deletes the rows of that kind not written for that long.
+        """
+        await self._ensure_schema()
+
+        def _write(conn: sqlite3.Connection) -> None:
+            conn.executemany(
+                "INSERT OR REPLACE INTO state (kind, key, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(kind, key, data, now) for kind, key, data in changes if data is not None],
+            )
+            conn.executemany(
+                "DELETE FROM state WHERE kind = ? AND key = ?",
+                [(kind, key) for kind, key, data in changes if data is None],
+            )
+            if expire is not None:
+                kind, seconds = expire
+                conn.execute(
+                    "DELETE FROM state WHERE kind = ? AND updated_at < ?", (kind, now - seconds)
+                )
+
+        await self.db.run(_write)
+
+
+SCORES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (chat_id, user_id, day)
+)
+"""
+
+
+class ScoreStore:
+    """Correct quiz answers per chat, user and UTC day, for the leaderboards"""
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._schema_ready = False
+
+    async def _ensure_schema(self) -> None:
+        if not self._schema_ready:
+            await self.db.run(lambda conn: conn.execute(SCORES_SCHEMA))
+            self._schema_ready = True
+
+    async def add(self, rows: List[Tuple[int, int, int, int, str]]) -> None:
+        """Add `(chat_id, user_id, day, correct, name)` counts to the stored ones"""
+        await self._ensure_schema()
+        await self.db.run(
+            lambda conn: conn.executemany(
+                "INSERT INTO scores (chat_id, user_id, day, correct, name) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (chat_id, user_id, day) "
+                "DO UPDATE SET correct = correct + excluded.correct, name = excluded.name",
+                rows,
+            )
+        )
+
+    async def load(self, since_day: int) -> List[Tuple[int, int, int, int, str]]:
+        """`(chat_id, user_id, day, correct, name)` rows, oldest first
+
+        Days before `since_day` are summed into one row with day 0 per chat and user.
+        """
+        await self._ensure_schema()
+        # With MAX(), SQLite takes the bare `name` from the row of the newest day
+        return await self.db.run(
+            lambda conn: [
+                row[:5]
+                for row in conn.execute(
+                    "SELECT chat_id, user_id, CASE WHEN day >= ? THEN day ELSE 0 END AS bucket, "
+                    "SUM(correct), name, MAX(day) AS last FROM scores "
+                    "GROUP BY chat_id, user_id, bucket ORDER BY last",
+                    (since_day,),
+                )
+            ]
+        )
+
+    async def top(self, chat_id: int, since_day: int, k: int) -> List[Tuple[int, int, str]]:
+        """Up to `k` `(user_id, correct, name)` rows of a chat since `since_day`, best first"""
+        await self._ensure_schema()
+        return await self.db.run(
+            lambda conn: [
+                row[:3]
+                for row in conn.execute(
+                    "SELECT user_id, SUM(correct) AS total, name, MAX(day) FROM scores "
+                    "WHERE chat_id = ? AND day >= ? GROUP BY user_id "
+                    "ORDER BY total DESC, MIN(day) LIMIT ?",
+                    (chat_id, since_day, k),
+                )
+            ]
+        )
+
+
+async def _import_json(db_path: str, json_path: str) -> None:
+    with open(json_path, encoding="utf-8") as file:
+        data = json.load(file)
+    db = Database(db_path)
+    store = VocabularyStore(db)
+    imported = await store.import_user_phrases(data)
+    # The bot only schedules phrases added through it
+    await ReviewStore(db).backfill(time.time())
+    await db.close()
+    print(f"Imported {imported} phrase(s) for {len(data)} user(s) into {db_path}")
+
+
+def main() -> None:
+    """Import a JSON dump of the old in-memory `user_phrases` dict"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("json_path", help="file with {user_id: {phrase: translation}}")
+    parser.add_argument("--db", default="vocabulary.db", help="SQLite database path")
+    args = parser.parse_args()
+    asyncio.run(_import_json(args.db, args.json_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import pytest
+
+from distractors import DistractorIndex, OptionPool, truncate_translation
+
+
+def pool_of(options, hard=False):
+    pool = OptionPool(hard)
+    for option in options:
+        pool.add(option)
+    return pool
+
+
+def test_add_skips_duplicates_and_truncates():
+    pool = pool_of(["cat", "cat", "x" * 200])
+    assert pool.options == ["cat", truncate_translation("x" * 200)]
+
+
+def test_add_keeps_first_spelling_of_case_only_duplicates():
+    pool = pool_of(["Cat", "cat", "CAT", "dog"])
+    assert pool.options == ["Cat", "dog"]
+
+
+def test_sample_returns_distinct_wrong_options():
+    pool = pool_of([f"word {i}" for i in range(20)])
+    for _ in range(50):
+        wrong_options = pool.sample("word 3")
+        assert len(wrong_options) == 3
+        assert len(set(wrong_options)) == 3
+        assert "word 3" not in wrong_options
+
+
+def test_sample_uses_every_other_option_when_there_are_just_enough():
+    pool = pool_of(["a", "b", "c", "d"])
+    assert sorted(pool.sample("a")) == ["b", "c", "d"]
+
+
+def test_sample_returns_none_with_too_few_options():
+    pool = pool_of(["a", "b", "c"])
+    assert pool.sample("a") is None
+    assert pool_of([]).sample("a") is None
+
+
+def test_sample_counts_an_unknown_correct_option_as_extra():
+    pool = pool_of(["a", "b", "c"])
+    assert sorted(pool.sample("z")) == ["a", "b", "c"]
+
+
+def test_sample_never_offers_the_correct_option_in_another_case():
+    pool = pool_of(["cat", "Cat", "CAT", "dog", "bird", "fish"])
+    for _ in range(50):
+        wrong_options = pool.sample("CAT")
+        assert sorted(wrong_options) == ["bird", "dog", "fish"]
+
+
+def test_make_options_places_the_correct_option():
+    index = DistractorIndex([("one", "eins"), ("two", "zwei"), ("three", "drei"), ("four", "vier")])
+    options, correct = index.translation_options("zwei")
+    assert len(options) == 4
+    assert options[correct] == "zwei"
+    assert index.phrase_options("nine") is not None
+    assert DistractorIndex([("one", "eins")]).translation_options("eins") is None
+
+
+def test_hardest_prefers_similar_options():
+    pytest.importorskip("numpy")
+    pool = pool_of(["house", "houses", "housing", "mouse", "banana", "xylophone", "quartz"], hard=True)
+    wrong_options = pool.hardest("house")
+    assert wrong_options is not None
+    assert "house" not in wrong_options
+    assert set(wrong_options) <= {"houses", "housing", "mouse"}
+
+
+def test_hardest_skips_case_only_duplicates():
+    pytest.importorskip("numpy")
+    pool = pool_of(["House", "house", "HOUSE", "houses", "housing", "mouse", "banana"], hard=True)
+    wrong_options = pool.hardest("house")
+    assert wrong_options is not None
+    assert {option.casefold() for option in wrong_options}.isdisjoint({"house"})
+    assert len({option.casefold() for option in wrong_options}) == 3
+
+
+def test_hardest_returns_none_with_too_few_options():
+    pytest.importorskip("numpy")
+    pool = pool_of(["cat", "Cat", "CAT", "dog"], hard=True)
+    assert pool.hardest("cat") is None
+    assert pool.hardest("unknown") is None
+    assert pool.sample("cat") is None
+
+
+def test_sample_after_prepare_in_hard_mode():
+    pytest.importorskip("numpy")
+    pool = pool_of(["a", "b", "c", "d"], hard=True)
+    pool.prepare(["a"])
+    assert sorted(pool.sample("a")) == ["b", "c", "d"]
@@ -0,0 +1,84 @@
+from leaderboard import DAY, WEEK_DAYS, ChatBoard, Leaderboard, Ranking
+
+
+def test_top_orders_by_score_then_by_who_got_there_first():
+    ranking = Ranking()
+    ranking.add(1, 2)
+    ranking.add(2, 3)
+    ranking.add(3, 2)
+    ranking.add(4, 1)
+    assert ranking.top(10) == [(2, 3), (1, 2), (3, 2), (4, 1)]
+    assert ranking.top(2) == [(2, 3), (1, 2)]
+    # Catching up puts a user behind the ones already at that score
+    ranking.add(4, 1)
+    assert ranking.top(10) == [(2, 3), (1, 2), (3, 2), (4, 2)]
+
+
+def test_standing_shares_places_between_equal_scores():
+    ranking = Ranking()
+    for user_id, score in [(1, 5), (2, 3), (3, 3), (4, 1)]:
+        ranking.add(user_id, score)
+    assert ranking.standing(1) == (1, 5)
+    assert ranking.standing(2) == (2, 3)
+    assert ranking.standing(3) == (2, 3)
+    assert ranking.standing(4) == (4, 1)
+    assert ranking.standing(5) is None
+
+
+def test_scores_dropping_to_zero_leave_the_ranking():
+    ranking = Ranking()
+    ranking.add(1, 2)
+    ranking.add(2, 2)
+    ranking.add(1, -2)
+    assert len(ranking) == 1
+    assert ranking.top(10) == [(2, 2)]
+    assert ranking.standing(1) is None
+    ranking.add(2, -2)
+    assert ranking.levels == []
+    assert ranking.buckets == {}
+
+
+def test_board_counts_today_in_every_window():
+    board = ChatBoard(today=100)
+    board.add(1, 100, 2)
+    board.add(2, 99, 3)
+    board.add(3, 100 - WEEK_DAYS, 4)
+    assert board.rankings["day"].top(10) == [(1, 2)]
+    assert board.rankings["week"].top(10) == [(2, 3), (1, 2)]
+    assert board.rankings["all"].top(10) == [(3, 4), (2, 3), (1, 2)]
+
+
+def test_rolling_drops_days_that_leave_the_week():
+    board = ChatBoard(today=100)
+    board.add(1, 100, 2)
+    board.add(2, 95, 3)
+    board.roll(101)
+    assert board.rankings["day"].top(10) == []
+    assert board.rankings["week"].top(10) == [(2, 3), (1, 2)]
+    board.roll(95 + WEEK_DAYS)
+    assert board.rankings["week"].top(10) == [(1, 2)]
+    board.roll(100 + WEEK_DAYS)
+    assert board.rankings["week"].top(10) == []
+    assert board.rankings["all"].top(10) == [(2, 3), (1, 2)]
+
+
+def test_rolling_back_in_time_is_ignored():
+    board = ChatBoard(today=100)
+    board.add(1, 100, 1)
+    board.roll(99)
+    assert board.today == 100
+    assert board.rankings["day"].top(10) == [(1, 1)]
+
+
+def test_leaderboard_keeps_chats_apart_and_rolls_with_the_clock():
+    leaderboard = Leaderboard(store=None)
+    now = 100 * DAY
+    leaderboard.record(-1, 1, "Ann", now)
+    leaderboard.record(-1, 1, "Ann", now)
+    leaderboard.record(-2, 2, "Bob", now)
+    assert leaderboard.top(-1, "day", 10, now) == [(1, 2)]
+    assert leaderboard.top(-2, "all", 10, now) == [(2, 1)]
+    assert leaderboard.top(-3, "all", 10, now) == []
+    assert leaderboard.top(-1, "day", 10, now + DAY) == []
+    assert leaderboard.standing(-1, "week", 1, now + DAY) == (1, 2)
+    assert leaderboard.standing(-3, "week", 1, now) is None
@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+from main import pressed_page
+from pages import LIST_VIEW, PAGE_SIZE, PICKER_VIEW, PageCache, page_data, page_keyboard, parse_page_data, picker_links
+from phrase_table import PhraseTable, StringTable
+
+
+class FakeQuery:
+    def __init__(self, data, user_id):
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id)
+        self.answers = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+
+def press(data, user_id):
+    query = FakeQuery(data, user_id)
+    return asyncio.run(pressed_page(query)), query.answers
+
+
+def callback_data(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_page_data_round_trips():
+    assert parse_page_data(page_data(42, LIST_VIEW, 3)) == (42, LIST_VIEW, 3)
+    assert parse_page_data(page_data(-100123, PICKER_VIEW, 0)) == (-100123, PICKER_VIEW, 0)
+
+
+def test_parse_page_data_rejects_old_and_bad_buttons():
+    assert parse_page_data("page:list:3") is None
+    assert parse_page_data("page:42:other:3") is None
+    assert parse_page_data("page:x:list:3") is None
+    assert parse_page_data("page:42:list:") is None
+
+
+def test_keyboard_buttons_name_the_owner():
+    markup = page_keyboard(42, 1, 3 * PAGE_SIZE, LIST_VIEW)
+    assert callback_data(markup) == [page_data(42, LIST_VIEW, 0), page_data(42, LIST_VIEW, 2)]
+    assert callback_data(page_keyboard(42, 0, PAGE_SIZE, LIST_VIEW)) == []
+
+
+def test_picker_links_open_the_pages_of_the_positions():
+    markup = picker_links(42, [PAGE_SIZE * 2 + 1, 0, 1, PAGE_SIZE * 2])
+    assert callback_data(markup) == [page_data(42, PICKER_VIEW, 0), page_data(42, PICKER_VIEW, 2)]
+
+
+def test_owner_can_turn_pages():
+    parsed, answers = press(page_data(42, LIST_VIEW, 1), 42)
+    assert parsed == (42, LIST_VIEW, 1)
+    assert answers == []
+
+
+def test_other_users_get_an_alert():
+    parsed, answers = press(page_data(42, LIST_VIEW, 1), 7)
+    assert parsed is None
+    assert len(answers) == 1
+    assert answers[0][1] is True
+
+
+def test_outdated_buttons_get_an_alert():
+    parsed, answers = press("page:list:1", 42)
+    assert parsed is None
+    assert len(answers) == 1
+    assert answers[0][1] is True
+
+
+def test_page_cache_renders_only_the_requested_page():
+    phrases = PhraseTable([(f"phrase {i}", f"translation {i}") for i in range(PAGE_SIZE + 2)], StringTable())
+    cache = PageCache()
+    text, markup = cache.get(42, phrases, 1, PICKER_VIEW)
+    assert "page 2/2" in text
+    assert f"{PAGE_SIZE + 1}. phrase {PAGE_SIZE} - translation {PAGE_SIZE}" in text
+    assert "phrase 0 " not in text
+    assert callback_data(markup) == [page_data(42, PICKER_VIEW, 0)]
+    # Pages past the end show the last one
+    assert cache.get(42, phrases, 5, PICKER_VIEW)[0] == text
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from persistence import POLL, StatePersistence
+from storage import Database, StateStore
+
+
+class GatedStore(StateStore):
+    """State store whose writes wait until the test lets them through, or fail"""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.failures = 0
+        self.writes = []
+
+    async def write(self, changes, now, expire=None):
+        self.writes.append(changes)
+        await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("disk full")
+        await super().write(changes, now, expire)
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Run a test coroutine with a persistence backed by a fresh database"""
+
+    def run(scenario):
+        async def main():
+            db = Database(str(tmp_path / "state.db"))
+            store = GatedStore(db)
+            try:
+                await scenario(StatePersistence(store), store)
+            finally:
+                await db.close()
+
+        asyncio.run(main())
+
+    return run
+
+
+async def settle(persistence):
+    await asyncio.gather(*persistence._flushes)
+
+
+def test_remembered_polls_are_written_right_away(run):
+    async def scenario(persistence, store):
+        persistence.remember_poll("p1", {"phrase": "Hund"})
+        assert await persistence.load_poll("p1") == {"phrase": "Hund"}
+        await settle(persistence)
+        assert len(store.writes) == 1
+        assert await store.get(POLL, "p1") is not None
+        assert await persistence.load_polls() == {"p1": {"phrase": "Hund"}}
+
+    run(scenario)
+
+
+def test_forgotten_polls_are_gone_while_still_staged(run):
+    async def scenario(persistence, store):
+        persistence.remember_poll("p1", {"phrase": "Hund"})
+        await settle(persistence)
+        persistence.forget_poll("p1")
+        assert await persistence.load_poll("p1") is None
+        await settle(persistence)
+        assert await store.get(POLL, "p1") is None
+
+    run(scenario)
+
+
+def test_forgetting_wins_over_a_write_in_flight(run):
+    async def scenario(persistence, store):
+        store.gate.clear()
+        persistence.remember_poll("p1", {"phrase": "Hund"})
+        await asyncio.sleep(0)
+        assert len(store.writes) == 1
+        # The batch in flight is still readable
+        assert await persistence.load_poll("p1") == {"phrase": "Hund"}
+        persistence.forget_poll("p1")
+        assert await persistence.load_poll("p1") is None
+        store.gate.set()
+        await settle(persistence)
+        await persistence.flush()
+        assert await persistence.load_poll("p1") is None
+        assert await store.get(POLL, "p1") is None
+
+    run(scenario)
+
+
+def test_failed_writes_are_retried_without_undoing_newer_changes(run):
+    async def scenario(persistence, store):
+        store.gate.clear()
+        store.failures = 1
+        persistence.remember_poll("p1", {"phrase": "Hund"})
+        persistence.remember_poll("p2", {"phrase": "Katze"})
+        await asyncio.sleep(0)
+        persistence.forget_poll("p2")
+        store.gate.set()
+        await settle(persistence)
+        await persistence.flush()
+        assert await store.get(POLL, "p1") is not None
+        assert await store.get(POLL, "p2") is None
+        assert await persistence.load_polls() == {"p1": {"phrase": "Hund"}}
+
+    run(scenario)
+
+
+def test_unchanged_data_is_not_written_again(run):
+    async def scenario(persistence, store):
+        await persistence.update_bot_data({"answers": 1})
+        await settle(persistence)
+        await persistence.update_bot_data({"answers": 1})
+        await settle(persistence)
+        assert len(store.writes) == 1
+        await persistence.update_bot_data({})
+        await settle(persistence)
+        assert len(store.writes) == 2
+        assert await persistence.get_bot_data() == {}
+
+    run(scenario)
+
+
+def test_ended_conversations_are_deleted(run):
+    async def scenario(persistence, store):
+        await persistence.update_conversation("quiz", (1, 2), 3)
+        await settle(persistence)
+        assert await persistence.get_conversations("quiz") == {(1, 2): 3}
+        await persistence.update_conversation("quiz", (1, 2), None)
+        await settle(persistence)
+        assert await persistence.get_conversations("quiz") == {}
+
+    run(scenario)
+
+
+def test_user_data_is_loaded_on_first_use(run):
+    async def scenario(persistence, store):
+        await persistence.get_user_data()
+        fresh = {}
+        await persistence.refresh_user_data(5, fresh)
+        fresh["page"] = 2
+        await persistence.update_user_data(5, fresh)
+        await settle(persistence)
+
+        restarted = StatePersistence(store)
+        await restarted.get_user_data()
+        loaded = {}
+        await restarted.refresh_user_data(5, loaded)
+        assert loaded == {"page": 2}
+        # Users without stored data cost no query
+        await restarted.refresh_user_data(6, {})
+
+    run(scenario)
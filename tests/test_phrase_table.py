@@ -0,0 +1,80 @@
+import gc
+
+from phrase_table import INSORT_LIMIT, PhraseTable, StringTable
+
+
+def test_mapping_keeps_insertion_order_and_first_translation():
+    phrases = PhraseTable([("b", "2"), ("a", "1"), ("b", "other")], StringTable())
+    assert list(phrases) == ["b", "a"]
+    assert list(phrases.items()) == [("b", "2"), ("a", "1")]
+    assert phrases["a"] == "1"
+    assert "c" not in phrases
+    assert 1 not in phrases
+    assert phrases.get("c") is None
+
+
+def test_add_skips_known_phrases():
+    phrases = PhraseTable([("a", "1")], StringTable())
+    assert phrases.add([("a", "other"), ("b", "2")]) == 1
+    assert phrases.add([("a", "1")]) == 0
+    assert dict(phrases) == {"a": "1", "b": "2"}
+
+
+def test_large_batches_rebuild_the_lookup_index():
+    pairs = [(f"phrase {i}", f"translation {i}") for i in range(INSORT_LIMIT * 3)]
+    phrases = PhraseTable(pairs[:10], StringTable())
+    phrases.add(pairs[10:])
+    assert all(phrases[phrase] == translation for phrase, translation in pairs)
+
+
+def test_item_and_slice_follow_insertion_order():
+    pairs = [(f"phrase {i}", f"translation {i}") for i in range(10)]
+    phrases = PhraseTable(pairs, StringTable())
+    assert phrases.item(3) == pairs[3]
+    assert phrases.item(-1) == pairs[-1]
+    assert phrases.slice(2, 5) == pairs[2:5]
+    assert phrases.slice(8) == pairs[8:]
+    assert phrases.slice(20) == []
+
+
+def test_strings_are_shared_between_tables():
+    table = StringTable()
+    first = PhraseTable([("hello", "hallo"), ("dog", "Hund")], table)
+    second = PhraseTable([("hello", "hallo"), ("cat", "Katze")], table)
+    assert len(table) == 6
+    assert first._phrase_ids[0] == second._phrase_ids[0]
+
+
+def test_strings_are_released_with_the_last_table():
+    table = StringTable()
+    first = PhraseTable([("hello", "hallo"), ("dog", "Hund")], table)
+    second = PhraseTable([("hello", "hallo")], table)
+    del first
+    gc.collect()
+    assert table.lookup("dog") is None
+    assert table.lookup("Hund") is None
+    assert table.lookup("hello") is not None
+    del second
+    gc.collect()
+    assert len(table) == 0
+
+
+def test_released_ids_are_reused():
+    table = StringTable()
+    first = PhraseTable([("dog", "Hund")], table)
+    ids = set(first._phrase_ids) | set(first._translation_ids)
+    del first
+    gc.collect()
+    second = PhraseTable([("cat", "Katze")], table)
+    assert set(second._phrase_ids) | set(second._translation_ids) == ids
+    assert second["cat"] == "Katze"
+
+
+def test_intern_and_release_count_references():
+    table = StringTable()
+    ids = table.intern_all(["a", "a", "b"])
+    assert ids[0] == ids[1] != ids[2]
+    table.release_all([ids[0]])
+    assert table.lookup("a") == ids[0]
+    table.release_all([ids[1], ids[2]])
+    assert len(table) == 0
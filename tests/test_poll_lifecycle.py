@@ -0,0 +1,67 @@
+from poll_lifecycle import PollTally, TimerWheel
+
+
+def test_timers_fire_at_the_first_tick_after_their_deadline():
+    wheel = TimerWheel(tick=1.0, slots=8, now=100.0)
+    wheel.schedule("a", 102.5)
+    wheel.schedule("b", 101.0)
+    assert len(wheel) == 2
+    assert wheel.advance(101.5) == ["b"]
+    assert wheel.advance(102.9) == []
+    assert wheel.advance(103.0) == ["a"]
+    assert len(wheel) == 0
+
+
+def test_overdue_timers_fire_with_the_next_tick():
+    wheel = TimerWheel(tick=1.0, slots=8, now=100.0)
+    wheel.schedule("late", 50.0)
+    assert wheel.advance(100.5) == []
+    assert wheel.advance(101.0) == ["late"]
+
+
+def test_rescheduling_replaces_and_cancelling_removes():
+    wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+    wheel.schedule("a", 2.0)
+    wheel.schedule("a", 5.0)
+    wheel.schedule("b", 3.0)
+    wheel.cancel("b")
+    wheel.cancel("missing")
+    assert len(wheel) == 1
+    assert wheel.advance(4.0) == []
+    assert wheel.advance(5.0) == ["a"]
+
+
+def test_later_rounds_sharing_a_slot_stay():
+    wheel = TimerWheel(tick=1.0, slots=4, now=0.0)
+    wheel.schedule("soon", 1.0)
+    wheel.schedule("later", 9.0)
+    assert wheel.advance(1.0) == ["soon"]
+    assert wheel.advance(8.0) == []
+    assert wheel.advance(9.0) == ["later"]
+
+
+def test_a_long_idle_gap_fires_everything_due():
+    wheel = TimerWheel(tick=1.0, slots=4, now=0.0)
+    for i in range(1, 20):
+        wheel.schedule(i, float(i))
+    assert sorted(wheel.advance(1000.0)) == list(range(1, 20))
+    assert len(wheel) == 0
+    assert wheel.advance(1000.0) == []
+
+
+def test_time_going_backwards_fires_nothing():
+    wheel = TimerWheel(tick=1.0, slots=8, now=10.0)
+    wheel.schedule("a", 12.0)
+    assert wheel.advance(5.0) == []
+    assert wheel.advance(12.0) == ["a"]
+
+
+def test_tally_counts_options_and_voters():
+    tally = PollTally()
+    tally.add([2])
+    tally.add([0])
+    assert tally.counts == [1, 0, 1]
+    assert tally.voters == 2
+    tally.merge([0, 3], 3)
+    assert tally.counts == [1, 3, 1]
+    assert tally.voters == 3
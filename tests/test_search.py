@@ -0,0 +1,71 @@
+from search import SearchIndex, SearchIndexCache, normalize
+
+PAIRS = [
+    ("der Hund", "the dog"),
+    ("die Katze", "the cat"),
+    ("Straße", "street"),
+    ("ｃａｆé", "coffee shop"),
+    ("hundert", "hundred"),
+]
+
+
+def test_normalize_folds_case_width_and_spaces():
+    assert normalize("  Der   HUND ") == "der hund"
+    assert normalize("Straße") == "strasse"
+    assert normalize("ｃａｆé") == "café"
+    assert normalize("café") == "café"
+
+
+def test_short_queries_match_inside_words():
+    index = SearchIndex(PAIRS)
+    assert index.find("h", 10) == [0, 1, 3, 4]
+    assert index.find("un", 10) == [0, 4]
+    assert index.find("cat", 10) == [1]
+    assert index.find("xyz", 10) == []
+
+
+def test_long_queries_match_substrings_of_either_side():
+    index = SearchIndex(PAIRS)
+    assert index.find("hund", 10) == [0, 4]
+    assert index.find("the cat", 10) == [1]
+    assert index.find("coffee", 10) == [3]
+    assert index.find("hundreds", 10) == []
+
+
+def test_queries_do_not_span_phrase_and_translation():
+    index = SearchIndex(PAIRS)
+    assert index.find("hund the", 10) == []
+    assert index.find("d t", 10) == []
+
+
+def test_queries_are_normalized_like_the_entries():
+    index = SearchIndex(PAIRS)
+    assert index.find("STRASSE", 10) == [2]
+    assert index.find("straße", 10) == [2]
+    assert index.find("CAFÉ", 10) == [3]
+    assert index.find("ｈｕｎｄ", 10) == [0, 4]
+    assert index.find("   ", 10) == []
+
+
+def test_results_are_limited_in_vocabulary_order():
+    index = SearchIndex((f"word {i}", f"Wort {i}") for i in range(100))
+    assert index.find("wor", 3) == [0, 1, 2]
+    assert index.find("word 1", 3) == [1, 10, 11]
+
+
+def test_added_phrases_are_found():
+    index = SearchIndex(PAIRS)
+    index.add([("der Hase", "the hare")])
+    assert index.find("hare", 10) == [5]
+    assert len(index) == 6
+
+
+def test_cache_only_extends_loaded_indexes():
+    cache = SearchIndexCache(max_users=1)
+    cache.add(1, PAIRS)
+    assert cache.get(1) is None
+    index = cache.build(1, PAIRS)
+    cache.add(1, [("der Hase", "the hare")])
+    assert index.find("hare", 10) == [5]
+    cache.build(2, PAIRS)
+    assert cache.get(1) is None
@@ -0,0 +1,200 @@
+# flake8: noqa: E501
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+from metrics import TRANSLATION_CACHE_HITS, TRANSLATION_LATENCY, TRANSLATION_REQUESTS
+from parsing import clean_pair
+from storage import TranslationStore
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("stub", "gemini")
+
+PROMPT = (
+    "Translate each of these words or phrases into {language}. Answer with a JSON "
+    "array of strings only, one short translation per phrase, in the same order.\n\n"
+    "{phrases}"
+)
+
+
+class TranslationBackend(ABC):
+    """A model that translates a batch of phrases in one call"""
+
+    # Part of the cache key, so answers of different models never mix
+    name = "base"
+
+    @abstractmethod
+    async def translate(self, phrases: Sequence[str], language: str) -> List[str]:
+        """One translation per phrase, in the same order"""
+
+
+class StubBackend(TranslationBackend):
+    """Deterministic offline backend for tests, benchmarks and local runs"""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    async def translate(self, phrases: Sequence[str], language: str) -> List[str]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [f"{phrase} ({language})" for phrase in phrases]
+
+
+class GeminiBackend(TranslationBackend):
+    """Google Gemini through langchain-google-genai, which reads GOOGLE_API_KEY"""
+
+    def __init__(self, model: str) -> None:
+        # Only installed with requirements-llm.txt
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.name = f"gemini:{model}"
+        self.llm = ChatGoogleGenerativeAI(model=model, temperature=0)
+
+    async def translate(self, phrases: Sequence[str], language: str) -> List[str]:
+        prompt = PROMPT.format(
+            language=language, phrases=json.dumps(list(phrases), ensure_ascii=False)
+        )
+        message = await self.llm.ainvoke(prompt)
+        return parse_translations(message.content, len(phrases))
+
+
+def parse_translations(answer: str, count: int) -> List[str]:
+    """The JSON array of a model answer, which may be wrapped in a code block"""
+    start = answer.find("[")
+    end = answer.rfind("]")
+    if start < 0 or end < start:
+        raise ValueError("The answer has no JSON array")
+    translations = json.loads(answer[start:end + 1])
+    if len(translations) != count or not all(isinstance(t, str) for t in translations):
+        raise ValueError(f"Expected {count} translations, got {translations!r}")
+    return translations
+
+
+def create_backend(name: str, model: str) -> TranslationBackend:
+    if name == "stub":
+        return StubBackend()
+    if name == "gemini":
+        return GeminiBackend(model)
+    raise ValueError(f"Unknown translation backend {name!r}")
+
+
+def cache_key(backend: str, language: str, phrase: str) -> str:
+    return hashlib.sha256("\0".join((backend, language, phrase)).encode()).hexdigest()
+
+
+class Translator:
+    """Fills in missing translations, one model call per pasted message
+
+    Answers are cached under a hash of the model, language and phrase, so a
+    phrase any user had translated before costs nothing. Phrases already
+    being translated for someone else are waited for instead of asked again.
+    At most `concurrency` calls run at once and a call, waiting for a free
+    slot included, is given up after `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        backend: TranslationBackend,
+        store: TranslationStore,
+        language: str,
+        concurrency: int = 4,
+        timeout: float = 30.0,
+    ) -> None:
+        self.backend = backend
+        self.store = store
+        self.language = language
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, "asyncio.Future[Dict[str, str]]"] = {}
+
+    async def translate(self, phrases: Sequence[str]) -> Dict[str, str]:
+        """Translations of `phrases`, the ones the model failed on are left out"""
+        keys = {
+            phrase: cache_key(self.backend.name, self.language, phrase)
+            for phrase in dict.fromkeys(phrases)
+        }
+        cached = await self.store.get_many(list(keys.values()))
+        translations: Dict[str, str] = {}
+        waiting: Dict[str, "asyncio.Future[Dict[str, str]]"] = {}
+        missing: List[str] = []
+        for phrase, key in keys.items():
+            if key in cached:
+                translations[phrase] = cached[key]
+            elif key in self._pending:
+                waiting[phrase] = self._pending[key]
+            else:
+                missing.append(phrase)
+        if translations:
+            TRANSLATION_CACHE_HITS.inc(len(translations))
+
+        if missing:
+            future = asyncio.get_running_loop().create_future()
+            for phrase in missing:
+                self._pending[keys[phrase]] = future
+            try:
+                answered = await self._call(missing)
+                translations.update(answered)
+                await self._cache(answered, keys)
+            finally:
+                for phrase in missing:
+                    del self._pending[keys[phrase]]
+                future.set_result({phrase: translations[phrase] for phrase in missing if phrase in translations})
+
+        for phrase, future in waiting.items():
+            # Shielded, so our cancellation doesn't fail the other caller's batch
+            answered = await asyncio.shield(future)
+            if phrase in answered:
+                translations[phrase] = answered[phrase]
+        return translations
+
+    async def _cache(self, answered: Dict[str, str], keys: Dict[str, str]) -> None:
+        """Store the answers, the translations are still used if that fails"""
+        if not answered:
+            return
+        try:
+            await self.store.put_many([(keys[phrase], answer) for phrase, answer in answered.items()])
+        except Exception:
+            logger.exception("Failed to cache %d translation(s)", len(answered))
+
+    async def _call(self, phrases: List[str]) -> Dict[str, str]:
+        """Ask the model for one batch, an empty result if it fails or takes too long"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        async def call() -> List[str]:
+            async with self._slots:
+                return await self.backend.translate(phrases, self.language)
+
+        start = time.perf_counter()
+        try:
+            answers = await asyncio.wait_for(call(), self.timeout)
+        except asyncio.TimeoutError:
+            TRANSLATION_REQUESTS.inc(result="timeout")
+            logger.warning("Translating %d phrase(s) took longer than %ss", len(phrases), self.timeout)
+            return {}
+        except Exception:
+            TRANSLATION_REQUESTS.inc(result="error")
+            logger.exception("Failed to translate %d phrase(s)", len(phrases))
+            return {}
+        finally:
+            TRANSLATION_LATENCY.observe(time.perf_counter() - start)
+        TRANSLATION_REQUESTS.inc(result="ok")
+
+        translations = {}
+        for phrase, answer in zip(phrases, answers):
+            # Cleaned like typed translations, empty answers count as failures
+            pair = clean_pair(phrase, answer)
+            if pair is not None:
+                translations[phrase] = pair[1]
+        return translations
@@ -0,0 +1,67 @@
+# flake8: noqa: E501
+
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# How many updates may wait for a worker per worker before new ones are held back
+BACKLOG_PER_WORKER = 8
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """Updates with the same key are processed in the order they arrived
+
+    This matches the (chat, user) key ConversationHandler keeps its state
+    under. Updates without a user or chat, like poll updates, can run in any order.
+    """
+    if not isinstance(update, Update):
+        return None
+    chat = update.effective_chat
+    user = update.effective_user
+    if chat is None and user is None:
+        return None
+    return (chat.id if chat else None, user.id if user else None)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently, but one at a time per chat and user
+
+    `workers` updates run at the same time. Updates queued behind a busy user
+    only wait for that user's lock and don't take a worker while waiting, so a
+    slow handler never blocks anyone else.
+    """
+
+    def __init__(self, workers: int) -> None:
+        # The base class semaphore only bounds how many updates are in flight
+        super().__init__(workers * BACKLOG_PER_WORKER)
+        self.workers = workers
+        self._worker_slots = asyncio.Semaphore(workers)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._waiting: Dict[Hashable, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = ordering_key(update)
+        if key is None:
+            async with self._worker_slots:
+                await coroutine
+            return
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._worker_slots:
+                    await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass